@@ -0,0 +1,124 @@
+import os
+import sys
+import math
+import time
+import argparse
+import numpy as np
+import scipy.sparse as sp
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from graph.graph_builder import sparse_hits, sparse_pagerank
+
+def random_graph(n_nodes, n_edges, dangling=0.1, seed=0):
+    # Uniform sources and Zipf-skewed targets, so a few hubs collect most links; a
+    # fraction of nodes keeps no out-links to exercise dangling handling.
+    rng = np.random.default_rng(seed)
+    with_links = rng.permutation(n_nodes)[:max(1, int(n_nodes * (1 - dangling)))]
+    src = with_links[rng.integers(0, len(with_links), n_edges)]
+    dst = (rng.zipf(1.3, n_edges) - 1) % n_nodes
+    dst = rng.permutation(n_nodes)[dst]
+    keep = src != dst
+    return sp.csr_matrix((np.ones(keep.sum()), (src[keep], dst[keep])), shape=(n_nodes, n_nodes))
+
+def to_dicts(matrix):
+    edges, incoming = defaultdict(list), defaultdict(list)
+    coo = matrix.tocoo()
+    for s, d, w in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist()):
+        for _ in range(int(w)):
+            edges[s].append(d)
+            incoming[d].append(s)
+    return list(range(matrix.shape[0])), edges, incoming
+
+def legacy_pagerank(nodes, edges, incoming, damping=0.85, max_iter=100, tol=1e-6, redistribute_dangling=False):
+    # The former node-by-node loop. By default it keeps the original semantics, where
+    # the rank of dangling nodes is dropped; redistribute_dangling spreads it uniformly
+    # as sparse_pagerank does, to separate that change from implementation error.
+    N = len(nodes)
+    pr = {node: 1.0 / N for node in nodes}
+    for _ in range(max_iter):
+        dangling_sum = sum(pr[n] for n in nodes if not edges[n]) if redistribute_dangling else 0.0
+        new_pr = {}
+        diff = 0
+        for node in nodes:
+            incoming_score = 0
+            for inc_node in incoming[node]:
+                out_count = len(edges[inc_node])
+                if out_count > 0:
+                    incoming_score += pr[inc_node] / out_count
+            new_val = (1 - damping) / N + damping * (incoming_score + dangling_sum / N)
+            new_pr[node] = new_val
+            diff += abs(new_val - pr[node])
+        pr = new_pr
+        if diff < tol:
+            break
+    return pr
+
+def top_overlap(a, b, nodes, k=100):
+    top_a = set(sorted(nodes, key=lambda n: -a[n])[:k])
+    top_b = set(sorted(nodes, key=lambda n: -b[n])[:k])
+    return len(top_a & top_b) / max(1, len(top_a))
+
+def legacy_hits(nodes, edges, incoming, max_iter=50, tol=1e-6):
+    hub = {n: 1.0 for n in nodes}
+    auth = {n: 1.0 for n in nodes}
+    for _ in range(max_iter):
+        old_auth = auth.copy()
+        for n in nodes:
+            auth[n] = sum(hub[inc] for inc in incoming[n])
+        norm = math.sqrt(sum(v * v for v in auth.values()))
+        for n in auth: auth[n] /= (norm + 1e-9)
+        for n in nodes:
+            hub[n] = sum(auth[out] for out in edges[n])
+        norm = math.sqrt(sum(v * v for v in hub.values()))
+        for n in hub: hub[n] /= (norm + 1e-9)
+        if sum(abs(auth[n] - old_auth[n]) for n in nodes) < tol:
+            break
+    return auth, hub
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed:9.3f}s")
+    return result, elapsed
+
+def run_benchmark(sizes, legacy_limit):
+    print("\n--- Graph Analytics: dict loops vs sparse mat-vec ---")
+    for n_nodes, n_edges in sizes:
+        matrix, build = timed("build CSR", lambda: random_graph(n_nodes, n_edges))
+        print(f"{n_nodes} nodes, {matrix.nnz} distinct edges ({n_edges} generated)")
+        pr, t_pr = timed("sparse PageRank", lambda: sparse_pagerank(matrix))
+        (auth, hub), t_hits = timed("sparse HITS", lambda: sparse_hits(matrix))
+        print(f"  PageRank sum {pr.sum():.6f}")
+
+        if n_edges > legacy_limit:
+            print(f"  (dict loops skipped above {legacy_limit} edges)")
+            continue
+        graph = to_dicts(matrix)
+        ref_pr, t_ref_pr = timed("dict PageRank", lambda: legacy_pagerank(*graph))
+        fixed_pr, _ = timed("dict PageRank+dangling", lambda: legacy_pagerank(*graph, redistribute_dangling=True))
+        (ref_auth, ref_hub), t_ref_hits = timed("dict HITS", lambda: legacy_hits(*graph))
+        nodes = graph[0]
+        pr_err = max(abs(pr[n] - fixed_pr[n]) for n in nodes)
+        auth_err = max(abs(auth[n] - ref_auth[n]) for n in nodes)
+        hub_err = max(abs(hub[n] - ref_hub[n]) for n in nodes)
+        print(f"  speedup vs original loop: PageRank {t_ref_pr / t_pr:.0f}x, HITS {t_ref_hits / t_hits:.0f}x")
+        print(f"  max abs diff (same semantics): pagerank {pr_err:.2e}, authority {auth_err:.2e}, hub {hub_err:.2e}")
+        # Score change from redistributing dangling rank, against the original loop.
+        delta = [abs(pr[n] - ref_pr[n]) for n in nodes]
+        rel = max(d / ref_pr[n] for d, n in zip(delta, nodes))
+        print(f"  dangling-node change: max abs diff {max(delta):.2e}, max rel diff {rel:.1%}, "
+              f"original rank sum {sum(ref_pr.values()):.4f}, top-100 overlap {top_overlap(pr, ref_pr, nodes):.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PageRank/HITS implementations.")
+    parser.add_argument("--sizes", default="20000:200000,1000000:5000000,2000000:20000000",
+                        help="comma-separated nodes:edges pairs")
+    parser.add_argument("--legacy-limit", type=int, default=500000,
+                        help="run the dict loops only up to this many edges")
+    args = parser.parse_args()
+    sizes = [tuple(int(x) for x in pair.split(":")) for pair in args.sizes.split(",")]
+    run_benchmark(sizes, args.legacy_limit)
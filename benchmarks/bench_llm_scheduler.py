@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from llm.scheduler import DeadlineExceeded, SchedulerBusy, VerificationScheduler
+
+STUB_ANSWER = '{"status": "Suspicious", "confidence": 40, "reasoning": "پاسخ آزمایشی سرور ساختگی"}'
+
+def start_stub_server(slots=1, tokens=40, token_seconds=0.005, port=0):
+    """Ollama-compatible stub: /api/chat streams NDJSON, serving `slots` requests at a time.
+
+    Requests beyond the slots wait inside the server, as they do in Ollama. Also answers
+    /api/version and /api/ps, so health checks can be pointed at it.
+    """
+    gate = threading.Semaphore(slots)
+    counters = {"chats": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/api/version":
+                self._json({"version": "stub"})
+            elif self.path == "/api/ps":
+                self._json({"models": [{"name": "qwen3:8b", "model": "qwen3:8b"}]})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != "/api/chat":
+                self._json({"model": request.get("model"), "done": True})
+                return
+            with gate:
+                counters["chats"] += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                step = max(1, len(STUB_ANSWER) // tokens)
+                start = time.perf_counter()
+                for i in range(0, len(STUB_ANSWER), step):
+                    time.sleep(token_seconds)
+                    self._chunk({"message": {"role": "assistant", "content": STUB_ANSWER[i:i + step]}, "done": False})
+                elapsed = int((time.perf_counter() - start) * 1e9)
+                self._chunk({"message": {"role": "assistant", "content": ""}, "done": True,
+                             "eval_count": tokens, "eval_duration": elapsed})
+                self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, payload):
+            data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    # Clients that give up at their deadline close the stream mid-answer; that is expected.
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server, counters
+
+def stream_chat(url, claim, timeout):
+    # Minimal /api/chat client yielding the same event shapes as FakeNewsDetector.stream_local_llm.
+    payload = json.dumps({"model": "qwen3:8b", "messages": [{"role": "user", "content": claim}], "stream": True}).encode("utf-8")
+    request = urllib.request.Request(url + "/api/chat", data=payload, headers={"Content-Type": "application/json"})
+    content = ""
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        for line in response:
+            chunk = json.loads(line)
+            text = chunk.get("message", {}).get("content", "")
+            if text:
+                content += text
+                yield {"type": "token", "text": text, "thinking": False}
+    yield {"type": "verdict", "result": json.loads(content), "stats": {}}
+
+def run_load(label, call, users, claims, duplicate_share, deadline, seed=0):
+    rng = random.Random(seed)
+    hot = [f"ادعای پرتکرار {i}" for i in range(3)]
+    workload = [rng.choice(hot) if rng.random() < duplicate_share else f"ادعای شماره {i}" for i in range(claims)]
+    latencies, outcomes = [], {"ok": 0, "timeout": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+    cursor = iter(workload)
+
+    def user():
+        while True:
+            with lock:
+                claim = next(cursor, None)
+            if claim is None: return
+            start = time.perf_counter()
+            try:
+                call(claim, deadline)
+                outcome = "ok"
+            except DeadlineExceeded:
+                outcome = "timeout"
+            except SchedulerBusy:
+                outcome = "busy"
+            except OSError as e:
+                outcome = "timeout" if "timed out" in str(e) else "error"
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] if latencies else 0.0
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+    print(f"  {label:<11} {elapsed:6.2f}s  {outcomes['ok'] / elapsed:6.1f} verdicts/sec  "
+          f"p50 {p50:.2f}s  p95 {p95:.2f}s  timeouts {outcomes['timeout']}  busy {outcomes['busy']}  errors {outcomes['error']}")
+
+def run_benchmark(slots, users, claims, duplicate_share, deadline, queue_size, queue_wait, token_seconds):
+    server, counters = start_stub_server(slots=slots, token_seconds=token_seconds)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"\n--- LLM scheduling: {users} users, {claims} claims ({duplicate_share:.0%} repeats), {slots} stub slots ---")
+
+    def direct(claim, deadline):
+        for _ in stream_chat(url, claim, deadline): pass
+
+    counters["chats"] = 0
+    run_load("direct", direct, users, claims, duplicate_share, deadline)
+    print(f"    model calls: {counters['chats']}")
+
+    scheduler = VerificationScheduler(lambda claim: stream_chat(url, claim, deadline), concurrency=slots,
+                                      max_queue=queue_size, deadline=deadline, queue_wait=queue_wait)
+    counters["chats"] = 0
+    run_load("scheduled", lambda claim, d: scheduler(claim, claim, deadline=d), users, claims, duplicate_share, deadline)
+    print(f"    model calls: {counters['chats']}  scheduler: {scheduler.stats()}")
+    scheduler.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the LLM verification scheduler against a stub Ollama server.")
+    parser.add_argument("--slots", type=int, default=2, help="parallel requests the stub serves (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--claims", type=int, default=200)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of claims drawn from a few hot claims")
+    parser.add_argument("--deadline", type=float, default=2.0, help="per-request deadline in seconds")
+    parser.add_argument("--queue", type=int, default=8)
+    parser.add_argument("--queue-wait", type=float, default=0.5, help="seconds a caller waits for queue space")
+    parser.add_argument("--token-seconds", type=float, default=0.005)
+    args = parser.parse_args()
+    run_benchmark(args.slots, args.users, args.claims, args.duplicates, args.deadline, args.queue, args.queue_wait, args.token_seconds)
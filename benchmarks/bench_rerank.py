@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from search.compact_index import compact_index_exists
+from search.search_engine import SearchEngine
+
+def text_agreement(results):
+    # Share of result pairs whose final order agrees with their text-score order.
+    pairs = agree = 0
+    for i in range(len(results)):
+        for j in range(i + 1, len(results)):
+            pairs += 1
+            agree += results[i]['text_score'] >= results[j]['text_score']
+    return agree / pairs if pairs else 1.0
+
+def sample_queries(engine, count, words, seed=0):
+    # Leading words of random titles: a claim-sized query with a clear best text match.
+    rng = random.Random(seed)
+    doc_map = engine.index_data['doc_map']
+    titles = [doc_map[doc_id].get('title', '') for doc_id in rng.sample(engine.doc_ids, min(count, len(engine.doc_ids)))]
+    return [" ".join(title.split()[:words]) for title in titles if title.strip()]
+
+def measure(engine, queries, top_k):
+    agreement, text_top, weak, elapsed, answered = 0.0, 0, 0, 0.0, 0
+    for query in queries:
+        start = time.perf_counter()
+        results = engine.search(query, top_k=top_k)
+        elapsed += time.perf_counter() - start
+        if not results: continue
+        answered += 1
+        best_text = max(r['text_score'] for r in results)
+        agreement += text_agreement(results)
+        text_top += results[0]['text_score'] == best_text
+        weak += any(r['text_score'] < 0.5 * best_text for r in results)
+    n = answered or 1
+    return {
+        "agreement": agreement / n,
+        "text_top": text_top / n,
+        "weak": weak / n,
+        "ms": elapsed / max(1, len(queries)) * 1000
+    }
+
+def run_benchmark(queries, words, top_k, tolerance):
+    engine_cls = SearchEngine
+    if compact_index_exists():
+        from search.matrix_search import MappedSearchEngine
+        engine_cls = MappedSearchEngine
+    engines = {mode: engine_cls(graph_mode=mode) for mode in ("global", "personalized")}
+    sample = sample_queries(engines["global"], queries, words)
+    print(f"\n--- Graph re-ranking: {len(sample)} queries, top {top_k} ---")
+    stats = {}
+    for mode, engine in engines.items():
+        engine.search_many(sample[:10], top_k=top_k)
+        engine.result_cache.clear()
+        stats[mode] = s = measure(engine, sample, top_k)
+        print(f"  {mode:<13} text-order agreement {s['agreement']:.3f}  best text match first {s['text_top']:.1%}  "
+              f"weak match shown {s['weak']:.1%}  {s['ms']:.1f} ms/query")
+        engine.close()
+
+    # Personalised re-ranking may reorder near ties, but must not let the graph term
+    # override text relevance more than global PageRank already does.
+    ok = stats["personalized"]["agreement"] >= stats["global"]["agreement"] - tolerance
+    print(f"  text relevance leads in personalized mode: {'OK' if ok else 'FAIL'} (tolerance {tolerance})")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that personalised graph re-ranking keeps text relevance in the lead.")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--words", type=int, default=6, help="leading title words per query")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.05, help="allowed drop in text-order agreement")
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.queries, args.words, args.top_k, args.tolerance) else 1)
@@ -0,0 +1,63 @@
+import os
+import sys
+import re
+import json
+import time
+import random
+import unicodedata
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import PERSIAN_STOPWORDS, TokenCache, doc_text, tokenize, tokenize_batch
+
+DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+def legacy_tokenize(text):
+    if not text: return []
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return [t for t in text.split() if t not in PERSIAN_STOPWORDS and len(t) > 1]
+
+def load_docs(limit=None):
+    docs = []
+    if os.path.exists(DATA_DIR):
+        for f in os.listdir(DATA_DIR):
+            if f.endswith("_clean.json"):
+                with open(os.path.join(DATA_DIR, f), "r", encoding="utf-8") as file:
+                    docs.extend(json.load(file))
+    if not docs:
+        print("No cleaned data found, using a synthetic corpus.")
+        words = ["قیمت", "بنزین", "دولت", "مجلس", "تهران", "اقتصاد", "نفت", "دلار", "از", "به", "در", "و"]
+        docs = [{
+            "id": f"synthetic_{i}",
+            "title": " ".join(random.choices(words, k=8)),
+            "content": " . ".join(" ".join(random.choices(words, k=15)) for _ in range(20))
+        } for i in range(5000)]
+    return docs[:limit] if limit else docs
+
+def timed(label, fn, n_docs, n_bytes):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f}s  {n_docs / elapsed:10.0f} docs/s  {n_bytes / elapsed / 1e6:7.2f} MB/s")
+
+def run_benchmark():
+    print("\n--- Tokenizer Throughput ---")
+    docs = load_docs()
+    texts = [doc_text(d) for d in docs]
+    n_bytes = sum(len(t.encode("utf-8")) for t in texts)
+    print(f"{len(docs)} documents, {n_bytes / 1e6:.1f} MB\n")
+
+    timed("legacy per-doc", lambda: [legacy_tokenize(t) for t in texts], len(docs), n_bytes)
+    timed("tokenize per-doc", lambda: [tokenize(t) for t in texts], len(docs), n_bytes)
+    timed("tokenize_batch (256)", lambda: [tokenize_batch(texts[i:i + 256]) for i in range(0, len(texts), 256)], len(docs), n_bytes)
+
+    cache = TokenCache(path=None)
+    timed("TokenCache cold", lambda: cache.tokenize_docs(docs), len(docs), n_bytes)
+    timed("TokenCache warm", lambda: cache.tokenize_docs(docs), len(docs), n_bytes)
+    print(f"\nCache stats: {cache.stats()}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,28 +1,100 @@
 import json
 import os
-import math
+import sys
+import time
+import shutil
+import argparse
 import numpy as np
+import scipy.sparse as sp
 from collections import defaultdict
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import TokenCache
+from graph.graph_store import GRAPH_STORE_DIR, index_doc_ids, push_pagerank, write_graph_store
+from graph.similarity import cross_top_k, lsh_top_k_similarity, top_k_similarity
+from search.generation import publish_generation
+
 DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
 GRAPH_FILE = os.path.join(DATA_DIR, "news_graph.json")
+GRAPH_STATE_DIR = os.path.join(DATA_DIR, "graph_state")
+GRAPH_INCREMENTAL = os.environ.get("GRAPH_INCREMENTAL", "0") == "1"
+# "exact" blocked top-k join, or "lsh" for approximate neighbours on very large corpora.
+GRAPH_SIM_MODE = os.environ.get("GRAPH_SIM_MODE", "exact")
+
+def _pretokenized(tokens):
+    return tokens
+
+def sparse_pagerank(adjacency, damping=0.85, max_iter=100, tol=1e-6, start=None):
+    """PageRank by power iteration over a CSR adjacency matrix (row = source).
+
+    Parallel edges add weight. The rank held by dangling nodes (no out-links) is
+    spread uniformly on every step, so the vector stays a probability distribution.
+    Stops once the L1 change drops below tol. start, if given, is the initial vector
+    (e.g. the previous run's scores), normalised to sum to one.
+    """
+    N = adjacency.shape[0]
+    if N == 0: return np.zeros(0)
+    out_degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_degree == 0
+    inv_out = np.divide(1.0, out_degree, out=np.zeros(N), where=~dangling)
+    # Transposed once so each step is a single CSR mat-vec over incoming edges.
+    incoming = adjacency.T.tocsr()
+
+    pr = np.full(N, 1.0 / N)
+    if start is not None and start.sum() > 0:
+        pr = start / start.sum()
+    for _ in range(max_iter):
+        new_pr = damping * (incoming @ (pr * inv_out))
+        new_pr += ((1 - damping) + damping * pr[dangling].sum()) / N
+        diff = np.abs(new_pr - pr).sum()
+        pr = new_pr
+        if diff < tol:
+            break
+    return pr
+
+def sparse_hits(adjacency, max_iter=50, tol=1e-6, start=None):
+    """HITS authority and hub vectors over a CSR adjacency matrix, L2-normalised each step.
 
-PERSIAN_STOPWORDS = [
-    "از", "به", "در", "که", "و", "را", "این", "آن", "برای", "با", "است", "شد", "می", "ها", "های", "بر",
-    "تا", "یک", "بود", "نیز", "کند", "شود", "کرده", "شده", "باید", "گفت", "دارد", "وی", "اما", "اگر"
-]
+    start, if given, is an initial (authority, hub) pair such as the previous run's.
+    """
+    N = adjacency.shape[0]
+    hub = np.ones(N)
+    auth = np.ones(N)
+    if start is not None and start[1].any():
+        auth, hub = start
+    incoming = adjacency.T.tocsr()
+
+    for _ in range(max_iter):
+        old_auth = auth
+        auth = incoming @ hub
+        auth /= np.sqrt(auth @ auth) + 1e-9
+        hub = adjacency @ auth
+        hub /= np.sqrt(hub @ hub) + 1e-9
+        if np.abs(auth - old_auth).sum() < tol:
+            break
+    return auth, hub
 
 class WebGraph:
-    def __init__(self):
+    def __init__(self, token_cache=None):
         self.nodes = set()
         self.edges = defaultdict(list)
         self.incoming = defaultdict(list)
         self.doc_map = {}
+        self.token_cache = token_cache if token_cache is not None else TokenCache(path=None)
+        # Kept for incremental updates: explicit links apart from similarity edges, each
+        # document's top-k content neighbours, the fitted TF-IDF model and matrix, and
+        # the scores of the last run (warm start).
+        self.links = defaultdict(list)
+        self.sim_neighbors = {}
+        self.vectorizer = None
+        self.tfidf = None
+        self.tfidf_ids = []
+        self.scores = {}
 
-    def build_from_docs(self, docs, sim_threshold=0.3, max_sim_edges=5):
+    def build_from_docs(self, docs, sim_threshold=0.3, max_sim_edges=5, sim_mode=GRAPH_SIM_MODE):
         print("Checking explicit links...")
         
         url_to_id = {d['url']: d['id'] for d in docs if 'url' in d}
@@ -37,100 +109,206 @@ class WebGraph:
                 if link in url_to_id:
                     dst_id = url_to_id[link]
                     if src_id != dst_id:
+                        self.links[src_id].append(dst_id)
                         self.edges[src_id].append(dst_id)
                         self.incoming[dst_id].append(src_id)
 
         print("Computing content similarity edges...")
-        self._add_similarity_edges(docs, sim_threshold, max_sim_edges)
+        self._add_similarity_edges(docs, sim_threshold, max_sim_edges, sim_mode)
 
-    def _add_similarity_edges(self, docs, threshold, k):
+    def _add_similarity_edges(self, docs, threshold, k, mode=GRAPH_SIM_MODE):
         valid_docs = [d for d in docs if len(d.get('content', '')) > 50]
         ids = [d['id'] for d in valid_docs]
-        texts = [d['title'] + " " + d['content'] for d in valid_docs]
+        token_streams = self.token_cache.tokenize_docs(valid_docs)
 
-        if not texts: return
+        if not token_streams: return
 
-        vectorizer = TfidfVectorizer(max_features=1000, stop_words=PERSIAN_STOPWORDS)
-        tfidf_matrix = vectorizer.fit_transform(texts)
-        
-        sim_matrix = cosine_similarity(tfidf_matrix)
+        vectorizer = TfidfVectorizer(max_features=1000, analyzer=_pretokenized)
+        tfidf_matrix = vectorizer.fit_transform(token_streams)
+        self.vectorizer, self.tfidf, self.tfidf_ids = vectorizer, tfidf_matrix.astype(np.float32), ids
+
+        if mode == "lsh":
+            rows, cols, scores = lsh_top_k_similarity(tfidf_matrix, k, threshold)
+        else:
+            rows, cols, scores = top_k_similarity(tfidf_matrix, k, threshold)
 
         count = 0
-        for i in range(len(ids)):
-            scores = sim_matrix[i]
-            scores[i] = 0 
-            top_indices = np.argsort(scores)[::-1][:k]
-            
-            for idx in top_indices:
-                if scores[idx] > threshold:
-                    src = ids[i]
-                    dst = ids[idx]
-                    
-                    if dst not in self.edges[src]:
-                        self.edges[src].append(dst)
-                        self.incoming[dst].append(src)
-                        count += 1
+        for i, idx, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+            src = ids[i]
+            dst = ids[idx]
+            self.sim_neighbors.setdefault(src, []).append((dst, score))
+
+            if dst not in self.edges[src]:
+                self.edges[src].append(dst)
+                self.incoming[dst].append(src)
+                count += 1
         print(f"Added {count} similarity edges.")
 
-    def pagerank(self, damping=0.85, max_iter=100, tol=1e-6):
-        N = len(self.nodes)
-        if N == 0: return {}
-        
-        pr = {node: 1.0/N for node in self.nodes}
-        
-        for _ in range(max_iter):
-            new_pr = {}
-            diff = 0
-            
-            for node in self.nodes:
-                incoming_score = 0
-                for inc_node in self.incoming[node]:
-                    out_count = len(self.edges[inc_node])
-                    if out_count > 0:
-                        incoming_score += pr[inc_node] / out_count
-                
-                new_val = (1 - damping) / N + damping * incoming_score
-                new_pr[node] = new_val
-                diff += abs(new_val - pr[node])
-            
-            pr = new_pr
-            if diff < tol:
-                break
-                
-        return pr
-
-    def hits(self, max_iter=50, tol=1e-6):
-        hub = {n: 1.0 for n in self.nodes}
-        auth = {n: 1.0 for n in self.nodes}
-        
-        for _ in range(max_iter):
-            old_auth = auth.copy()
-            
-            for n in self.nodes:
-                score = 0
-                for inc in self.incoming[n]:
-                    score += hub[inc]
-                auth[n] = score
-            
-            norm = math.sqrt(sum(v*v for v in auth.values()))
-            for n in auth: auth[n] /= (norm + 1e-9)
-
-            for n in self.nodes:
-                score = 0
-                for out in self.edges[n]:
-                    score += auth[out]
-                hub[n] = score
-                
-            norm = math.sqrt(sum(v*v for v in hub.values()))
-            for n in hub: hub[n] /= (norm + 1e-9)
-
-            diff = sum(abs(auth[n] - old_auth[n]) for n in self.nodes)
-            if diff < tol:
-                break
-                
-        return auth, hub
-
-def run_graph_builder():
+    def update_from_docs(self, docs, sim_threshold=0.3, max_sim_edges=5):
+        """Add documents not yet in the graph without refitting or re-comparing the rest.
+
+        New documents get their explicit links, links from existing documents that now
+        resolve to them, and top-k similarity edges against the whole corpus. An existing
+        document's similarity edges change only where a new one enters its top-k. New
+        text is weighted with the TF-IDF model of the last full build, so terms first
+        seen since then are ignored until the next full rebuild. Returns the number of
+        documents added.
+        """
+        new_docs = {}
+        for doc in docs:
+            if doc['id'] not in self.nodes and doc['id'] not in new_docs:
+                new_docs[doc['id']] = doc
+        if not new_docs: return 0
+
+        print(f"Adding {len(new_docs)} new documents...")
+        for doc_id, doc in new_docs.items():
+            self.nodes.add(doc_id)
+            self.doc_map[doc_id] = doc.get('url', '')
+
+        url_to_id = {d['url']: d['id'] for d in docs if 'url' in d}
+        for doc in docs:
+            src_id = doc['id']
+            is_new = src_id in new_docs
+            for link in doc.get('outgoing_links', []):
+                dst_id = url_to_id.get(link.rstrip('/'))
+                if dst_id and dst_id != src_id and (is_new or dst_id in new_docs):
+                    self.links[src_id].append(dst_id)
+
+        valid_docs = [d for d in new_docs.values() if len(d.get('content', '')) > 50]
+        if valid_docs and self.vectorizer is not None:
+            new_ids = [d['id'] for d in valid_docs]
+            queries = self.vectorizer.transform(self.token_cache.tokenize_docs(valid_docs)).astype(np.float32)
+            n_old = self.tfidf.shape[0]
+            corpus = sp.vstack([self.tfidf, queries]).tocsr()
+            all_ids = self.tfidf_ids + new_ids
+
+            rows, cols, scores = cross_top_k(queries, corpus, max_sim_edges, sim_threshold, self_offset=n_old)
+            for i, idx, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+                self.sim_neighbors.setdefault(new_ids[i], []).append((all_ids[idx], score))
+
+            rows, cols, scores = cross_top_k(self.tfidf, queries, max_sim_edges, sim_threshold)
+            offers = defaultdict(list)
+            for i, idx, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+                offers[self.tfidf_ids[i]].append((new_ids[idx], score))
+            for src, candidates in offers.items():
+                merged = self.sim_neighbors.get(src, []) + candidates
+                self.sim_neighbors[src] = sorted(merged, key=lambda item: -item[1])[:max_sim_edges]
+
+            self.tfidf, self.tfidf_ids = corpus, all_ids
+
+        self._rebuild_edges()
+        return len(new_docs)
+
+    def _rebuild_edges(self):
+        # Explicit links first, then each similarity neighbour not already linked, as in build_from_docs.
+        self.edges = defaultdict(list)
+        self.incoming = defaultdict(list)
+        for src, dsts in self.links.items():
+            for dst in dsts:
+                self.edges[src].append(dst)
+                self.incoming[dst].append(src)
+        for src, neighbors in self.sim_neighbors.items():
+            for dst, _ in neighbors:
+                if dst not in self.edges[src]:
+                    self.edges[src].append(dst)
+                    self.incoming[dst].append(src)
+
+    def save_state(self, scores, state_dir=GRAPH_STATE_DIR):
+        nodes = list(self.nodes)
+        index = {n: i for i, n in enumerate(nodes)}
+        link_pairs = [(index[s], index[d]) for s, dsts in self.links.items() for d in dsts]
+        sim_triples = [(index[s], index[d], w) for s, neighbors in self.sim_neighbors.items() for d, w in neighbors]
+
+        tmp_dir = state_dir + ".tmp"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        np.savez(os.path.join(tmp_dir, "edges.npz"),
+                 links=np.asarray(link_pairs, dtype=np.int64).reshape(-1, 2),
+                 sim=np.asarray([t[:2] for t in sim_triples], dtype=np.int64).reshape(-1, 2),
+                 sim_scores=np.asarray([t[2] for t in sim_triples], dtype=np.float32))
+        np.savez(os.path.join(tmp_dir, "scores.npz"),
+                 **{name: np.asarray([values.get(n, 0.0) for n in nodes]) for name, values in scores.items()})
+        meta = {"nodes": nodes, "url_map": self.doc_map, "tfidf_ids": self.tfidf_ids}
+        if self.vectorizer is not None:
+            vocab = self.vectorizer.vocabulary_
+            meta["vocabulary"] = sorted(vocab, key=vocab.get)
+            meta["idf"] = self.vectorizer.idf_.tolist()
+            sp.save_npz(os.path.join(tmp_dir, "tfidf.npz"), self.tfidf)
+        with open(os.path.join(tmp_dir, "state.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        if os.path.exists(state_dir):
+            shutil.rmtree(state_dir)
+        os.replace(tmp_dir, state_dir)
+
+    def load_state(self, state_dir=GRAPH_STATE_DIR):
+        meta_path = os.path.join(state_dir, "state.json")
+        if not os.path.exists(meta_path): return False
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        nodes = meta["nodes"]
+        self.nodes = set(nodes)
+        self.doc_map = meta["url_map"]
+        self.tfidf_ids = meta["tfidf_ids"]
+
+        edges = np.load(os.path.join(state_dir, "edges.npz"))
+        self.links = defaultdict(list)
+        for s, d in edges["links"].tolist():
+            self.links[nodes[s]].append(nodes[d])
+        self.sim_neighbors = {}
+        for (s, d), w in zip(edges["sim"].tolist(), edges["sim_scores"].tolist()):
+            self.sim_neighbors.setdefault(nodes[s], []).append((nodes[d], w))
+
+        scores = np.load(os.path.join(state_dir, "scores.npz"))
+        self.scores = {name: dict(zip(nodes, scores[name].tolist())) for name in scores.files}
+
+        if "vocabulary" in meta:
+            self.vectorizer = TfidfVectorizer(analyzer=_pretokenized,
+                                              vocabulary={t: i for i, t in enumerate(meta["vocabulary"])})
+            self.vectorizer.idf_ = np.asarray(meta["idf"])
+            self.tfidf = sp.load_npz(os.path.join(state_dir, "tfidf.npz")).tocsr()
+        self._rebuild_edges()
+        return True
+
+    def adjacency(self):
+        # Node order and CSR adjacency (row = source), built once and shared by PageRank and HITS.
+        nodes = list(self.nodes)
+        index = {n: i for i, n in enumerate(nodes)}
+        rows, cols = [], []
+        for src, dsts in self.edges.items():
+            i = index[src]
+            for dst in dsts:
+                rows.append(i)
+                cols.append(index[dst])
+        N = len(nodes)
+        matrix = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(N, N))
+        return nodes, matrix
+
+    def pagerank(self, damping=0.85, max_iter=100, tol=1e-6, adjacency=None, start=None):
+        # start: previous {node: score}; nodes it lacks begin at the uniform 1/N.
+        nodes, matrix = adjacency or self.adjacency()
+        if not nodes: return {}
+        initial = np.asarray([start.get(n, 1.0 / len(nodes)) for n in nodes]) if start else None
+        scores = sparse_pagerank(matrix, damping, max_iter, tol, initial)
+        return dict(zip(nodes, scores.tolist()))
+
+    def personalized_pagerank(self, seeds, adjacency=None, **push_options):
+        # seeds: {node: weight}; approximate, see push_pagerank for the work bound.
+        nodes, matrix = adjacency or self.adjacency()
+        index = {n: i for i, n in enumerate(nodes)}
+        rank, _ = push_pagerank(matrix.indptr, matrix.indices, {index[n]: w for n, w in seeds.items() if n in index}, **push_options)
+        return {nodes[i]: score for i, score in rank.items()}
+
+    def hits(self, max_iter=50, tol=1e-6, adjacency=None, start=None):
+        # start: previous ({node: authority}, {node: hub}); new nodes begin at zero.
+        nodes, matrix = adjacency or self.adjacency()
+        if not nodes: return {}, {}
+        initial = tuple(np.asarray([values.get(n, 0.0) for n in nodes]) for values in start) if start else None
+        auth, hub = sparse_hits(matrix, max_iter, tol, initial)
+        return dict(zip(nodes, auth.tolist())), dict(zip(nodes, hub.tolist()))
+
+def run_graph_builder(incremental=GRAPH_INCREMENTAL):
     print("\n--- Web Graph Builder ---")
     
     if not os.path.exists(DATA_DIR):
@@ -147,16 +325,33 @@ def run_graph_builder():
         with open(os.path.join(DATA_DIR, f), "r", encoding="utf-8") as file:
             docs.extend(json.load(file))
 
-    print(f"Building graph from {len(docs)} documents...")
-    
-    graph = WebGraph()
-    graph.build_from_docs(docs)
+    token_cache = TokenCache()
+    graph = WebGraph(token_cache=token_cache)
+    pr_start = hits_start = None
+    if incremental and graph.load_state():
+        added = graph.update_from_docs(docs)
+        if not added and os.path.exists(GRAPH_FILE):
+            print("Graph is up to date.")
+            return
+        pr_start = graph.scores.get("pagerank")
+        if "authority" in graph.scores and "hub" in graph.scores:
+            hits_start = (graph.scores["authority"], graph.scores["hub"])
+    else:
+        if incremental:
+            print("No saved graph state; running a full build.")
+        print(f"Building graph from {len(docs)} documents...")
+        graph.build_from_docs(docs)
+    token_cache.save(live_ids=[d['id'] for d in docs])
+
+    adjacency = graph.adjacency()
 
     print("Calculating PageRank...")
-    pr_scores = graph.pagerank()
+    t0 = time.perf_counter()
+    pr_scores = graph.pagerank(adjacency=adjacency, start=pr_start)
 
     print("Calculating HITS (Hubs & Authorities)...")
-    auth_scores, hub_scores = graph.hits()
+    auth_scores, hub_scores = graph.hits(adjacency=adjacency, start=hits_start)
+    print(f"Link analysis took {time.perf_counter() - t0:.2f}s")
 
     output = {
         "nodes": list(graph.nodes),
@@ -168,11 +363,24 @@ def run_graph_builder():
     }
 
     try:
-        with open(GRAPH_FILE, "w", encoding="utf-8") as f:
+        scores = {"pagerank": pr_scores, "authority": auth_scores, "hub": hub_scores}
+        graph.save_state(scores)
+        nodes, edges = write_graph_store(graph, scores, index_doc_ids())
+        print(f"Graph store written to {GRAPH_STORE_DIR} ({nodes} nodes, {edges} edges)")
+        tmp_path = GRAPH_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(output, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, GRAPH_FILE)
         print(f"Graph built and saved to: {GRAPH_FILE}")
     except Exception as e:
         print(f"Failed to save graph: {e}")
+        return
+
+    generation = publish_generation("graph", {"nodes": len(graph.nodes)})
+    print(f"Published graph generation {generation}")
 
 if __name__ == "__main__":
-    run_graph_builder()
+    parser = argparse.ArgumentParser(description="Build the web graph and link-analysis scores")
+    parser.add_argument("--incremental", action="store_true", default=GRAPH_INCREMENTAL,
+                        help="add only documents missing from the saved graph state")
+    run_graph_builder(parser.parse_args().incremental)
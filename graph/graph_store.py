@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import shutil
+from collections import deque
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from search.compact_index import COMPACT_INDEX_DIR, COMPACT_META_FILE, INDEX_FILE
+
+DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
+GRAPH_STORE_DIR = os.path.join(DATA_DIR, "graph_store")
+GRAPH_STORE_META_FILE = "meta.json"
+GRAPH_STORE_ARRAYS = ("indptr", "indices", "edge_types", "weights")
+GRAPH_SCORES = ("pagerank", "authority", "hub")
+
+PPR_ALPHA = 0.15
+PPR_EPSILON = float(os.environ.get("PPR_EPSILON", 3e-4))
+PPR_MAX_PUSHES = int(os.environ.get("PPR_MAX_PUSHES", 2000))
+
+# edge_types bit flags; an edge can be both an explicit link and a similarity edge.
+EDGE_LINK = 1
+EDGE_SIMILAR = 2
+
+def doc_order_digest(doc_ids):
+    """Fingerprint of a doc ordinal order, to check that stored scores line up with an index."""
+    h = hashlib.sha1()
+    for doc_id in doc_ids:
+        h.update(str(doc_id).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def index_doc_ids():
+    """Doc ids in the search index's ordinal order, or [] when no index has been built."""
+    for path in (os.path.join(COMPACT_INDEX_DIR, COMPACT_META_FILE), INDEX_FILE):
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return list(json.load(f)['doc_map'])
+    return []
+
+def write_graph_store(graph, scores, doc_ids=None, out_dir=GRAPH_STORE_DIR):
+    """Write a WebGraph and its link-analysis scores as raw .npy arrays plus a JSON header.
+
+    Node ordinals follow doc_ids (the search index's doc order) first, then any graph
+    nodes the index does not have, so the first len(doc_ids) entries of each float32
+    score array line up with the index's doc ordinals. The adjacency is a CSR matrix
+    (row = source) with one entry per distinct edge, an EDGE_LINK/EDGE_SIMILAR flag
+    byte and the cosine weight of similarity edges (0 for link-only edges).
+    """
+    doc_ids = list(doc_ids or [])
+    known = set(doc_ids)
+    nodes = doc_ids + sorted(n for n in graph.nodes if n not in known)
+    index = {n: i for i, n in enumerate(nodes)}
+
+    edges = {}
+    for src, dsts in graph.links.items():
+        for dst in dsts:
+            key = (index[src], index[dst])
+            edges[key] = (edges.get(key, (0, 0.0))[0] | EDGE_LINK, 0.0)
+    for src, neighbors in graph.sim_neighbors.items():
+        for dst, score in neighbors:
+            if src == dst: continue
+            key = (index[src], index[dst])
+            edges[key] = (edges.get(key, (0, 0.0))[0] | EDGE_SIMILAR, score)
+
+    N = len(nodes)
+    keys = sorted(edges)
+    rows = np.asarray([k[0] for k in keys], dtype=np.int64)
+    indptr = np.zeros(N + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=N), out=indptr[1:])
+
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    np.save(os.path.join(tmp_dir, "indptr.npy"), indptr)
+    np.save(os.path.join(tmp_dir, "indices.npy"), np.asarray([k[1] for k in keys], dtype=np.int32))
+    np.save(os.path.join(tmp_dir, "edge_types.npy"), np.asarray([edges[k][0] for k in keys], dtype=np.uint8))
+    np.save(os.path.join(tmp_dir, "weights.npy"), np.asarray([edges[k][1] for k in keys], dtype=np.float32))
+    for name in GRAPH_SCORES:
+        values = scores.get(name, {})
+        np.save(os.path.join(tmp_dir, name + ".npy"), np.asarray([values.get(n, 0.0) for n in nodes], dtype=np.float32))
+
+    meta = {
+        "nodes": nodes,
+        "url_map": graph.doc_map,
+        "doc_count": len(doc_ids),
+        "doc_digest": doc_order_digest(doc_ids),
+        "edges": len(keys)
+    }
+    with open(os.path.join(tmp_dir, GRAPH_STORE_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return N, len(keys)
+
+def push_pagerank(indptr, indices, seeds, alpha=PPR_ALPHA, eps=PPR_EPSILON, max_pushes=PPR_MAX_PUSHES):
+    """Approximate personalised PageRank by forward push from {ordinal: weight} seeds.
+
+    Each push settles alpha of a node's residual rank and spreads the rest over its
+    out-edges; nodes are pushed while their residual exceeds eps per out-edge, so the
+    work depends on eps and the neighbourhood of the seeds, not on the graph size, and
+    max_pushes caps it outright. Residual at dangling nodes restarts at the seeds.
+    Returns ({ordinal: rank}, pushes done); ranks underestimate the exact vector by at
+    most the residual left behind.
+    """
+    total = float(sum(seeds.values()))
+    if total <= 0: return {}, 0
+    restart = {o: w / total for o, w in seeds.items() if w > 0}
+    rank = {}
+    residual = dict(restart)
+    queue = deque(residual)
+    queued = set(queue)
+    pushes = 0
+
+    while queue and pushes < max_pushes:
+        u = queue.popleft()
+        queued.discard(u)
+        r = residual.pop(u, 0.0)
+        if r <= 0: continue
+        pushes += 1
+        rank[u] = rank.get(u, 0.0) + alpha * r
+        lo, hi = indptr[u], indptr[u + 1]
+        if hi > lo:
+            share = (1 - alpha) * r / (hi - lo)
+            spread = [(v, share) for v in indices[lo:hi].tolist()]
+        else:
+            spread = [(v, (1 - alpha) * r * w) for v, w in restart.items()]
+        for v, amount in spread:
+            rv = residual.get(v, 0.0) + amount
+            residual[v] = rv
+            if v not in queued:
+                deg = indptr[v + 1] - indptr[v]
+                if rv > eps * max(1, deg):
+                    queue.append(v)
+                    queued.add(v)
+    return rank, pushes
+
+class GraphStore:
+    """Memory-mapped graph artifact: CSR adjacency with edge types and per-node scores."""
+
+    def __init__(self, store_dir=GRAPH_STORE_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, GRAPH_STORE_META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.nodes = meta["nodes"]
+        self.url_map = meta.get("url_map", {})
+        self.doc_count = meta["doc_count"]
+        self.doc_digest = meta["doc_digest"]
+        self._node_index = None
+        self._indptr_list = None
+        arrays = {name: np.load(os.path.join(store_dir, name + ".npy"), mmap_mode="r") for name in GRAPH_STORE_ARRAYS}
+        self.indptr, self.indices, self.edge_types, self.weights = (arrays[name] for name in GRAPH_STORE_ARRAYS)
+        self.scores = {name: np.load(os.path.join(store_dir, name + ".npy"), mmap_mode="r") for name in GRAPH_SCORES}
+
+    @staticmethod
+    def exists(store_dir=GRAPH_STORE_DIR):
+        return os.path.exists(os.path.join(store_dir, GRAPH_STORE_META_FILE))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def node_index(self):
+        if self._node_index is None:
+            self._node_index = {n: i for i, n in enumerate(self.nodes)}
+        return self._node_index
+
+    def adjacency(self, edge_types=EDGE_LINK | EDGE_SIMILAR):
+        """CSR adjacency (row = source) over the mapped arrays, restricted to edge_types."""
+        N = len(self.nodes)
+        data = ((np.asarray(self.edge_types) & edge_types) > 0).astype(np.float32)
+        if edge_types == EDGE_LINK | EDGE_SIMILAR:
+            return sp.csr_matrix((data, self.indices, self.indptr), shape=(N, N), copy=False)
+        # A subset needs writable index arrays to drop the other edges.
+        matrix = sp.csr_matrix((data, np.array(self.indices), np.array(self.indptr)), shape=(N, N))
+        matrix.eliminate_zeros()
+        return matrix
+
+    def neighbors(self, node):
+        """[(dst, edge_type, weight)] of a node's outgoing edges."""
+        i = self.node_index.get(node)
+        if i is None: return []
+        lo, hi = int(self.indptr[i]), int(self.indptr[i + 1])
+        return [(self.nodes[j], t, w) for j, t, w in zip(self.indices[lo:hi].tolist(), self.edge_types[lo:hi].tolist(), self.weights[lo:hi].tolist())]
+
+    def personalized_pagerank(self, seeds, alpha=PPR_ALPHA, eps=PPR_EPSILON, max_pushes=PPR_MAX_PUSHES):
+        """Push-based personalised PageRank from {ordinal: weight} seeds, as {ordinal: rank}."""
+        # Pushes read offsets one at a time, which is much cheaper from a list than a mapped array.
+        if self._indptr_list is None:
+            self._indptr_list = self.indptr.tolist()
+        rank, _ = push_pagerank(self._indptr_list, self.indices, seeds, alpha, eps, max_pushes)
+        return rank
+
+    def scores_for(self, doc_ids, name="pagerank"):
+        """Scores aligned to doc_ids; a slice of the mapped array when the store was built for that order."""
+        values = self.scores[name]
+        if len(doc_ids) == self.doc_count and doc_order_digest(doc_ids) == self.doc_digest:
+            return values[:self.doc_count]
+        index = self.node_index
+        pos = np.asarray([index.get(d, -1) for d in doc_ids], dtype=np.int64)
+        aligned = np.zeros(len(doc_ids), dtype=np.float32)
+        found = pos >= 0
+        aligned[found] = values[pos[found]]
+        return aligned
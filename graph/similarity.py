@@ -0,0 +1,181 @@
+import os
+import numpy as np
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+SIM_BLOCK_BYTES = int(os.environ.get("GRAPH_SIM_BLOCK_MB", 256)) * 2 ** 20
+SIM_WORKERS = int(os.environ.get("GRAPH_SIM_WORKERS", os.cpu_count() or 1))
+# Blocks per worker, so a slow block does not leave the other workers idle at the end.
+SIM_BLOCKS_PER_WORKER = 4
+LSH_ROUNDS = 8
+LSH_WINDOW = 32
+LSH_BITS = 32
+
+def _block_rows(n_cols, block_bytes=SIM_BLOCK_BYTES):
+    # Rows per block so one dense float32 block of similarities fits in block_bytes.
+    return max(1, block_bytes // (4 * max(1, n_cols)))
+
+def _select_top_k(sims, row_offset, k, threshold):
+    """(rows, cols, scores) of the k best entries above threshold per row of a dense block."""
+    n_rows, n_cols = sims.shape
+    k = min(k, n_cols)
+    if k <= 0: return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, sims.dtype)
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k] if k < n_cols else np.tile(np.arange(n_cols), (n_rows, 1))
+    scores = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    keep = scores > threshold
+    rows = np.repeat(np.arange(n_rows) + row_offset, k).reshape(n_rows, k)
+    return rows[keep], top[keep], scores[keep]
+
+def block_top_k(matrix, right, start, end, k, threshold, self_offset=0):
+    # matrix rows are L2-normalised, so a block of cosines is one product with the
+    # transposed matrix (dense when it fits the block budget, sparse otherwise).
+    # Row i of matrix is column i + self_offset of right; None when they never meet.
+    sims = matrix[start:end] @ right
+    sims = (sims.toarray() if sp.issparse(sims) else np.asarray(sims)).astype(np.float32, copy=False)
+    if self_offset is not None:
+        sims[np.arange(end - start), np.arange(start, end) + self_offset] = 0.0
+    return _select_top_k(sims, start, k, threshold)
+
+def top_k_similarity(matrix, k=5, threshold=0.3, block_bytes=SIM_BLOCK_BYTES, workers=SIM_WORKERS):
+    """Exact top-k cosine neighbours of every row, computed in row blocks.
+
+    Only one block of similarities per worker (together bounded by block_bytes) is
+    dense at a time, and each row's neighbours come from argpartition rather than a
+    full sort. With workers > 1 the blocks are spread over a process pool that maps
+    the matrix from shared memory instead of receiving a pickled copy. Returns (rows,
+    cols, scores), grouped by row with each row's neighbours best first.
+    """
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    n, dims = matrix.shape
+    dense_right = 4 * n * dims <= block_bytes
+    workers = max(1, min(workers or 1, n))
+    step = _block_rows(n, block_bytes // workers)
+    if workers > 1:
+        step = min(step, -(-n // (workers * SIM_BLOCKS_PER_WORKER)))
+    blocks = [(start, min(start + step, n)) for start in range(0, n, step)]
+
+    if workers == 1 or len(blocks) == 1:
+        right = matrix.T.toarray() if dense_right else matrix.T
+        return _concat([block_top_k(matrix, right, start, end, k, threshold) for start, end in blocks])
+    return _parallel_top_k(matrix, blocks, k, threshold, dense_right, workers)
+
+def cross_top_k(queries, corpus, k=5, threshold=0.3, self_offset=None, block_bytes=SIM_BLOCK_BYTES):
+    """Top-k neighbours among corpus rows for each row of queries, as top_k_similarity.
+
+    self_offset is the corpus row of queries[0] when the queries are themselves a run
+    of corpus rows, so that no row becomes its own neighbour.
+    """
+    queries = sp.csr_matrix(queries, dtype=np.float32)
+    corpus = sp.csr_matrix(corpus, dtype=np.float32)
+    n, dims = corpus.shape
+    right = corpus.T.toarray() if 4 * n * dims <= block_bytes else corpus.T
+    step = _block_rows(n, block_bytes)
+    return _concat([block_top_k(queries, right, start, min(start + step, queries.shape[0]), k, threshold, self_offset)
+                    for start in range(0, queries.shape[0], step)])
+
+_worker_matrix = None
+_worker_right = None
+_worker_segments = []
+
+def _share(arrays):
+    # Copies each array into a named shared-memory segment once; workers map them.
+    segments, spec = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        segments.append(shm)
+        spec[name] = (shm.name, arr.shape, arr.dtype.str)
+    return segments, spec
+
+def _attach(spec):
+    arrays = {}
+    for name, (shm_name, shape, dtype) in spec.items():
+        # Pool workers share the parent's resource tracker, and the parent unlinks the
+        # segments once the pool is done; workers only map them.
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_segments.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return arrays
+
+def _init_similarity_worker(spec, shape):
+    global _worker_matrix, _worker_right
+    arrays = _attach(spec)
+    _worker_matrix = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=shape, copy=False)
+    _worker_right = arrays["right"] if "right" in arrays else _worker_matrix.T
+
+def _similarity_worker(task):
+    start, end, k, threshold = task
+    return block_top_k(_worker_matrix, _worker_right, start, end, k, threshold)
+
+def _parallel_top_k(matrix, blocks, k, threshold, dense_right, workers):
+    arrays = {"data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr}
+    if dense_right:
+        arrays["right"] = matrix.T.toarray()
+    segments, spec = _share(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_similarity_worker,
+                                 initargs=(spec, matrix.shape)) as pool:
+            parts = list(pool.map(_similarity_worker, [(start, end, k, threshold) for start, end in blocks]))
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+    return _concat(parts)
+
+def lsh_top_k_similarity(matrix, k=5, threshold=0.3, rounds=LSH_ROUNDS, window=LSH_WINDOW, bits=LSH_BITS, seed=0):
+    """Approximate top-k neighbours by random-projection (SimHash) sort-and-window LSH.
+
+    Each round hashes every row to the signs of `bits` random projections and sorts
+    rows by that key, so rows pointing in similar directions tend to land close
+    together; each row is then compared exactly with the next `window` rows. A
+    running top-k per row is kept across rounds. Work is rounds * window * N sparse
+    dot products and memory is O(N * k), independent of how the corpus clusters;
+    neighbours that never fall within a window of each other are missed.
+    """
+    matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    n, dims = matrix.shape
+    best_cols = np.full((n, k), -1, dtype=np.int64)
+    best_scores = np.full((n, k), -np.inf, dtype=np.float32)
+    if n < 2 or k <= 0: return _from_best(best_cols, best_scores, threshold)
+
+    rng = np.random.default_rng(seed)
+    weights = 1 << np.arange(bits, dtype=np.int64)
+    for _ in range(rounds):
+        planes = rng.standard_normal((dims, bits)).astype(np.float32)
+        keys = (np.asarray(matrix @ planes) > 0) @ weights
+        order = np.argsort(keys, kind="stable")
+        ordered = matrix[order]
+        for w in range(1, min(window, n - 1) + 1):
+            scores = np.asarray(ordered[:-w].multiply(ordered[w:]).sum(axis=1)).ravel()
+            a, b = order[:-w], order[w:]
+            _offer(best_cols, best_scores, a, b, scores)
+            _offer(best_cols, best_scores, b, a, scores)
+    return _from_best(best_cols, best_scores, threshold)
+
+def _offer(best_cols, best_scores, rows, cols, scores):
+    # Each row appears at most once in rows, so one vectorised replace-the-minimum step
+    # per call keeps every row's top-k exact over the candidates offered so far.
+    known = (best_cols[rows] == cols[:, None]).any(axis=1)
+    slot = best_scores[rows].argmin(axis=1)
+    better = ~known & (scores > best_scores[rows, slot])
+    rows, slot = rows[better], slot[better]
+    best_cols[rows, slot] = cols[better]
+    best_scores[rows, slot] = scores[better]
+
+def _from_best(best_cols, best_scores, threshold):
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    cols = np.take_along_axis(best_cols, order, axis=1)
+    scores = np.take_along_axis(best_scores, order, axis=1)
+    keep = (scores > threshold) & (cols >= 0)
+    rows = np.repeat(np.arange(len(cols)), cols.shape[1]).reshape(cols.shape)
+    return rows[keep], cols[keep], scores[keep]
+
+def _concat(parts):
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    return tuple(np.concatenate([p[i] for p in parts]) for i in range(3))
@@ -1,47 +1,102 @@
 import json
 import os
 import math
-import re
-import unicodedata
 import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import TokenCache, tokenize_batch
+from search.compact_index import write_compact_index
+from search.date_partitions import write_partitions
+from search.doc_store import source_from_filename, write_doc_store
+from search.filters import write_filter_index
+from search.generation import publish_generation
+from search.passages import write_passage_index
+from search.sharding import write_shards
+
 DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
 INDEX_DIR = os.path.join(BASE_DIR, "index")
 INDEX_FILE = os.path.join(INDEX_DIR, "inverted_index.json")
+INDEX_SHARDS = int(os.environ.get("INDEX_SHARDS", 0))
+INDEX_SHARD_BY = os.environ.get("INDEX_SHARD_BY", "hash")
+INDEX_DATE_PARTITIONS = os.environ.get("INDEX_DATE_PARTITIONS", "")
 
-PERSIAN_STOPWORDS = {
-    "از", "به", "در", "که", "و", "را", "این", "آن", "برای", "با", "است", "شد", "می", "ها", "های", "بر",
-    "تا", "یک", "بود", "نیز", "کند", "شود", "کرده", "شده", "باید", "گفت", "دارد", "وی", "اما", "اگر",
-    "نیست", "هستند", "بی", "تر", "ترین", "خود", "دیگر", "هم", "چون", "چه", "پس", "پیش", "بین", "سپس"
+BM25_PARAMS = {
+    "k1": 1.2,
+    "b": 0.75,
+    "field_weights": {"title": 2.0, "content": 1.0},
+    "impact_bits": 8
 }
 
 def ensure_index_dir():
     if not os.path.exists(INDEX_DIR):
         os.makedirs(INDEX_DIR)
 
-def normalize_text(text):
-    if not text: return ""
-    text = unicodedata.normalize("NFKC", text)
-    text = re.sub(r'[^\w\s]', ' ', text)
-    return re.sub(r'\s+', ' ', text).strip()
+def bm25_idf(N, doc_freq):
+    return math.log(1 + (N - doc_freq + 0.5) / (doc_freq + 0.5))
+
+def compute_bm25_impacts(vocab, title_counts, field_lengths, N, params):
+    # BM25F: per-field length-normalised tf is weighted and summed before saturation,
+    # so each posting's contribution is a query-independent constant we can store.
+    k1 = params["k1"]
+    b = params["b"]
+    weights = params["field_weights"]
+    avg_len = {
+        field: (sum(lengths[field] for lengths in field_lengths.values()) / N) or 1.0
+        for field in weights
+    }
+
+    max_impact = 0.0
+    raw_impacts = {}
+    for term, postings in vocab.items():
+        term_idf = bm25_idf(N, len(postings))
+        impacts = []
+        for p in postings:
+            did = p['doc_id']
+            lengths = field_lengths[did]
+            title_tf = title_counts[did].get(term, 0)
+            field_tf = {"title": title_tf, "content": p['count'] - title_tf}
+
+            pseudo_tf = 0.0
+            for field, weight in weights.items():
+                if field_tf[field]:
+                    norm = 1 - b + b * lengths[field] / avg_len[field]
+                    pseudo_tf += weight * field_tf[field] / norm
+
+            impact = term_idf * pseudo_tf / (k1 + pseudo_tf)
+            impacts.append(impact)
+            if impact > max_impact:
+                max_impact = impact
+        raw_impacts[term] = impacts
+
+    levels = (1 << params["impact_bits"]) - 1
+    scale = max_impact / levels if max_impact > 0 else 1.0
+    for term, postings in vocab.items():
+        for p, impact in zip(postings, raw_impacts[term]):
+            p['impact'] = max(1, int(round(impact / scale)))
+            del p['count']
 
-def tokenize(text):
-    text = normalize_text(text)
-    tokens = text.split()
-    return [t for t in tokens if t not in PERSIAN_STOPWORDS and len(t) > 1]
+    return {
+        "k1": k1,
+        "b": b,
+        "field_weights": weights,
+        "avg_field_len": avg_len,
+        "impact_bits": params["impact_bits"],
+        "impact_scale": scale
+    }
 
-def build_index():
+def build_index(bm25_params=None, shards=INDEX_SHARDS, shard_by=INDEX_SHARD_BY, date_partitions=INDEX_DATE_PARTITIONS):
     print("\n--- Inverted Index Builder ---")
     
     if not os.path.exists(DATA_DIR):
         print("Data directory not found.")
-        return
+        return False
 
     clean_files = [f for f in os.listdir(DATA_DIR) if f.endswith("_clean.json")]
     if not clean_files:
         print("No cleaned data files (*_clean.json) found.")
-        return
+        return False
 
     print(f"Loading {len(clean_files)} datasets...")
     
@@ -51,6 +106,9 @@ def build_index():
         try:
             with open(path, "r", encoding="utf-8") as file:
                 docs = json.load(file)
+                file_source = source_from_filename(f)
+                for doc in docs:
+                    doc.setdefault('source', file_source)
                 all_docs.extend(docs)
         except Exception:
             pass
@@ -58,7 +116,7 @@ def build_index():
     N = len(all_docs)
     if N == 0:
         print("No documents found to index.")
-        return
+        return False
 
     print(f"Indexing {N} documents...")
 
@@ -67,13 +125,24 @@ def build_index():
     doc_lengths = {}
     doc_norms = {}
     
+    token_cache = TokenCache()
+    all_tokens = token_cache.tokenize_docs(all_docs)
+    token_cache.save()
+    all_title_tokens = tokenize_batch([d.get('title', '') for d in all_docs])
+    
+    title_counts = {}
+    field_lengths = {}
     
-    for doc in all_docs:
+    for doc, tokens, title_tokens in zip(all_docs, all_tokens, all_title_tokens):
         doc_id = doc['id']
-        text = doc['title'] + " " + doc['content']
-        tokens = tokenize(text)
         
         doc_lengths[doc_id] = len(tokens)
+        field_lengths[doc_id] = {"title": len(title_tokens), "content": len(tokens) - len(title_tokens)}
+        
+        doc_title_counts = {}
+        for t in title_tokens:
+            doc_title_counts[t] = doc_title_counts.get(t, 0) + 1
+        title_counts[doc_id] = doc_title_counts
         
         term_counts = {}
         for t in tokens:
@@ -86,7 +155,7 @@ def build_index():
             if term not in vocab:
                 vocab[term] = []
             
-            vocab[term].append({"doc_id": doc_id, "tf": tf})
+            vocab[term].append({"doc_id": doc_id, "tf": tf, "count": count})
             df[term] = df.get(term, 0) + 1
 
     
@@ -107,11 +176,13 @@ def build_index():
     for did in doc_norms:
         doc_norms[did] = math.sqrt(doc_norms[did])
 
+    bm25_stats = compute_bm25_impacts(vocab, title_counts, field_lengths, N, {**BM25_PARAMS, **(bm25_params or {})})
     
     index_data = {
         "stats": {
             "total_docs": N,
-            "avg_doc_len": sum(doc_lengths.values()) / N if N > 0 else 0
+            "avg_doc_len": sum(doc_lengths.values()) / N if N > 0 else 0,
+            "bm25": bm25_stats
         },
         "vocab": vocab,
         "idf": idf,
@@ -127,14 +198,73 @@ def build_index():
     }
 
     ensure_index_dir()
+    # Each artifact is swapped in atomically, but not all of them at once: running engines
+    # watch only the generation marker, which is published after the last one is in place.
+    # An artifact that fails to write leaves the previous build's copy on disk, so the
+    # generation is then not published at all.
+    failed = []
+    try:
+        stored = write_doc_store(all_docs)
+        print(f"Document store written: {stored} documents")
+    except Exception as e:
+        print(f"Failed to save document store: {e}")
+        failed.append("document store")
+
+    try:
+        facets = write_filter_index(list(index_data['doc_map']), {d['id']: d['source'] for d in all_docs}, {d['id']: d['publish_date'] for d in all_docs})
+        print(f"Filter bitmaps written: {facets}")
+    except Exception as e:
+        print(f"Failed to save filter bitmaps: {e}")
+        failed.append("filter bitmaps")
+
+    try:
+        terms, docs = write_compact_index(index_data)
+        print(f"Compact index written: {terms} terms x {docs} docs")
+    except Exception as e:
+        print(f"Failed to save compact index: {e}")
+        failed.append("compact index")
+
     try:
-        with open(INDEX_FILE, "w", encoding="utf-8") as f:
+        passages = write_passage_index(all_docs)
+        print(f"Passage index written: {passages} passages")
+    except Exception as e:
+        print(f"Failed to save passage index: {e}")
+        failed.append("passage index")
+
+    if shards > 0 or shard_by == "source":
+        try:
+            sizes = write_shards(index_data, shards, shard_by, {d['id']: d['source'] for d in all_docs})
+            print(f"Index sharded by {shard_by}: {sizes} documents per shard")
+        except Exception as e:
+            print(f"Failed to save shards: {e}")
+            failed.append("shards")
+
+    if date_partitions:
+        try:
+            sizes = write_partitions(index_data, date_partitions)
+            print(f"Index partitioned by {date_partitions}: {len(sizes)} partitions")
+        except Exception as e:
+            print(f"Failed to save date partitions: {e}")
+            failed.append("date partitions")
+
+    try:
+        tmp_path = INDEX_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(index_data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, INDEX_FILE)
         print(f"Index built successfully!")
         print(f"Saved to: {INDEX_FILE}")
         print(f"Vocab Size: {len(vocab)} terms")
     except Exception as e:
         print(f"Failed to save index: {e}")
+        return False
+
+    if failed:
+        print(f"Not publishing index generation: failed to save {', '.join(failed)}.")
+        return False
+    generation = publish_generation("index", {"docs": N})
+    print(f"Published index generation {generation}")
+    return True
 
 if __name__ == "__main__":
-    build_index()
+    sys.exit(0 if build_index() else 1)
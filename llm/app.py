@@ -31,10 +31,26 @@ st.markdown("""
 st.title("⚖️ سامانه تشخیص اخبار جعلی")
 st.markdown("---")
 
+@st.cache_resource
+def shared_detector():
+    # One detector per server process: sessions share the index and the LLM scheduler.
+    return FakeNewsDetector()
+
 if 'detector' not in st.session_state:
-    with st.spinner('در حال بارگذاری مدل‌های هوش مصنوعی...'):
-        st.session_state['detector'] = FakeNewsDetector()
+    st.session_state['detector'] = shared_detector()
+
+if st.session_state['detector'].readiness() == "serving":
     st.success("سیستم آماده است!")
+elif st.session_state['detector'].readiness() == "failed":
+    st.error("موتور جستجو لود نشد. ایندکس را دوباره بسازید.")
+else:
+    st.info("⏳ سیستم در حال آماده‌سازی است؛ اولین درخواست ممکن است کمی بیشتر طول بکشد.")
+
+llm_state = st.session_state['detector'].llm_state
+if llm_state == "offline":
+    st.caption("🔌 مدل زبانی در دسترس نیست؛ بررسی بدون هوش مصنوعی انجام می‌شود و اتصال خودکار دوباره برقرار می‌شود.")
+elif llm_state == "loading":
+    st.caption("⏳ مدل زبانی در حال بارگذاری است.")
 
 query = st.text_area("خبر یا ادعای مورد نظر را وارد کنید:", height=100, placeholder="مثال: قیمت بنزین فردا ۵۰۰۰ تومان می‌شود...")
 
@@ -42,6 +58,34 @@ col1, col2 = st.columns([1, 3])
 with col2:
     use_llm = st.checkbox("استفاده از هوش مصنوعی (LLM) برای تحلیل عمیق", value=True, help="در صورت غیرفعال کردن، سیستم فقط بر اساس آمار و گراف نظر می‌دهد (سریع‌تر).")
 
+def render_verdict(placeholder, verdict, confidence):
+    if verdict == "Verified":
+        placeholder.success(f"✅ **تایید شده (واقعی)** - اطمینان: {confidence}%")
+    elif verdict == "Fake":
+        placeholder.error(f"⛔ **جعلی (Fake)** - اطمینان: {confidence}%")
+    else:
+        placeholder.warning(f"⚠️ **مشکوک / غیرقابل تایید** - اطمینان: {confidence}%")
+
+def render_evidence(container, evidence_docs):
+    with container:
+        if not evidence_docs:
+            st.write("هیچ سند مشابهی در پایگاه داده یافت نشد.")
+            return
+        st.markdown("### 📄 مستندات یافت شده:")
+        for i, doc in enumerate(evidence_docs, 1):
+            with st.expander(f"سند {i}: {doc.get('title', 'بدون عنوان')}"):
+                source = doc.get('source', 'نامشخص')
+                score = doc.get('score', 0)
+                
+                tag = "⭐ منبع معتبر (High Authority)" if doc.get('graph_score', 0) > 0.001 else "منبع معمولی"
+                
+                st.markdown(f"**منبع:** {source} | {tag}")
+                st.markdown(f"**امتیاز نهایی:** `{score:.4f}`")
+                st.markdown(f"**تاریخ:** {doc.get('publish_date', '-')}")
+                st.markdown(f"**خلاصه متن:** {doc.get('content', '')[:300]}...")
+                if doc.get('url'):
+                    st.markdown(f"[مشاهده لینک اصلی]({doc.get('url')})")
+
 if st.button("بررسی حقیقت 🔍"):
     if not query:
         st.warning("لطفاً متنی وارد کنید.")
@@ -50,59 +94,64 @@ if st.button("بررسی حقیقت 🔍"):
         status_placeholder.info("⏳ در حال جستجو در پایگاه داده و تحلیل محتوا...")
         
         start_time = time.time()
-        
-        real_connection_status = st.session_state['detector'].is_connected
-        
-        if not use_llm:
-            st.session_state['detector'].is_connected = False
-        
-        try:
-            result = st.session_state['detector'].verify(query)
-        finally:
-            st.session_state['detector'].is_connected = real_connection_status
+        detector = st.session_state['detector']
+
+        # Placeholders are laid out up front and filled as the verification streams in:
+        # evidence as soon as retrieval finishes, verdict fields as the model emits them.
+        verdict_placeholder = st.empty()
+        reasoning_header = st.empty()
+        reasoning_placeholder = st.empty()
+        thinking_placeholder = st.empty()
+        timing_placeholder = st.empty()
+        evidence_container = st.container()
+
+        result = None
+        stats = {}
+        partial = {}
+        thinking_tokens = 0
+        for event in detector.verify_stream(query, use_llm):
+            if event["type"] == "evidence":
+                status_placeholder.info("🤖 اسناد یافت شد؛ در انتظار پاسخ مدل...")
+                render_evidence(evidence_container, event["docs"])
+            elif event["type"] == "token" and event["thinking"]:
+                thinking_tokens += 1
+                thinking_placeholder.caption(f"🧠 مدل در حال فکر کردن است... ({thinking_tokens} توکن)")
+            elif event["type"] == "field":
+                partial[event["name"]] = event["value"]
+                thinking_placeholder.empty()
+                if "status" in partial:
+                    render_verdict(verdict_placeholder, partial.get("status"), partial.get("confidence", "…"))
+                if "reasoning" in partial:
+                    reasoning_header.markdown("### 🧠 استدلال سیستم:")
+                    reasoning_placeholder.info(partial["reasoning"])
+            elif event["type"] == "verdict":
+                result = event["result"]
+                stats = event.get("stats") or {}
 
         end_time = time.time()
         duration = end_time - start_time
         
         status_placeholder.empty()
+        thinking_placeholder.empty()
 
         if result:
             verdict = result.get("status", "Unknown")
             confidence = result.get("confidence", 0)
             reasoning = result.get("reasoning", "")
             
-            if verdict == "Verified":
-                st.success(f"✅ **تایید شده (واقعی)** - اطمینان: {confidence}%")
-            elif verdict == "Fake":
-                st.error(f"⛔ **جعلی (Fake)** - اطمینان: {confidence}%")
-            else:
-                st.warning(f"⚠️ **مشکوک / غیرقابل تایید** - اطمینان: {confidence}%")
+            render_verdict(verdict_placeholder, verdict, confidence)
+            reasoning_header.markdown("### 🧠 استدلال سیستم:")
+            reasoning_placeholder.info(reasoning)
             
-            st.markdown("### 🧠 استدلال سیستم:")
-            st.info(reasoning)
-            
-            st.markdown("---")
-            st.markdown(f"⏱️ زمان پردازش: {duration:.2f} ثانیه")
-            
-            evidence_docs = st.session_state['detector'].search_engine.search(query, top_k=3)
-            
-            if evidence_docs:
-                st.markdown("### 📄 مستندات یافت شده:")
-                for i, doc in enumerate(evidence_docs, 1):
-                    with st.expander(f"سند {i}: {doc.get('title', 'بدون عنوان')}"):
-                        source = doc.get('source', 'نامشخص')
-                        score = doc.get('score', 0)
-                        
-                        tag = "⭐ منبع معتبر (High Authority)" if doc.get('graph_score', 0) > 0.001 else "منبع معمولی"
-                        
-                        st.markdown(f"**منبع:** {source} | {tag}")
-                        st.markdown(f"**امتیاز نهایی:** `{score:.4f}`")
-                        st.markdown(f"**تاریخ:** {doc.get('publish_date', '-')}")
-                        st.markdown(f"**خلاصه متن:** {doc.get('content', '')[:300]}...")
-                        if doc.get('url'):
-                            st.markdown(f"[مشاهده لینک اصلی]({doc.get('url')})")
-            else:
-                st.write("هیچ سند مشابهی در پایگاه داده یافت نشد.")
-                
+            timing = f"⏱️ زمان پردازش: {duration:.2f} ثانیه"
+            if stats.get("cached"):
+                timing += " | پاسخ از حافظه نهان"
+            elif stats.get("ttft") is not None:
+                timing += f" | اولین توکن: {stats['ttft']:.2f} ثانیه"
+                if stats.get("ttfa") is not None:
+                    timing += f" | اولین توکن پاسخ: {stats['ttfa']:.2f} ثانیه"
+                if stats.get("tokens_per_sec"):
+                    timing += f" | سرعت تولید: {stats['tokens_per_sec']:.1f} توکن/ثانیه"
+            timing_placeholder.markdown("---\n" + timing)
         else:
             st.error("خطا در پردازش. لطفاً مجدد تلاش کنید.")
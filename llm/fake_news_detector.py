@@ -2,10 +2,13 @@ import os
 import sys
 import json
 import re
+import time
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
 
 try:
     from ollama import Client
-    client = Client(host='http://127.0.0.1:11434')
+    client = Client(host=OLLAMA_HOST)
     OLLAMA_AVAILABLE = True
 except ImportError:
     OLLAMA_AVAILABLE = False
@@ -15,23 +18,133 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
 from search.search_engine import SearchEngine
+from search.client import SearchServiceError
+from search.passages import PASSAGE_INDEX_DIR, PASSAGE_META_FILE, PassageIndex, truncate_to_budget
+from llm.health import LLM_HEALTH_TIMEOUT, LLM_KEEP_ALIVE_SECONDS, LLMHealthMonitor
+from llm.scheduler import DeadlineExceeded, SchedulerBusy, VerificationScheduler
+from llm.verdict_cache import VerdictCache, verdict_key
 
 LOCAL_MODEL = "qwen3:8b"
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND")
+SEARCH_HOT_RELOAD = os.environ.get("SEARCH_HOT_RELOAD", "1") != "0"
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", 1.0))
+
+SEARCH_SERVICE_URL = os.environ.get("SEARCH_SERVICE_URL")
+EVIDENCE_DOCS = int(os.environ.get("EVIDENCE_DOCS", 5))
+EVIDENCE_TOKEN_BUDGET = int(os.environ.get("EVIDENCE_TOKEN_BUDGET", 900))
+VERDICT_CACHE_ENABLED = os.environ.get("VERDICT_CACHE", "1") != "0"
+
+_THINK_RE = re.compile(r'<think>.*?(?:</think>|$)', re.DOTALL)
+_STATUS_RE = re.compile(r'"status"\s*:\s*"(\w+)"')
+_CONFIDENCE_RE = re.compile(r'"confidence"\s*:\s*(\d+)\s*[,}\n]')
+_REASONING_RE = re.compile(r'"reasoning"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+def _in_think_block(text):
+    # Also true while the opening tag itself is still arriving.
+    if text.rfind('<think>') > text.rfind('</think>'): return True
+    head = text.lstrip()
+    return len(head) < len('<think>') and '<think>'.startswith(head)
+
+def _partial_fields(text):
+    # Verdict fields readable from a still-incomplete JSON answer; reasoning grows as it streams.
+    text = _THINK_RE.sub('', text)
+    fields = {}
+    match = _STATUS_RE.search(text)
+    if match:
+        fields["status"] = match.group(1)
+    match = _CONFIDENCE_RE.search(text)
+    if match:
+        fields["confidence"] = int(match.group(1))
+    match = _REASONING_RE.search(text)
+    if match and match.group(1):
+        try:
+            fields["reasoning"] = json.loads('"' + match.group(1).rstrip('\\') + '"')
+        except ValueError:
+            fields["reasoning"] = match.group(1)
+    return fields
+
+def _fmt_seconds(value):
+    return f"{value:.2f}s" if value is not None else "-"
+
+def create_search_engine(backend=SEARCH_BACKEND, hot_reload=SEARCH_HOT_RELOAD, lazy=True, service_url=SEARCH_SERVICE_URL):
+    if service_url:
+        # A running search/service.py owns the index; this process only holds a client.
+        from search.client import SearchClient
+        return SearchClient(service_url)
+    if backend is None:
+        # Hot reloads load each generation in this process; from the compact index that
+        # is a small header parse instead of a GIL-holding parse of the whole JSON index.
+        from search.compact_index import compact_index_exists
+        backend = "mapped" if hot_reload and compact_index_exists() else "postings"
+    engine_cls = SearchEngine
+    if backend == "matrix":
+        from search.matrix_search import MatrixSearchEngine
+        engine_cls = MatrixSearchEngine
+    elif backend == "mapped":
+        from search.matrix_search import MappedSearchEngine
+        engine_cls = MappedSearchEngine
+    elif backend == "sharded":
+        from search.sharding import ShardedSearchEngine
+        engine_cls = ShardedSearchEngine
+    elif backend == "partitioned":
+        from search.date_partitions import PartitionedSearchEngine
+        engine_cls = PartitionedSearchEngine
+    if hot_reload:
+        from search.hot_reload import ReloadingSearchEngine
+        return ReloadingSearchEngine(engine_factory=engine_cls, lazy=lazy)
+    return engine_cls(lazy=lazy)
 
 class FakeNewsDetector:
     def __init__(self, force_offline=False):
+        # Construction only wires things up: the index loads and the LLM health monitor
+        # runs in background threads, and readiness() reports when both are done.
+        start = time.perf_counter()
         print(f"Initializing Detector with model: {LOCAL_MODEL}...")
-        self.search_engine = SearchEngine()
-        self.is_connected = False
-        
-        if OLLAMA_AVAILABLE and not force_offline:
+        self.search_engine = create_search_engine()
+        self.search_engine.warm_async()
+        self.llm_health = None
+        self.passage_index = None
+        self.last_llm_stats = {}
+        # Every model call goes through the detector's scheduler; app.py shares one
+        # detector across sessions, so concurrent users share its queue and in-flight claims.
+        self.llm_scheduler = VerificationScheduler(self.stream_local_llm)
+        self.verdict_cache = None
+        if VERDICT_CACHE_ENABLED:
             try:
-                print("Testing connection to Ollama...")
-                client.chat(model=LOCAL_MODEL, messages=[{'role': 'user', 'content': 'hi'}])
-                print("SUCCESS: Connected to Local Ollama.")
-                self.is_connected = True
+                self.verdict_cache = VerdictCache()
             except Exception as e:
-                print(f"WARNING: Connection to Ollama failed. System is OFFLINE. Error: {e}")
+                print(f"WARNING: Verdict cache unavailable, every claim goes to the model. Error: {e}")
+        
+        if OLLAMA_AVAILABLE and not force_offline:
+            self.llm_health = LLMHealthMonitor(client, LOCAL_MODEL, probe_client=Client(host=OLLAMA_HOST, timeout=LLM_HEALTH_TIMEOUT))
+            self.llm_health.start()
+
+        self.startup_seconds = time.perf_counter() - start
+        if self.startup_seconds > STARTUP_BUDGET_SECONDS:
+            print(f"WARNING: Detector startup took {self.startup_seconds:.2f}s (budget {STARTUP_BUDGET_SECONDS:.2f}s).")
+        else:
+            print(f"Detector constructed in {self.startup_seconds * 1000:.0f} ms; warming up in the background.")
+
+    @property
+    def is_connected(self):
+        return self.llm_health is not None and self.llm_health.is_connected
+
+    @property
+    def llm_state(self):
+        return self.llm_health.state if self.llm_health is not None else "offline"
+
+    def check_connection(self):
+        # Synchronous check on demand; the monitor repeats it in the background.
+        if self.llm_health is None: return False
+        return self.llm_health.check() != "offline"
+
+    def readiness(self):
+        engine_state = self.search_engine.readiness()
+        if engine_state == "failed":
+            return "failed"
+        if engine_state != "serving" or self.llm_state == "checking":
+            return "warming"
+        return "serving"
 
     def extract_json(self, text):
         try:
@@ -45,13 +158,34 @@ class FakeNewsDetector:
         except:
             return None
 
-    def call_local_llm(self, claim, context_docs):
-        print("--- SENDING PROMPT TO AI ---")
-        
+    def load_passage_index(self):
+        # Reopened whenever the indexer writes a new generation.
+        meta_path = os.path.join(PASSAGE_INDEX_DIR, PASSAGE_META_FILE)
+        try:
+            generation = os.path.getmtime(meta_path)
+        except OSError:
+            return None
+        if self.passage_index is None or self.passage_index.generation != generation:
+            try:
+                self.passage_index = PassageIndex()
+            except Exception as e:
+                print(f"WARNING: Passage index unavailable, sending article prefixes. Error: {e}")
+                return None
+        return self.passage_index
+
+    def gather_evidence(self, claim, context_docs, token_budget=EVIDENCE_TOKEN_BUDGET):
+        """{doc_id: [passage, ...]}: the passages of context_docs that best match the claim, within token_budget."""
+        passage_index = self.load_passage_index()
+        if passage_index is None:
+            return truncate_to_budget(context_docs, token_budget)
+        return passage_index.select(claim, context_docs, token_budget)
+
+    def build_prompt(self, claim, context_docs):
+        evidence = self.gather_evidence(claim, context_docs)
         evidence_text = ""
-        for i, doc in enumerate(context_docs, 1):
+        for i, doc in enumerate((d for d in context_docs if d.get('id') in evidence), 1):
             title = doc.get('title', 'No Title')
-            content = doc.get('content', '')[:2000]
+            content = " ... ".join(evidence[doc['id']])
             date = doc.get('publish_date', 'Unknown')
             source = doc.get('source', 'Unknown')
             score = doc.get('score', 0)
@@ -82,27 +216,86 @@ class FakeNewsDetector:
             "reasoning": "Write a short explanation in Persian (Farsi)."
         }}
         """
+        return prompt
+
+    def call_local_llm(self, claim, context_docs):
+        result = None
+        for event in self.stream_local_llm(claim, context_docs):
+            if event["type"] == "verdict":
+                result = event["result"]
+        return result
+
+    def stream_local_llm(self, claim, context_docs):
+        """Streams the model's answer as events, ending with the parsed verdict.
+
+        Yields {"type": "token", "text", "thinking"} per streamed piece, {"type":
+        "field", "name", "value"} as soon as status, confidence or (growing) reasoning
+        can be read from the partial JSON, and finally {"type": "verdict", "result",
+        "stats"}. stats carries time to first token, time to first answer token (after
+        any thinking) and generation tokens/sec.
+        """
+        print("--- SENDING PROMPT TO AI ---")
+        prompt = self.build_prompt(claim, context_docs)
+        start = time.perf_counter()
+        stats = {"ttft": None, "ttfa": None, "tokens": 0, "tokens_per_sec": None, "seconds": None}
+        content = ""
+        fields = {}
 
         try:
-            response = client.chat(model=LOCAL_MODEL, messages=[
+            stream = client.chat(model=LOCAL_MODEL, messages=[
                 {'role': 'user', 'content': prompt}
-            ])
+            ], stream=True, keep_alive=LLM_KEEP_ALIVE_SECONDS)
             
-            content = response['message']['content']
+            for chunk in stream:
+                message = chunk.get('message') or {}
+                pieces = [(message.get('thinking') or "", True), (message.get('content') or "", None)]
+                for text, thinking in pieces:
+                    if not text: continue
+                    if stats["ttft"] is None:
+                        stats["ttft"] = time.perf_counter() - start
+                    stats["tokens"] += 1
+                    if thinking is None:
+                        content += text
+                        thinking = _in_think_block(content)
+                        if not thinking and stats["ttfa"] is None:
+                            stats["ttfa"] = time.perf_counter() - start
+                    yield {"type": "token", "text": text, "thinking": thinking}
+                    if not thinking:
+                        for name, value in _partial_fields(content).items():
+                            if fields.get(name) != value:
+                                fields[name] = value
+                                yield {"type": "field", "name": name, "value": value}
+                if chunk.get('done') and chunk.get('eval_count') and chunk.get('eval_duration'):
+                    stats["tokens"] = chunk['eval_count']
+                    stats["tokens_per_sec"] = chunk['eval_count'] / (chunk['eval_duration'] / 1e9)
+
+            stats["seconds"] = time.perf_counter() - start
+            if stats["tokens_per_sec"] is None and stats["ttft"] is not None and stats["seconds"] > stats["ttft"]:
+                stats["tokens_per_sec"] = stats["tokens"] / (stats["seconds"] - stats["ttft"])
+            self.last_llm_stats = stats
+            if self.llm_health is not None:
+                self.llm_health.report_success()
             print("--- AI RESPONSE RECEIVED ---")
-            print(content) 
+            print(content)
+            print(f"LLM stats: first token {_fmt_seconds(stats['ttft'])}, first answer token {_fmt_seconds(stats['ttfa'])}, "
+                  f"{stats['tokens']} tokens in {stats['seconds']:.2f}s ({stats['tokens_per_sec'] or 0:.1f} tokens/sec)")
             
-            parsed = self.extract_json(content)
+            parsed = self.extract_json(_THINK_RE.sub('', content))
             
             if parsed:
-                return parsed
+                # Only model verdicts are cached; the logic fallback is cheap to rerun.
+                if self.verdict_cache is not None:
+                    self.verdict_cache.put(verdict_key(claim, context_docs, LOCAL_MODEL), parsed)
+                yield {"type": "verdict", "result": parsed, "stats": stats}
+                return
             else:
                 print("ERROR: Could not parse JSON from AI response.")
-                return self.call_llm_logic(claim, context_docs)
             
         except Exception as e:
             print(f"CRITICAL AI ERROR: {e}")
-            return self.call_llm_logic(claim, context_docs)
+            if self.llm_health is not None:
+                self.llm_health.report_failure(e)
+        yield {"type": "verdict", "result": self.call_llm_logic(claim, context_docs), "stats": stats}
 
     def call_llm_logic(self, claim, context_docs):
         print("Fallback to Logic (Non-AI verification)...")
@@ -117,24 +310,67 @@ class FakeNewsDetector:
         else:
             return {"status": "Suspicious", "confidence": 30, "reasoning": "ارتباط معنایی اسناد با ادعا کم است (حالت آفلاین)."}
 
-    def verify(self, claim):
+    def verify(self, claim, use_llm=True):
+        result = None
+        for event in self.verify_stream(claim, use_llm):
+            if event["type"] == "verdict":
+                result = event["result"]
+        return result
+
+    def verify_stream(self, claim, use_llm=True):
+        """verify as a stream of events for incremental display.
+
+        The first event is {"type": "evidence", "docs"} once retrieval is done, so the
+        evidence can render before the model answers; model output follows as in
+        stream_local_llm, and the last event is always a {"type": "verdict"}.
+        """
         print(f"\nVerifying Claim: {claim[:50]}...")
         
-        if not self.search_engine.is_loaded:
-            return {
+        if not self.search_engine.ensure_loaded():
+            yield {"type": "verdict", "stats": {}, "result": {
                 "status": "Error", 
                 "confidence": 0, 
                 "reasoning": "موتور جستجو لود نشده است."
-            }
+            }}
+            return
             
-        results = self.search_engine.search(claim, top_k=3)
+        try:
+            results = self.search_engine.search(claim, top_k=EVIDENCE_DOCS)
+        except SearchServiceError as e:
+            # The search service went away after ensure_loaded saw it serving.
+            print(f"WARNING: {e}")
+            yield {"type": "verdict", "stats": {}, "result": {
+                "status": "Error",
+                "confidence": 0,
+                "reasoning": "موتور جستجو در دسترس نیست."
+            }}
+            return
         print(f"Search found {len(results)} relevant docs.")
+        yield {"type": "evidence", "docs": results}
+
+        key = verdict_key(claim, results, LOCAL_MODEL)
+        # Cached verdicts are model verdicts: only for callers that asked for the model,
+        # though they still answer while it is offline.
+        if use_llm and self.verdict_cache is not None:
+            cached = self.verdict_cache.get(key)
+            if cached is not None:
+                print("Verdict cache hit.")
+                yield {"type": "verdict", "result": cached, "stats": {"cached": True}}
+                return
         
-        if self.is_connected:
-            return self.call_local_llm(claim, results)
+        if use_llm and self.llm_state == "checking":
+            # Sent before the first health check settled: wait for it rather than
+            # answering with the offline heuristic while the model may be up.
+            self.llm_health.wait_checked(LLM_HEALTH_TIMEOUT)
+        if self.is_connected and use_llm:
+            try:
+                yield from self.llm_scheduler.submit(key, claim, results).events()
+            except (SchedulerBusy, DeadlineExceeded) as e:
+                print(f"WARNING: {e}. Falling back to logic verification.")
+                yield {"type": "verdict", "result": self.call_llm_logic(claim, results), "stats": {}}
         else:
             print("Skipping AI because connection is False.")
-            return self.call_llm_logic(claim, results)
+            yield {"type": "verdict", "result": self.call_llm_logic(claim, results), "stats": {}}
 
 if __name__ == "__main__":
     detector = FakeNewsDetector()
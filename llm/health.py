@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+
+LLM_HEALTH_INTERVAL = float(os.environ.get("LLM_HEALTH_INTERVAL", 15))
+LLM_HEALTH_RETRY = float(os.environ.get("LLM_HEALTH_RETRY", 3))
+LLM_HEALTH_TIMEOUT = float(os.environ.get("LLM_HEALTH_TIMEOUT", 3))
+LLM_KEEP_ALIVE_SECONDS = int(os.environ.get("LLM_KEEP_ALIVE_SECONDS", 1800))
+
+class LLMHealthMonitor:
+    """Background connectivity check for the local Ollama model, plus warm-keeping.
+
+    Each check asks Ollama which models are loaded (/api/ps), which answers without
+    touching a model. If ours is not loaded it is loaded with an empty-prompt generate,
+    which Ollama treats as a load request and answers without generating; while it is
+    loaded, the same ping is repeated every half keep-alive period so an idle model is
+    not unloaded. Checks run every `interval` seconds while connected and every `retry`
+    seconds while offline, so an Ollama restart is picked up without restarting the
+    app. report_failure lets callers mark the server down as soon as a request fails.
+    probe_client, if given, is used for the /api/ps check, so it can carry a short
+    timeout that a model load through client would exceed.
+
+    state is "checking" until the first check finishes (wait_checked blocks for it),
+    then "connected" (model loaded), "loading" (server up, model loading) or "offline".
+    """
+
+    def __init__(self, client, model, interval=LLM_HEALTH_INTERVAL, retry=LLM_HEALTH_RETRY,
+                 keep_alive=LLM_KEEP_ALIVE_SECONDS, probe_client=None):
+        self.client = client
+        self.probe_client = probe_client or client
+        self.model = model
+        self.interval = interval
+        self.retry = retry
+        self.keep_alive = keep_alive
+        self.state = "checking"
+        self.error = None
+        self.last_check = None
+        self.last_ping = 0.0
+        self.checks = 0
+        self.transitions = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._checked = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def is_connected(self):
+        return self.state in ("connected", "loading")
+
+    def wait_checked(self, timeout=LLM_HEALTH_TIMEOUT):
+        # Until the first check settles, "checking" says nothing about the server, so a
+        # caller deciding whether to use the model waits for it (bounded) instead.
+        self._checked.wait(timeout)
+        return self.state
+
+    def start(self):
+        if self._thread is not None: return
+        self._thread = threading.Thread(target=self._run, name="llm-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._wake.wait(self.interval if self.is_connected else self.retry)
+            self._wake.clear()
+
+    def _set_state(self, state, error=None):
+        with self._lock:
+            previous, self.state, self.error = self.state, state, error
+            if previous != state:
+                self.transitions += 1
+        self._checked.set()
+        if previous != state:
+            detail = f" ({error})" if error else ""
+            print(f"LLM health: {previous} -> {state}{detail}")
+
+    def _loaded(self):
+        models = self.probe_client.ps().get('models') or []
+        return any(self.model in (m.get('model'), m.get('name')) for m in models)
+
+    def check(self):
+        """One health check (and keep-alive ping when due); returns the new state."""
+        self.checks += 1
+        self.last_check = time.time()
+        try:
+            loaded = self._loaded()
+        except Exception as e:
+            self._set_state("offline", str(e))
+            return self.state
+
+        now = time.monotonic()
+        if loaded and now - self.last_ping < self.keep_alive / 2:
+            self._set_state("connected")
+            return self.state
+        if not loaded:
+            self._set_state("loading")
+        try:
+            self.client.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+            self.last_ping = time.monotonic()
+            self._set_state("connected")
+        except Exception as e:
+            # Reachable but the model cannot be loaded (e.g. not pulled): nothing to send requests to.
+            self._set_state("offline", str(e))
+        return self.state
+
+    def report_failure(self, error):
+        # A failed request is fresher evidence than the last check: mark the server down
+        # and recheck now instead of at the next interval.
+        self._set_state("offline", str(error))
+        self._wake.set()
+
+    def report_success(self):
+        if self.state != "connected":
+            self._set_state("connected")
+        self.last_ping = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "error": self.error,
+                "model": self.model,
+                "last_check": self.last_check,
+                "checks": self.checks,
+                "transitions": self.transitions
+            }
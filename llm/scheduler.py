@@ -0,0 +1,218 @@
+import os
+import time
+import types
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# Match Ollama's own OLLAMA_NUM_PARALLEL: more concurrent requests than it has slots
+# only queue inside Ollama, where they can no longer be deduplicated or expired.
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", os.environ.get("OLLAMA_NUM_PARALLEL", 1)))
+LLM_QUEUE_SIZE = int(os.environ.get("LLM_QUEUE_SIZE", 16))
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", 120))
+LLM_QUEUE_WAIT_SECONDS = float(os.environ.get("LLM_QUEUE_WAIT_SECONDS", 5))
+
+class SchedulerBusy(Exception):
+    pass
+
+class DeadlineExceeded(Exception):
+    pass
+
+_DONE = object()
+
+class _Job:
+    """One scheduled call, shared by every request coalesced onto it."""
+
+    def __init__(self, key, args, deadline):
+        self.key = key
+        self.args = args
+        self.deadline = deadline
+        self.future = Future()
+        self.history = []
+        self.listeners = []
+        self.done = False
+        self.lock = threading.Lock()
+
+    def listen(self):
+        # A late joiner first replays what earlier listeners have already seen.
+        q = queue.Queue()
+        with self.lock:
+            for event in self.history:
+                q.put(event)
+            if self.done:
+                q.put(_DONE)
+            else:
+                self.listeners.append(q)
+        return q
+
+    def publish(self, event):
+        with self.lock:
+            self.history.append(event)
+            for q in self.listeners:
+                q.put(event)
+
+    def finish(self, result=None, error=None):
+        with self.lock:
+            self.done = True
+            for q in self.listeners:
+                q.put(_DONE)
+            self.listeners = []
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+class Ticket:
+    """A caller's handle on a scheduled job, bounded by that caller's own deadline."""
+
+    def __init__(self, job, deadline, coalesced):
+        self.job = job
+        self.deadline = deadline
+        self.coalesced = coalesced
+
+    def _remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def result(self):
+        try:
+            return self.job.future.result(timeout=self._remaining())
+        except FutureTimeout:
+            raise DeadlineExceeded("Verification did not finish before its deadline")
+
+    def events(self):
+        """Events of a generator job as they are produced; raises the job's error, if any, at the end."""
+        q = self.job.listen()
+        while True:
+            try:
+                event = q.get(timeout=self._remaining())
+            except queue.Empty:
+                raise DeadlineExceeded("Verification did not finish before its deadline")
+            if event is _DONE: break
+            yield event
+        error = self.job.future.exception()
+        if error is not None:
+            raise error
+
+class VerificationScheduler:
+    """Bounded queue and fixed worker pool in front of the local LLM.
+
+    run(*args) does one verification; if it returns a generator, each yielded event
+    is relayed to the job's listeners and the last one is the result. Requests with
+    the same key while one is queued or running share that job instead of calling the
+    model again. When max_queue jobs are already waiting, submit blocks the caller for
+    up to queue_wait seconds (never past its deadline) and then raises SchedulerBusy,
+    rather than letting the queue and its latency grow without bound. A job still
+    queued when the latest deadline of its callers passes is dropped without calling
+    the model.
+    Ollama serves one request per parallel slot, so concurrency should match its
+    OLLAMA_NUM_PARALLEL: that is as much batching as its chat API allows.
+    """
+
+    def __init__(self, run, concurrency=LLM_CONCURRENCY, max_queue=LLM_QUEUE_SIZE, deadline=LLM_DEADLINE_SECONDS,
+                 queue_wait=LLM_QUEUE_WAIT_SECONDS):
+        self.run = run
+        self.concurrency = max(1, concurrency)
+        self.deadline = deadline
+        self.queue_wait = queue_wait
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._workers = []
+        self._closed = False
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.expired = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+
+    def _ensure_workers(self):
+        # Called under self._lock; workers start with the first request.
+        while len(self._workers) < self.concurrency:
+            worker = threading.Thread(target=self._work, name=f"llm-worker-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, key, *args, deadline=None):
+        now = time.monotonic()
+        deadline = now + (deadline if deadline is not None else self.deadline)
+        with self._lock:
+            if self._closed:
+                raise SchedulerBusy("Verification scheduler is shut down")
+            self.submitted += 1
+            job = self._inflight.get(key)
+            if job is not None:
+                job.deadline = max(job.deadline, deadline)
+                self.coalesced += 1
+                return Ticket(job, deadline, coalesced=True)
+            # Registered before it is queued, so identical claims arriving while this
+            # caller waits for queue space join it instead of queueing again.
+            job = _Job(key, args, deadline)
+            self._inflight[key] = job
+            self._ensure_workers()
+        try:
+            self._queue.put(job, timeout=max(0.0, min(self.queue_wait, deadline - now)))
+        except queue.Full:
+            error = SchedulerBusy(f"Verification queue is full ({self._queue.maxsize} waiting)")
+            self._finish(job, error=error, counter="rejected")
+            raise error
+        return Ticket(job, deadline, coalesced=False)
+
+    def __call__(self, key, *args, deadline=None):
+        return self.submit(key, *args, deadline=deadline).result()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None: break
+            if time.monotonic() > job.deadline:
+                self._finish(job, error=DeadlineExceeded("Verification expired in the queue"), counter="expired")
+                continue
+            with self._lock:
+                self.running += 1
+            try:
+                output = self.run(*job.args)
+                if isinstance(output, types.GeneratorType):
+                    result = None
+                    for event in output:
+                        job.publish(event)
+                        result = event
+                    output = result
+                self._finish(job, result=output, counter="completed")
+            except Exception as e:
+                self._finish(job, error=e, counter="failed")
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    def _finish(self, job, result=None, error=None, counter="completed"):
+        with self._lock:
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            setattr(self, counter, getattr(self, counter) + 1)
+        job.finish(result, error)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "queued": self._queue.qsize(),
+                "running": self.running,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "completed": self.completed,
+                "failed": self.failed
+            }
+
+    def close(self):
+        # Queued jobs still run; workers exit once the queue drains.
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import normalize_persian, normalize_text
+
+DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
+VERDICT_CACHE_FILE = os.environ.get("VERDICT_CACHE_FILE", os.path.join(DATA_DIR, "verdict_cache.sqlite"))
+VERDICT_CACHE_SIZE = int(os.environ.get("VERDICT_CACHE_SIZE", 10000))
+VERDICT_CACHE_TTL = float(os.environ.get("VERDICT_CACHE_TTL", 7 * 24 * 3600))
+
+def normalize_claim(claim):
+    # Folds Persian letter variants, punctuation and spacing, but keeps every word:
+    # stopwords such as negations change what a claim says.
+    return normalize_text(normalize_persian(claim)).lower()
+
+def verdict_key(claim, evidence_docs, model):
+    """Cache key over the normalised claim, the evidence (ids and content hashes, in rank order) and the model."""
+    evidence = [(doc.get('id'), hashlib.sha1(doc.get('content', '').encode("utf-8")).hexdigest()) for doc in evidence_docs]
+    payload = json.dumps([normalize_claim(claim), evidence, model], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class VerdictCache:
+    """Persistent LLM verdict cache in SQLite with a TTL and least-recently-used eviction.
+
+    Entries are keyed by verdict_key, so a claim whose evidence set or evidence text has
+    changed since it was checked misses and gets a fresh verdict; the stale entry ages
+    out. The database is in WAL mode so the Streamlit app and the CLI can share it.
+    """
+
+    def __init__(self, path=VERDICT_CACHE_FILE, max_entries=VERDICT_CACHE_SIZE, ttl=VERDICT_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " key TEXT PRIMARY KEY, verdict TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_accessed ON verdicts (accessed)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT verdict, created FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            verdict, created = row
+            if self.ttl and created + self.ttl < now:
+                self._conn.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE verdicts SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(verdict)
+
+    def put(self, key, verdict):
+        if self.max_entries <= 0: return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(verdict, ensure_ascii=False), now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+            if count > self.max_entries:
+                # Expired entries go first, then the least recently used.
+                expired = self._conn.execute("DELETE FROM verdicts WHERE created < ?", (now - self.ttl,)).rowcount if self.ttl else 0
+                excess = count - expired - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY accessed LIMIT ?)", (excess,)
+                    )
+                self.evictions += expired + max(0, excess)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM verdicts")
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -98,6 +98,7 @@ def main_menu():
     llm_dir = os.path.join(BASE_DIR, "llm")
     
     app_path = os.path.join(llm_dir, "app.py")
+    service_path = os.path.join(BASE_DIR, "search", "service.py")
 
     while True:
         os.system('clear' if os.name == 'posix' else 'cls')
@@ -110,6 +111,7 @@ def main_menu():
         print("-" * 40)
         print("4. Start AI Engine (Ollama)")
         print("5. Launch Web UI   (Streamlit)")
+        print("6. Search Service  (Optional, shared index)")
         print("-" * 40)
         print("0. Exit")
         
@@ -136,6 +138,9 @@ def main_menu():
             else:
                 print(f"\n[Error] app.py not found at: {app_path}")
                 input("Press Enter...")
+
+        elif choice == '6':
+            launch_new_window(f"python \\\"{service_path}\\\"", "Search Service")
                 
         else:
             print("Invalid option.")
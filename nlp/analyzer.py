@@ -0,0 +1,155 @@
+import os
+import re
+import pickle
+import hashlib
+import unicodedata
+import zlib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
+TOKEN_CACHE_FILE = os.path.join(DATA_DIR, "token_cache.pkl")
+
+PERSIAN_STOPWORDS = frozenset({
+    "از", "به", "در", "که", "و", "را", "این", "آن", "برای", "با", "است", "شد", "می", "ها", "های", "بر",
+    "تا", "یک", "بود", "نیز", "کند", "شود", "کرده", "شده", "باید", "گفت", "دارد", "وی", "اما", "اگر",
+    "نیست", "هستند", "بی", "تر", "ترین", "خود", "دیگر", "هم", "چون", "چه", "پس", "پیش", "بین", "سپس"
+})
+
+# Applied as a chain of str.replace: each is a C-level scan, far faster than a dict-based str.translate.
+_PERSIAN_REPLACEMENTS = (
+    ("ي", "ی"), ("ى", "ی"), ("ك", "ک"), ("ة", "ه"),
+    ("ؤ", "و"), ("ئ", "ی"), ("أ", "ا"), ("إ", "ا"),
+    ("آ", "ا"), ("اً", "ا"),
+    ("\u200c", " "),
+    ("…", " "), ("—", "-"), ("ـ", ""),
+    ("«", '"'), ("»", '"'), ("“", '"'), ("”", '"')
+)
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_BATCH_PUNCT_RE = re.compile(r'[^\w\s\x00]')
+_SPACE_RE = re.compile(r'\s+')
+_BATCH_SEP = "\x00"
+
+def normalize_persian(text):
+    if not text: return ""
+    text = unicodedata.normalize("NFKC", text)
+    for src, dst in _PERSIAN_REPLACEMENTS:
+        if src in text:
+            text = text.replace(src, dst)
+    return text
+
+def normalize_text(text):
+    if not text: return ""
+    text = unicodedata.normalize("NFKC", text)
+    text = _PUNCT_RE.sub(' ', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+_FOLDED_STOPWORDS = frozenset(normalize_persian(w) for w in PERSIAN_STOPWORDS)
+
+def _filter_tokens(tokens, stopwords=_FOLDED_STOPWORDS):
+    return [t for t in tokens if len(t) > 1 and t not in stopwords]
+
+def tokenize(text):
+    if not text: return []
+    text = normalize_persian(text)
+    return _filter_tokens(_PUNCT_RE.sub(' ', text).split())
+
+def tokenize_batch(texts):
+    # One normalisation and one regex pass over the whole batch instead of one per text.
+    if not texts: return []
+    joined = _BATCH_SEP.join((t or "").replace(_BATCH_SEP, " ") for t in texts)
+    joined = _BATCH_PUNCT_RE.sub(' ', normalize_persian(joined))
+    return [_filter_tokens(part.split()) for part in joined.split(_BATCH_SEP)]
+
+def analyzer_fingerprint():
+    """Digest of everything that shapes a token stream, so cached streams die with the analyzer."""
+    h = hashlib.sha1()
+    for part in (sorted(PERSIAN_STOPWORDS), _PERSIAN_REPLACEMENTS, _PUNCT_RE.pattern, _BATCH_PUNCT_RE.pattern, "NFKC", "min_len=2"):
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+ANALYZER_FINGERPRINT = analyzer_fingerprint()
+
+def doc_text(doc):
+    return doc.get('title', '') + " " + doc.get('content', '')
+
+class TokenCache:
+    """Token streams per doc ID, persisted so the index and graph builds tokenize each article once.
+
+    Entries are keyed by the article text's checksum, and the file by ANALYZER_FINGERPRINT:
+    a cache written by a different analyzer (stopwords, normalisation) is discarded whole.
+    save() keeps only the documents seen in this run, so deleted articles drop out.
+    """
+
+    def __init__(self, path=TOKEN_CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.seen = set()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, "rb") as f:
+                payload = pickle.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load token cache: {e}")
+            return
+        if not isinstance(payload, dict) or payload.get("analyzer") != ANALYZER_FINGERPRINT:
+            print("Token cache was written by a different analyzer; re-tokenizing all documents.")
+            return
+        self.entries = payload["entries"]
+
+    def save(self, live_ids=None):
+        # live_ids: every document of the corpus when this run tokenized only some of them
+        # (incremental graph updates); otherwise the documents seen in this run.
+        live = self.seen if live_ids is None else set(live_ids) | self.seen
+        stale = [doc_id for doc_id in self.entries if doc_id not in live] if live else []
+        for doc_id in stale:
+            del self.entries[doc_id]
+        if not self.path or not (self.dirty or stale): return
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"analyzer": ANALYZER_FINGERPRINT, "entries": self.entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            print(f"Warning: Could not save token cache: {e}")
+
+    def tokenize_docs(self, docs, batch_size=256):
+        results = [None] * len(docs)
+        pending = []
+        for i, doc in enumerate(docs):
+            self.seen.add(doc['id'])
+            text = doc_text(doc)
+            checksum = zlib.crc32(text.encode("utf-8"))
+            cached = self.entries.get(doc['id'])
+            if cached is not None and cached[0] == checksum:
+                results[i] = cached[1]
+                self.hits += 1
+            else:
+                pending.append((i, doc['id'], checksum, text))
+
+        self.misses += len(pending)
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            for (i, doc_id, checksum, _), tokens in zip(chunk, tokenize_batch([c[3] for c in chunk])):
+                results[i] = tokens
+                self.entries[doc_id] = (checksum, tokens)
+        if pending:
+            self.dirty = True
+        return results
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
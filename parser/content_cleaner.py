@@ -1,58 +1,57 @@
 import json
 import re
 import os
-import unicodedata
 import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import normalize_persian
+
 DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
 
-def normalize_persian(text):
-    if not text: return ""
-    
-    replacements = {
-        "ي": "ی", "ى": "ی", "ك": "ک", "ة": "ه",
-        "ؤ": "و", "ئ": "ی", "أ": "ا", "إ": "ا",
-        "آ": "ا", "اً": "ا",
-        "‌": " ", "\u200c": " ",
-        "…": " ", "—": "-", "ـ": "",
-        "«": '"', "»": '"', "“": '"', "”": '"'
-    }
-    
-    text = unicodedata.normalize("NFKC", text)
-    for f, t in replacements.items():
-        text = text.replace(f, t)
-    
-    return text
+NOISE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r"انتهای پیام/?",
+    r"کد خبر[:\s]*\d+",
+    r"لینک کوتاه",
+    r"برای مشاهده.*?کلیک کنید",
+    r"مشاهده خبر",
+    r"منبع[:\s]*\w+",
+    r"تولید[:\s]*\w+",
+    r"https?://[^\s<>\"']+|www\.[^\s<>\"']+",
+    r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[A-Za-z]{2,}",
+    r"@[a-zA-Z0-9_]+",
+    r"\b\d{5,}\b",
+]]
+SPACE_RE = re.compile(r"\s+")
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.?!؛])\s+")
+SENTENCE_SEPARATOR = " . "
 
 def clean_text(raw_content):
     if not raw_content: return ""
 
     text = normalize_persian(raw_content)
 
-    noise_patterns = [
-        r"انتهای پیام/?",
-        r"کد خبر[:\s]*\d+",
-        r"لینک کوتاه",
-        r"برای مشاهده.*?کلیک کنید",
-        r"مشاهده خبر",
-        r"منبع[:\s]*\w+",
-        r"تولید[:\s]*\w+",
-        r"https?://[^\s<>\"']+|www\.[^\s<>\"']+",
-        r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[A-Za-z]{2,}",
-        r"@[a-zA-Z0-9_]+",
-        r"\b\d{5,}\b",
-    ]
-    
-    for pattern in noise_patterns:
-        text = re.sub(pattern, " ", text, flags=re.IGNORECASE)
+    for pattern in NOISE_PATTERNS:
+        text = pattern.sub(" ", text)
 
-    text = re.sub(r"\s+", " ", text).strip()
+    text = SPACE_RE.sub(" ", text).strip()
     
-    sentences = re.split(r"(?<=[.?!؛])\s+", text)
+    sentences = SENTENCE_SPLIT_RE.split(text)
     clean_sentences = [s.strip() for s in sentences if len(s.split()) > 4]
     
-    return " . ".join(clean_sentences).strip()
+    return SENTENCE_SEPARATOR.join(clean_sentences).strip()
+
+def sentence_spans(clean_content):
+    # (start, end) character spans of the sentences clean_text joined, so passages can
+    # be cut from the stored content without re-running the cleaner.
+    spans, start = [], 0
+    while start < len(clean_content):
+        end = clean_content.find(SENTENCE_SEPARATOR, start)
+        if end < 0: end = len(clean_content)
+        if end > start: spans.append((start, end))
+        start = end + len(SENTENCE_SEPARATOR)
+    return spans
 
 def process_file(input_path, output_path):
     try:
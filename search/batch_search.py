@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from search.search_engine import SearchEngine
+
+RESULT_FIELDS = ("id", "score", "text_score", "graph_score", "title", "url", "date", "source")
+
+def load_claims(path, field):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {field: record}
+            records.append(record)
+    return records
+
+def run_batch(input_path, output_path, field="claim", top_k=3, workers=None, backend="postings", ranking="cosine", service_url=None):
+    print("\n--- Batch Claim Search ---")
+    records = load_claims(input_path, field)
+    print(f"Loaded {len(records)} claims from {input_path}")
+
+    if service_url:
+        from search.client import SearchClient
+        engine = SearchClient(service_url)
+    elif backend == "matrix":
+        from search.matrix_search import MatrixSearchEngine
+        engine = MatrixSearchEngine(ranking=ranking)
+    elif backend == "mapped":
+        from search.matrix_search import MappedSearchEngine
+        engine = MappedSearchEngine(ranking=ranking)
+    elif backend == "sharded":
+        from search.sharding import ShardedSearchEngine
+        engine = ShardedSearchEngine(ranking=ranking)
+    elif backend == "partitioned":
+        from search.date_partitions import PartitionedSearchEngine
+        engine = PartitionedSearchEngine(ranking=ranking)
+    else:
+        engine = SearchEngine(ranking=ranking)
+
+    queries = [r.get(field, "") or "" for r in records]
+    results = engine.search_many(queries, top_k=top_k, ranking=ranking, workers=workers)
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        for record, docs in zip(records, results):
+            out = {k: v for k, v in record.items() if k != field}
+            out[field] = record.get(field, "")
+            out["results"] = [{k: d.get(k) for k in RESULT_FIELDS} for d in docs]
+            f.write(json.dumps(out, ensure_ascii=False) + "\n")
+
+    print(f"Results saved to: {output_path}")
+    return engine.last_batch_stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search evidence for a JSONL file of claims.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--field", default="claim")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--backend", choices=["postings", "matrix", "mapped", "sharded", "partitioned"], default="postings")
+    parser.add_argument("--ranking", choices=["cosine", "bm25"], default="cosine")
+    parser.add_argument("--service", default=None, help="Search service URL; overrides --backend")
+    args = parser.parse_args()
+    run_batch(args.input, args.output, args.field, args.top_k, args.workers, args.backend, args.ranking, args.service)
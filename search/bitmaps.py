@@ -0,0 +1,196 @@
+import sys
+import struct
+from array import array
+from bisect import bisect_left
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+ARRAY_LIMIT = 4096
+BITSET_BYTES = (1 << CHUNK_BITS) // 8
+
+def _popcount(bits):
+    return bin(bits).count("1")
+
+def _bits_to_array(bits):
+    out = array("H")
+    while bits:
+        low = bits & -bits
+        out.append(low.bit_length() - 1)
+        bits ^= low
+    return out
+
+def _array_to_bits(values):
+    bits = 0
+    for v in values:
+        bits |= 1 << v
+    return bits
+
+def _normalize(container):
+    # Sparse chunks are sorted uint16 arrays, dense ones a 2**16-bit int, as in Roaring.
+    if isinstance(container, int):
+        return _bits_to_array(container) if _popcount(container) <= ARRAY_LIMIT else container
+    return container if len(container) <= ARRAY_LIMIT else _array_to_bits(container)
+
+def _and(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return _normalize(a & b)
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return array("H", (v for v in a if (b >> v) & 1))
+    return array("H", sorted(set(a).intersection(b)))
+
+def _or(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return a | b
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return b | _array_to_bits(a)
+    return _normalize(array("H", sorted(set(a).union(b))))
+
+def _size(container):
+    return _popcount(container) if isinstance(container, int) else len(container)
+
+class RoaringBitmap:
+    """Compressed set of doc ordinals (Roaring layout, pure Python).
+
+    Ordinals are split by their high 16 bits into chunks; each chunk holds a sorted
+    uint16 array while it has at most ARRAY_LIMIT members and a 65536-bit int bitset
+    beyond that. Membership and range probes touch a single chunk.
+    """
+
+    __slots__ = ("_keys", "_containers")
+
+    def __init__(self):
+        self._keys = []
+        self._containers = []
+
+    @classmethod
+    def from_sorted(cls, ords, dense=False):
+        # dense keeps every chunk as a bitset, for bitmaps that are intersected often.
+        pack = _array_to_bits if dense else _normalize
+        bitmap = cls()
+        current, values = None, array("H")
+        for o in ords:
+            key = o >> CHUNK_BITS
+            if key != current:
+                if values:
+                    bitmap._keys.append(current)
+                    bitmap._containers.append(pack(values))
+                current, values = key, array("H")
+            values.append(o & CHUNK_MASK)
+        if values:
+            bitmap._keys.append(current)
+            bitmap._containers.append(pack(values))
+        return bitmap
+
+    @classmethod
+    def from_iterable(cls, ords):
+        return cls.from_sorted(sorted(set(ords)))
+
+    def _container(self, key):
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._containers[i]
+        return None
+
+    def __contains__(self, o):
+        c = self._container(o >> CHUNK_BITS)
+        if c is None: return False
+        low = o & CHUNK_MASK
+        if isinstance(c, int):
+            return (c >> low) & 1 == 1
+        i = bisect_left(c, low)
+        return i < len(c) and c[i] == low
+
+    def any_in_range(self, lo, hi):
+        """True if any member lies in [lo, hi]; the range must not cross a chunk boundary."""
+        c = self._container(lo >> CHUNK_BITS)
+        if c is None: return False
+        lo &= CHUNK_MASK
+        hi &= CHUNK_MASK
+        if isinstance(c, int):
+            return (c >> lo) & ((1 << (hi - lo + 1)) - 1) != 0
+        i = bisect_left(c, lo)
+        return i < len(c) and c[i] <= hi
+
+    def _combine(self, other, op, keep_unmatched):
+        keys, containers = [], []
+        i = j = 0
+        a_keys, b_keys = self._keys, other._keys
+        while i < len(a_keys) or j < len(b_keys):
+            if j >= len(b_keys) or (i < len(a_keys) and a_keys[i] < b_keys[j]):
+                if keep_unmatched:
+                    keys.append(a_keys[i])
+                    containers.append(self._containers[i])
+                i += 1
+            elif i >= len(a_keys) or b_keys[j] < a_keys[i]:
+                if keep_unmatched:
+                    keys.append(b_keys[j])
+                    containers.append(other._containers[j])
+                j += 1
+            else:
+                c = op(self._containers[i], other._containers[j])
+                if _size(c):
+                    keys.append(a_keys[i])
+                    containers.append(c)
+                i += 1
+                j += 1
+        result = RoaringBitmap()
+        result._keys, result._containers = keys, containers
+        return result
+
+    def __and__(self, other):
+        return self._combine(other, _and, False)
+
+    def __or__(self, other):
+        return self._combine(other, _or, True)
+
+    def __len__(self):
+        return sum(_size(c) for c in self._containers)
+
+    def __bool__(self):
+        return bool(self._keys)
+
+    def __iter__(self):
+        for key, c in zip(self._keys, self._containers):
+            base = key << CHUNK_BITS
+            for low in (_bits_to_array(c) if isinstance(c, int) else c):
+                yield base | low
+
+    def to_bytes(self):
+        # [n_chunks] then per chunk [key, kind, count] + payload (uint16s or 8 KiB bitset).
+        parts = [struct.pack("<I", len(self._keys))]
+        for key, c in zip(self._keys, self._containers):
+            if isinstance(c, int):
+                parts.append(struct.pack("<HBI", key, 1, _popcount(c)))
+                parts.append(c.to_bytes(BITSET_BYTES, "little"))
+            else:
+                parts.append(struct.pack("<HBI", key, 0, len(c)))
+                payload = array("H", c)
+                if sys.byteorder == "big":
+                    payload.byteswap()
+                parts.append(payload.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        bitmap = cls()
+        (n,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        for _ in range(n):
+            key, kind, count = struct.unpack_from("<HBI", data, offset)
+            offset += struct.calcsize("<HBI")
+            if kind == 1:
+                c = int.from_bytes(data[offset:offset + BITSET_BYTES], "little")
+                offset += BITSET_BYTES
+            else:
+                c = array("H")
+                c.frombytes(data[offset:offset + 2 * count])
+                if sys.byteorder == "big":
+                    c.byteswap()
+                offset += 2 * count
+            bitmap._keys.append(key)
+            bitmap._containers.append(c)
+        return bitmap
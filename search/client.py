@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import queue
+import time
+import socket
+import http.client
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from search.service import DEFAULT_SERVICE_URL, parse_address
+
+HEALTH_TTL_SECONDS = float(os.environ.get("SEARCH_HEALTH_TTL", 5.0))
+
+class SearchServiceError(Exception):
+    pass
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+class SearchClient:
+    """Thin client for search/service.py with the SearchEngine query interface.
+
+    Keep-alive connections are pooled (up to pool_size idle ones), so a caller pays the
+    connect cost once rather than per claim. A request that fails on a pooled connection
+    the server has since closed is retried once on a fresh connection; searches are
+    read-only, so the retry is safe. ensure_loaded trusts a "serving" answer (from
+    /health or any successful search) for health_ttl seconds, so a claim costs one round
+    trip rather than a health check plus a search.
+    """
+
+    def __init__(self, url=DEFAULT_SERVICE_URL, pool_size=8, timeout=10.0, health_ttl=HEALTH_TTL_SECONDS):
+        self.url = url
+        self.timeout = timeout
+        self.health_ttl = health_ttl
+        self._serving_at = None
+        self.kind, self.address = parse_address(url)
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self.last_batch_stats = {}
+
+    def _connect(self):
+        if self.kind == "unix":
+            return _UnixHTTPConnection(self.address, self.timeout)
+        host, port = self.address
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _checkout(self):
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _checkin(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _request(self, method, path, payload=None):
+        try:
+            return self._send(method, path, payload)
+        except SearchServiceError:
+            self._serving_at = None
+            raise
+
+    def _send(self, method, path, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for _ in range(2):
+            conn, reused = self._checkout()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                if reused: continue
+                raise SearchServiceError(f"Search service at {self.url} dropped the connection: {e}")
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise SearchServiceError(f"Search service at {self.url} is unreachable: {e}")
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(conn)
+            try:
+                result = json.loads(data.decode("utf-8"))
+            except ValueError:
+                raise SearchServiceError(f"Invalid response from search service (HTTP {response.status})")
+            if response.status != 200:
+                raise SearchServiceError(result.get("error", f"HTTP {response.status}"))
+            return result
+        raise SearchServiceError(f"Search service at {self.url} dropped the connection")
+
+    def search(self, query, top_k=3, ranking=None, filters=None):
+        if not query: return []
+        payload = {"query": query, "top_k": top_k, "ranking": ranking, "filters": filters}
+        results = self._request("POST", "/search", payload)["results"]
+        self._serving_at = time.monotonic()
+        return results
+
+    def search_many(self, queries, top_k=3, ranking=None, workers=None, chunk_size=256):
+        # workers/chunk_size are accepted for interface parity; the service's own worker
+        # pool does the parallel work. Large batches go out in chunk_size requests.
+        queries = list(queries)
+        results = []
+        for i in range(0, len(queries), chunk_size):
+            chunk = queries[i:i + chunk_size]
+            results.extend(self._request("POST", "/search_many", {"queries": chunk, "top_k": top_k, "ranking": ranking})["results"])
+        self.last_batch_stats = {"queries": len(queries)}
+        return results
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def readiness(self):
+        try:
+            status = self.health().get("status", "failed")
+        except SearchServiceError:
+            return "failed"
+        self._serving_at = time.monotonic() if status == "serving" else None
+        return status
+
+    def ensure_loaded(self):
+        if self._serving_at is not None and time.monotonic() - self._serving_at < self.health_ttl:
+            return True
+        return self.readiness() == "serving"
+
+    @property
+    def is_loaded(self):
+        return self.ensure_loaded()
+
+    def warm_async(self):
+        # The service loads its index before it accepts connections.
+        pass
+
+    def cache_stats(self):
+        return self._request("GET", "/stats")
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
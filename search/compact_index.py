@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import shutil
+import numpy as np
+import scipy.sparse as sp
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+INDEX_FILE = os.path.join(INDEX_DIR, "inverted_index.json")
+COMPACT_INDEX_DIR = os.path.join(INDEX_DIR, "compact")
+COMPACT_META_FILE = "meta.json"
+COMPACT_ARRAYS = ("indptr", "indices", "cosine", "impacts")
+
+def write_compact_index(index_data, out_dir=COMPACT_INDEX_DIR):
+    """Write the index as a CSR term-document matrix in raw .npy files plus a JSON header.
+
+    The arrays are meant to be opened with np.load(mmap_mode='r'), so every process
+    serving the same index shares one page-cache copy of the postings.
+    """
+    doc_ids = list(index_data['doc_map'])
+    doc_ord = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+    doc_norms = index_data.get('doc_norms', {})
+    with_impacts = 'bm25' in index_data.get('stats', {})
+
+    terms = list(index_data['vocab'])
+    rows, cols, cosine, impacts = [], [], [], []
+    for row, term in enumerate(terms):
+        for p in index_data['vocab'][term]:
+            o = doc_ord.get(p['doc_id'])
+            if o is None: continue
+            d_norm = doc_norms.get(p['doc_id'], 1)
+            rows.append(row)
+            cols.append(o)
+            cosine.append(p['tfidf'] / d_norm if d_norm > 0 else 0.0)
+            impacts.append(p.get('impact', 0) if with_impacts else 0)
+
+    shape = (len(terms), len(doc_ids))
+    rows = np.asarray(rows, dtype=np.int32)
+    cols = np.asarray(cols, dtype=np.int32)
+    # COO -> CSR sums duplicate (term, doc) entries. Both weight matrices share one
+    # sparsity pattern because they are built from the same coordinates. Weights stay
+    # float32 so queries multiply against the mapped arrays without an upcast copy.
+    cos_m = sp.csr_matrix((np.asarray(cosine, dtype=np.float32), (rows, cols)), shape=shape)
+    imp_m = sp.csr_matrix((np.asarray(impacts, dtype=np.float32), (rows, cols)), shape=shape)
+    cos_m.sort_indices()
+    imp_m.sort_indices()
+
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    index_dtype = np.int32 if cos_m.nnz < 2 ** 31 else np.int64
+    np.save(os.path.join(tmp_dir, "indptr.npy"), cos_m.indptr.astype(index_dtype))
+    np.save(os.path.join(tmp_dir, "indices.npy"), cos_m.indices.astype(index_dtype))
+    np.save(os.path.join(tmp_dir, "cosine.npy"), cos_m.data)
+    np.save(os.path.join(tmp_dir, "impacts.npy"), imp_m.data)
+
+    meta = {
+        "stats": index_data.get('stats', {}),
+        "idf": index_data.get('idf', {}),
+        "terms": terms,
+        "doc_map": index_data['doc_map'],
+        "shape": list(shape),
+        "has_impacts": with_impacts
+    }
+    with open(os.path.join(tmp_dir, COMPACT_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return shape
+
+def compact_index_exists(index_dir=COMPACT_INDEX_DIR):
+    return os.path.exists(os.path.join(index_dir, COMPACT_META_FILE))
+
+def load_compact_index(index_dir=COMPACT_INDEX_DIR):
+    with open(os.path.join(index_dir, COMPACT_META_FILE), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r") for name in COMPACT_ARRAYS}
+    return meta, arrays
+
+if __name__ == "__main__":
+    print("\n--- Compact Index Export ---")
+    if not os.path.exists(INDEX_FILE):
+        print(f"Index file missing at {INDEX_FILE}")
+    else:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        terms, docs = write_compact_index(data)
+        print(f"Compact index written to {COMPACT_INDEX_DIR} ({terms} terms x {docs} docs)")
@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import time
+import heapq
+import shutil
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from search.bitmaps import RoaringBitmap
+from search.dates import jalali_day_number, parse_date
+from search.filters import SegmentOrdinals
+from search.pruning import StaticScores, build_term_postings
+from search.search_engine import ALPHA, INDEX_FILE, SearchEngine
+from search.sharding import split_index
+
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+PARTITION_DIR = os.path.join(INDEX_DIR, "partitions")
+PARTITION_MANIFEST = "manifest.json"
+GRANULARITIES = {"year": 4, "month": 7, "day": 10}
+UNDATED = "unknown"
+UNDATED_DAY = -1
+
+def partition_key(date, granularity="month"):
+    date = parse_date(date)
+    return date[:GRANULARITIES[granularity]] if date else UNDATED
+
+def write_partitions(index_data, granularity="month", out_dir=PARTITION_DIR):
+    """Write one index segment per date partition plus a manifest of per-partition stats.
+
+    Besides doc counts, date range and average length, each partition records every
+    term's largest cosine weight and BM25 impact within it, so a query can bound a
+    partition's best possible score without loading it.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown partition granularity: {granularity}")
+    doc_map = index_data['doc_map']
+    keys = sorted({partition_key(info.get('date'), granularity) for info in doc_map.values()})
+    slot = {key: i for i, key in enumerate(keys)}
+    assign = {doc_id: slot[partition_key(info.get('date'), granularity)] for doc_id, info in doc_map.items()}
+    with_impacts = 'bm25' in index_data.get('stats', {})
+
+    parts, df = split_index(index_data, assign, len(keys))
+    entries = []
+    for key, part in zip(keys, parts):
+        dates = [d for d in (parse_date(info.get('date')) for info in part['doc_map'].values()) if d]
+        lengths = list(part['doc_lengths'].values())
+        doc_ord = {doc_id: i for i, doc_id in enumerate(part['doc_map'])}
+        term_max = {}
+        for term, postings in part['vocab'].items():
+            tp = build_term_postings(postings, doc_ord, part['doc_norms'], with_impacts)
+            term_max[term] = [tp.max_cosine, tp.max_impact]
+        entries.append({
+            "key": key,
+            "file": f"part_{key}.json",
+            "docs": len(part['doc_map']),
+            "min_date": min(dates) if dates else None,
+            "max_date": max(dates) if dates else None,
+            "avg_doc_len": sum(lengths) / len(lengths) if lengths else 0,
+            "term_max": term_max
+        })
+
+    manifest = {
+        "granularity": granularity,
+        "stats": index_data.get('stats', {}),
+        "idf": index_data.get('idf', {}),
+        "df": df,
+        "doc_map": doc_map,
+        "partitions": entries
+    }
+
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for entry, part in zip(entries, parts):
+        with open(os.path.join(tmp_dir, entry['file']), "w", encoding="utf-8") as f:
+            json.dump(part, f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, PARTITION_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return {entry['key']: entry['docs'] for entry in entries}
+
+class DateSegment(SearchEngine):
+    """One date partition's postings, loaded on first use.
+
+    Static scores and the day numbers of its documents (by local ordinal, UNDATED_DAY
+    when undated) come from the parent.
+    """
+
+    def __init__(self, path, static_scores, days, ranking="cosine"):
+        self.path = path
+        self.segment_static = static_scores
+        self.days = days
+        self.global_ords = []
+        self.ordinals = None
+        super().__init__(ranking=ranking, lazy=True, cache_size=0)
+
+    def load_index(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.index_data = json.load(f)
+        self.global_ords = self.index_data.pop('global_ords', [])
+        self.ordinals = SegmentOrdinals(self.global_ords)
+        return True
+
+    def load_data(self):
+        start = time.perf_counter()
+        try:
+            self.load_index()
+            self.build_postings()
+            self.static = StaticScores(self.segment_static)
+            self.is_loaded = True
+            self.load_state = "serving"
+            self.load_seconds = time.perf_counter() - start
+        except Exception as e:
+            self.load_state = "failed"
+            print(f"Error loading date partition {self.path}: {e}")
+
+class _Partition:
+    __slots__ = ("key", "docs", "min_day", "max_day", "term_max", "static_max", "segment")
+
+    def __init__(self, entry, segment, static_max):
+        self.key = entry['key']
+        self.docs = entry['docs']
+        self.min_day = jalali_day_number(entry['min_date']) if entry['min_date'] else None
+        self.max_day = jalali_day_number(entry['max_date']) if entry['max_date'] else None
+        self.term_max = entry['term_max']
+        self.static_max = static_max
+        self.segment = segment
+
+class PartitionedSearchEngine(SearchEngine):
+    """SearchEngine over date-partitioned index segments.
+
+    search() takes an optional date window (inclusive Jalali 'YYYY-MM-DD' bounds):
+    partitions entirely outside it are never loaded or scanned, and in the partitions
+    it cuts through only documents dated inside the window can rank. Undated documents
+    are only searched when no window is given.
+
+    With recency_half_life (days), a result's score is multiplied by
+    0.5 ** (age / half_life), age being counted back from as_of (default: the window
+    end, else the newest indexed date); undated documents count as one half-life old.
+    The MIN_SCORE cut still applies to the undecayed score.
+
+    Partitions are visited newest first, and one is skipped outright when its bound
+    (per-partition term maxima, static maximum and best recency factor) cannot beat
+    the current k-th result, so with a decay old partitions are rarely touched.
+    """
+
+    def __init__(self, ranking="cosine", lazy=False, partition_dir=PARTITION_DIR, **kwargs):
+        self.partition_dir = partition_dir
+        self.partitions = []
+        self.df = {}
+        self.doc_days = []
+        self.newest_day = None
+        super().__init__(ranking=ranking, lazy=lazy, **kwargs)
+
+    def load_index(self):
+        path = os.path.join(self.partition_dir, PARTITION_MANIFEST)
+        if not os.path.exists(path):
+            print(f"CRITICAL: Partition manifest missing at {path}")
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            self.index_data = json.load(f)
+        self.df = self.index_data.pop('df', {})
+        return True
+
+    def build_postings(self):
+        doc_map = self.index_data['doc_map']
+        self.doc_ids = list(doc_map)
+        static = self.static_scores()
+        self.static = StaticScores(static)
+
+        granularity = self.index_data['granularity']
+        members = {}
+        days = []
+        for gord, (doc_id, info) in enumerate(doc_map.items()):
+            date = parse_date(info.get('date'))
+            days.append(jalali_day_number(date) if date else UNDATED_DAY)
+            members.setdefault(partition_key(date, granularity), []).append(gord)
+        self.doc_days = np.asarray(days, dtype=np.int64)
+
+        self.partitions = []
+        for entry in self.index_data.pop('partitions'):
+            ords = members.get(entry['key'], [])
+            segment_static = [static[g] for g in ords]
+            # Segments keep the global doc order, so these line up with local ordinals.
+            segment_days = self.doc_days[np.asarray(ords, dtype=np.int64)]
+            segment = DateSegment(os.path.join(self.partition_dir, entry['file']), segment_static, segment_days, self.ranking)
+            self.partitions.append(_Partition(entry, segment, max(segment_static, default=0.0)))
+        dated = [p.max_day for p in self.partitions if p.max_day is not None]
+        self.newest_day = max(dated) if dated else None
+        print(f"Date partitions: {len(self.partitions)} ({granularity})")
+
+    def _term_df(self, term):
+        return self.df.get(term, 0)
+
+    def close(self):
+        for part in self.partitions:
+            part.segment.close()
+        super().close()
+
+    def search(self, query, top_k=3, ranking=None, filters=None, date_from=None, date_to=None, recency_half_life=None, as_of=None):
+        if not (date_from or date_to or recency_half_life):
+            return super().search(query, top_k=top_k, ranking=ranking, filters=filters)
+        if not query or not self.ensure_loaded(): return []
+        query_vec = self._query_vec(query)
+        if not query_vec: return []
+        # Windowed and decayed lookups bypass the result cache: its keys do not carry them.
+        return self._search_window(query_vec, top_k, ranking, filters, date_from, date_to, recency_half_life, as_of)
+
+    def _search_vec(self, query_vec, top_k, ranking, filters=None):
+        return self._search_window(query_vec, top_k, ranking, filters)
+
+    def _search_chunk(self, query_vecs, top_k, ranking):
+        return [self._search_window(query_vec, top_k, ranking) if query_vec else [] for query_vec in query_vecs]
+
+    def _search_parallel(self, query_vecs, top_k, ranking, workers, chunk_size):
+        return self._search_chunk(query_vecs, top_k, ranking)
+
+    def _search_window(self, query_vec, top_k, ranking, filters=None, date_from=None, date_to=None, recency_half_life=None, as_of=None):
+        if top_k <= 0: return []
+        ranking, weights = self._query_weights(query_vec, ranking)
+        if not weights: return []
+
+        # Date filters narrow the partition window; the rest (source) become a bitmap
+        # over global ordinals, mapped onto each segment's ordinals below.
+        filters = dict(filters or {})
+        bounds_from = [parse_date(d) for d in (date_from, filters.pop("date_from", None)) if d]
+        bounds_to = [parse_date(d) for d in (date_to, filters.pop("date_to", None)) if d]
+        if None in bounds_from or None in bounds_to:
+            raise ValueError("Invalid date bound (expected YYYY-MM-DD)")
+        lo = jalali_day_number(max(bounds_from)) if bounds_from else None
+        hi = jalali_day_number(min(bounds_to)) if bounds_to else None
+        accept = self._filter_accept(filters)
+        if accept is not None and not accept: return []
+        windowed = lo is not None or hi is not None
+        ref = jalali_day_number(parse_date(as_of)) if parse_date(as_of) else (hi if hi is not None else self.newest_day)
+
+        def decay(day):
+            if not recency_half_life: return 1.0
+            age = recency_half_life if day is None or day == UNDATED_DAY or ref is None else max(0, ref - day)
+            return 0.5 ** (age / recency_half_life)
+
+        candidates = []
+        for part in self.partitions:
+            if part.max_day is None:
+                if windowed: continue
+            elif (lo is not None and part.max_day < lo) or (hi is not None and part.min_day > hi):
+                continue
+            candidates.append(part)
+        candidates.sort(key=lambda p: p.max_day if p.max_day is not None else float("-inf"), reverse=True)
+
+        term_slot = 1 if ranking == "bm25" else 0
+        heap = []
+        for part in candidates:
+            local = [(term, scale) for term, scale in weights if term in part.term_max]
+            if not local: continue
+            best = decay(part.max_day)
+            bound = (ALPHA * sum(scale * part.term_max[term][term_slot] for term, scale in local) + part.static_max) * best
+            if len(heap) == top_k and bound <= heap[0][0]: continue
+
+            segment = part.segment
+            if not segment.ensure_loaded(): continue
+            days = segment.days
+            edge = windowed and ((lo is not None and part.min_day < lo) or (hi is not None and part.max_day > hi))
+            local_accept = None
+            if edge:
+                inside = days != UNDATED_DAY
+                if lo is not None:
+                    inside &= days >= lo
+                if hi is not None:
+                    inside &= days <= hi
+                local_accept = RoaringBitmap.from_sorted(np.flatnonzero(inside).tolist())
+            if accept is not None:
+                members = segment.ordinals.to_local(accept)
+                local_accept = members if local_accept is None else local_accept & members
+            if local_accept is not None and not local_accept: continue
+
+            # Hits come back in undecayed order; widen k until no unseen document of this
+            # partition could still overtake the k-th decayed score.
+            k = top_k
+            while True:
+                hits = segment._top_k_weights(local, k, ranking, local_accept)
+                scored = [(score * decay(int(days[o])), -segment.global_ords[o], score) for score, o in hits]
+                if len(hits) < k: break
+                kth = heapq.nlargest(top_k, heap + scored)[-1][0]
+                if hits[-1][0] * best <= kth: break
+                k *= 2
+            for item in scored:
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        results = []
+        for decayed, neg_ord, score in sorted(heap, reverse=True):
+            doc = self._materialize(-neg_ord, score)
+            if recency_half_life:
+                doc['recency'] = decayed / score if score else 0.0
+                doc['score'] = decayed
+            results.append(doc)
+        return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the built index into date partitions.")
+    parser.add_argument("--granularity", choices=list(GRANULARITIES), default="month")
+    args = parser.parse_args()
+
+    print("\n--- Date Partitioning ---")
+    if not os.path.exists(INDEX_FILE):
+        print(f"Index file missing at {INDEX_FILE}")
+    else:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        sizes = write_partitions(data, args.granularity)
+        print(f"Wrote {len(sizes)} partitions to {PARTITION_DIR}: {sizes}")
@@ -0,0 +1,22 @@
+import re
+
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+_DATE_RE = re.compile(r"^\s*(\d{4})-(\d{1,2})-(\d{1,2})")
+
+def parse_date(value):
+    """'1403-5-7 14:20' (Persian or Latin digits) -> '1403-05-07'; None when undated."""
+    if not value or not isinstance(value, str): return None
+    m = _DATE_RE.match(value.translate(_DIGITS))
+    if not m: return None
+    year, month, day = (int(g) for g in m.groups())
+    if not (1 <= month <= 12 and 1 <= day <= 31): return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+def jalali_day_number(date):
+    # Linear day count of a Jalali 'YYYY-MM-DD' date (the first half of the usual
+    # Jalali -> Gregorian conversion), so date differences are plain subtraction.
+    jy, jm, jd = (int(x) for x in date.split("-"))
+    jy += 1595
+    days = -355668 + 365 * jy + (jy // 33) * 8 + ((jy % 33) + 3) // 4 + jd
+    days += (jm - 1) * 31 if jm < 7 else (jm - 7) * 30 + 186
+    return days
@@ -0,0 +1,95 @@
+import os
+import json
+import mmap
+import zlib
+import threading
+from collections import OrderedDict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+DOC_STORE_FILE = os.path.join(INDEX_DIR, "doc_store.bin")
+DOC_STORE_OFFSETS_FILE = os.path.join(INDEX_DIR, "doc_store_offsets.json")
+
+SOURCE_NAMES = {
+    "isna": "خبرگزاری ایسنا",
+    "tabnak": "تابناک",
+    "tasnim": "خبرگزاری تسنیم"
+}
+
+def source_from_filename(filename):
+    name = filename.lower()
+    for key, label in SOURCE_NAMES.items():
+        if key in name: return label
+    return "نامشخص"
+
+def source_key(source):
+    # Short key ('isna', ...) for a stored source label; keys pass through unchanged.
+    if source in SOURCE_NAMES: return source
+    for key, label in SOURCE_NAMES.items():
+        if source == label: return key
+    return "unknown"
+
+def write_doc_store(docs, data_path=DOC_STORE_FILE, offsets_path=DOC_STORE_OFFSETS_FILE):
+    # Each record is one zlib-compressed JSON object; the offsets file maps doc ID to
+    # [offset, length] so a reader can fetch any single document with one slice.
+    offsets = {}
+    tmp_data = data_path + ".tmp"
+    with open(tmp_data, "wb") as f:
+        for doc in docs:
+            record = {
+                "content": doc.get('content', ''),
+                "source": doc.get('source', "نامشخص")
+            }
+            blob = zlib.compress(json.dumps(record, ensure_ascii=False).encode("utf-8"), 6)
+            offsets[doc['id']] = [f.tell(), len(blob)]
+            f.write(blob)
+
+    tmp_offsets = offsets_path + ".tmp"
+    with open(tmp_offsets, "w", encoding="utf-8") as f:
+        json.dump(offsets, f, ensure_ascii=False)
+    os.replace(tmp_data, data_path)
+    os.replace(tmp_offsets, offsets_path)
+    return len(offsets)
+
+class DocStore:
+    """Read-only random access to compressed document bodies, with an LRU of hot documents."""
+
+    def __init__(self, data_path=DOC_STORE_FILE, offsets_path=DOC_STORE_OFFSETS_FILE, cache_size=512):
+        with open(offsets_path, "r", encoding="utf-8") as f:
+            self.offsets = json.load(f)
+        self._file = open(data_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def exists(data_path=DOC_STORE_FILE, offsets_path=DOC_STORE_OFFSETS_FILE):
+        return os.path.exists(data_path) and os.path.exists(offsets_path)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, doc_id):
+        with self._lock:
+            doc = self._cache.get(doc_id)
+            if doc is not None:
+                self._cache.move_to_end(doc_id)
+                return doc
+
+        loc = self.offsets.get(doc_id)
+        if loc is None: return None
+        offset, length = loc
+        doc = json.loads(zlib.decompress(self._data[offset:offset + length]).decode("utf-8"))
+
+        with self._lock:
+            self._cache[doc_id] = doc
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return doc
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
@@ -0,0 +1,153 @@
+import os
+import json
+import struct
+
+from graph.graph_store import doc_order_digest
+from search.bitmaps import RoaringBitmap
+from search.dates import parse_date
+from search.doc_store import SOURCE_NAMES, source_key
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+FILTER_INDEX_FILE = os.path.join(INDEX_DIR, "filters.bin")
+FILTER_FIELDS = ("source", "date_from", "date_to")
+FACETS = ("source", "month", "day")
+_MAGIC = b"FNFLT1"
+
+def write_filter_index(doc_ids, sources, dates, path=FILTER_INDEX_FILE):
+    """Write source, month and day bitmaps over doc ordinals (doc_map order).
+
+    Layout: magic, a uint32-prefixed JSON header mapping facet -> value -> [offset,
+    length] of each serialised RoaringBitmap, then the bitmaps. The header also records
+    the doc count and order digest the ordinals refer to.
+    """
+    members = {facet: {} for facet in FACETS}
+    for o, doc_id in enumerate(doc_ids):
+        members["source"].setdefault(source_key(sources.get(doc_id, "")), []).append(o)
+        date = parse_date(dates.get(doc_id))
+        if date:
+            members["month"].setdefault(date[:7], []).append(o)
+            members["day"].setdefault(date, []).append(o)
+
+    header = {"docs": len(doc_ids), "doc_digest": doc_order_digest(doc_ids), "facets": {}}
+    blobs, offset = [], 0
+    for facet, values in members.items():
+        header["facets"][facet] = {}
+        for value, ords in sorted(values.items()):
+            blob = RoaringBitmap.from_sorted(ords).to_bytes()
+            header["facets"][facet][value] = [offset, len(blob)]
+            blobs.append(blob)
+            offset += len(blob)
+
+    raw_header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC)
+        f.write(struct.pack("<I", len(raw_header)))
+        f.write(raw_header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return {facet: len(values) for facet, values in members.items()}
+
+class FilterIndex:
+    """Query-time access to the indexer's filter bitmaps.
+
+    evaluate() turns a filter spec such as {"source": ["isna", "tasnim"],
+    "date_from": "1403-05-01", "date_to": "1403-05-31"} into one RoaringBitmap of the
+    allowed doc ordinals: sources are OR-ed, whole months inside the date range are
+    taken from month bitmaps and only the edge months fall back to day bitmaps.
+    """
+
+    def __init__(self, path=FILTER_INDEX_FILE):
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(_MAGIC):
+            raise ValueError(f"Not a filter index: {path}")
+        (header_len,) = struct.unpack_from("<I", data, len(_MAGIC))
+        start = len(_MAGIC) + 4
+        header = json.loads(data[start:start + header_len].decode("utf-8"))
+        self.docs = header["docs"]
+        self.doc_digest = header.get("doc_digest")
+        self.facets = header["facets"]
+        self._data = data
+        self._base = start + header_len
+        self._cache = {}
+        self._days_by_month = {}
+        for day in self.facets.get("day", {}):
+            self._days_by_month.setdefault(day[:7], []).append(day)
+
+    @staticmethod
+    def exists(path=FILTER_INDEX_FILE):
+        return os.path.exists(path)
+
+    def matches(self, doc_count, doc_digest):
+        # Files written before the digest was recorded can only be checked by count.
+        return self.docs == doc_count and (self.doc_digest is None or self.doc_digest == doc_digest)
+
+    def bitmap(self, facet, value):
+        key = (facet, value)
+        bitmap = self._cache.get(key)
+        if bitmap is None:
+            loc = self.facets.get(facet, {}).get(value)
+            bitmap = RoaringBitmap.from_bytes(self._data, self._base + loc[0]) if loc else RoaringBitmap()
+            self._cache[key] = bitmap
+        return bitmap
+
+    def _sources(self, values):
+        if isinstance(values, str):
+            values = [values]
+        result = RoaringBitmap()
+        for value in values:
+            key = source_key(value)
+            if key == "unknown" and value not in ("unknown", "نامشخص"):
+                raise ValueError(f"Unknown source filter: {value} (expected one of {', '.join(SOURCE_NAMES)})")
+            result = result | self.bitmap("source", key)
+        return result
+
+    def _date_range(self, date_from, date_to):
+        lo = parse_date(date_from) if date_from else "0000-00-00"
+        hi = parse_date(date_to) if date_to else "9999-12-31"
+        if lo is None or hi is None:
+            raise ValueError(f"Invalid date filter: {date_from!r}..{date_to!r} (expected YYYY-MM-DD)")
+        result = RoaringBitmap()
+        for month in sorted(self.facets.get("month", {})):
+            first, last = month + "-01", month + "-31"
+            if last < lo or first > hi: continue
+            if lo <= first and last <= hi:
+                result = result | self.bitmap("month", month)
+            else:
+                for day in self._days_by_month.get(month, []):
+                    if lo <= day <= hi:
+                        result = result | self.bitmap("day", day)
+        return result
+
+    def evaluate(self, filters):
+        """RoaringBitmap of allowed ordinals, or None when filters restrict nothing."""
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+        accept = None
+        if filters.get("source"):
+            accept = self._sources(filters["source"])
+        if filters.get("date_from") or filters.get("date_to"):
+            dates = self._date_range(filters.get("date_from"), filters.get("date_to"))
+            accept = dates if accept is None else accept & dates
+        return accept
+
+class SegmentOrdinals:
+    """Maps bitmaps over global doc ordinals onto one index segment's local ordinals.
+
+    Shards and date partitions keep the global doc order, so the mapping is monotonic:
+    intersecting a bitmap with the segment's members and translating the survivors
+    gives a sorted local bitmap, in work proportional to the accepted members rather
+    than to the segment size. Members are kept as dense bitsets so that the
+    intersection with a dense filter bitmap is a single integer AND.
+    """
+
+    def __init__(self, global_ords):
+        self.members = RoaringBitmap.from_sorted(global_ords, dense=True)
+        self.local = {g: o for o, g in enumerate(global_ords)}
+
+    def to_local(self, accept):
+        return RoaringBitmap.from_sorted([self.local[g] for g in accept & self.members])
@@ -0,0 +1,33 @@
+import os
+import json
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+GENERATION_FILE = os.path.join(INDEX_DIR, "generation.json")
+
+def read_generation(path=GENERATION_FILE):
+    """The current generation marker, or {} when no builder has published one."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def publish_generation(part, info=None, path=GENERATION_FILE):
+    """Bump the generation marker after a builder has replaced all of its artifacts.
+
+    Builders replace each artifact with os.replace, but a set of artifacts cannot be
+    swapped in one step, so readers watch only this marker: it is written last, so by
+    the time it changes every artifact of the new generation is in place. part names
+    the builder ("index" or "graph"); info is recorded under it for diagnostics.
+    """
+    marker = read_generation(path)
+    marker["generation"] = marker.get("generation", 0) + 1
+    marker[part] = {**(info or {}), "published": time.time()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return marker["generation"]
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from search.generation import GENERATION_FILE
+from search.search_engine import SearchEngine
+
+# The builders publish this marker after every artifact of a generation is in place;
+# watching the artifacts themselves could pair a new doc store with an old index.
+WATCHED_FILES = (GENERATION_FILE,)
+WARM_QUERIES = 256
+
+def _file_signature(paths):
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((path, None, None))
+    return tuple(sig)
+
+class _Generation:
+    __slots__ = ("engine", "number", "refs", "retired")
+
+    def __init__(self, engine, number):
+        self.engine = engine
+        self.number = number
+        self.refs = 0
+        self.retired = False
+
+class ReloadingSearchEngine:
+    """A SearchEngine that picks up rebuilt index and graph artifacts while serving.
+
+    A background thread polls the generation marker the index and graph builders
+    publish last. When it changes, a complete new engine (generation) is loaded and its
+    result cache is warmed with the current generation's hot queries, all off the query
+    path. It is then swapped in under a lock. Queries pin the generation they started
+    on; a retired generation is closed when its last in-flight query releases it. If
+    the marker moves again while a generation loads, that load may have mixed two
+    builds, so it is discarded and the next poll loads the newer one.
+
+    Loading runs on a background thread but still in this process. A heap backend
+    parses the whole JSON index in one call that holds the GIL, so queries stall for
+    as long as that parse takes; the memory-mapped backend only parses the compact
+    header, which keeps reloads to tens of milliseconds.
+    """
+
+    def __init__(self, engine_factory=SearchEngine, poll_interval=5.0, watched_files=WATCHED_FILES, lazy=False):
+        self.engine_factory = engine_factory
+        self.poll_interval = poll_interval
+        self.watched_files = watched_files
+        self.reloads = 0
+        self.last_reload_seconds = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._signature = _file_signature(watched_files)
+        engine = engine_factory(lazy=lazy)
+        engine.generation = 1
+        self._current = _Generation(engine, 1)
+
+        self._thread = threading.Thread(target=self._watch, name="search-reloader", daemon=True)
+        self._thread.start()
+
+    def _acquire(self):
+        with self._lock:
+            gen = self._current
+            gen.refs += 1
+            return gen
+
+    def _release(self, gen):
+        with self._lock:
+            gen.refs -= 1
+            close = gen.retired and gen.refs == 0
+        if close:
+            gen.engine.close()
+
+    def _call(self, method, *args, **kwargs):
+        gen = self._acquire()
+        try:
+            return getattr(gen.engine, method)(*args, **kwargs)
+        finally:
+            self._release(gen)
+
+    def search(self, query, top_k=3, ranking=None, **options):
+        return self._call("search", query, top_k=top_k, ranking=ranking, **options)
+
+    def search_many(self, queries, top_k=3, ranking=None, workers=None, chunk_size=256):
+        return self._call("search_many", queries, top_k=top_k, ranking=ranking, workers=workers, chunk_size=chunk_size)
+
+    def cache_stats(self):
+        stats = self._call("cache_stats")
+        stats["reloads"] = self.reloads
+        return stats
+
+    @property
+    def generation(self):
+        return self._current.number
+
+    @property
+    def engine(self):
+        return self._current.engine
+
+    def __getattr__(self, name):
+        # Read-only attributes (is_loaded, doc_ids, index_data, ...) of the live generation.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._current.engine, name)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            sig = _file_signature(self.watched_files)
+            if sig == self._signature: continue
+            try:
+                self.reload(sig)
+            except Exception as e:
+                print(f"WARNING: Search index reload failed, keeping generation {self.generation}: {e}")
+                self._signature = sig
+
+    def reload(self, signature=None):
+        start = time.perf_counter()
+        signature = signature or _file_signature(self.watched_files)
+        print(f"Index change detected. Building generation {self.generation + 1} in the background...")
+
+        engine = self.engine_factory()
+        if _file_signature(self.watched_files) != signature:
+            engine.close()
+            print(f"Another generation was published while loading; keeping generation {self.generation} until it is loaded.")
+            return False
+        if not engine.is_loaded:
+            engine.close()
+            self._signature = signature
+            print(f"WARNING: New generation failed to load, keeping generation {self.generation}.")
+            return False
+
+        old = self._acquire()
+        try:
+            engine.generation = old.number + 1
+            warmed = engine.warm_cache(old.engine.result_cache.recent_keys(WARM_QUERIES))
+        finally:
+            self._release(old)
+
+        with self._lock:
+            old = self._current
+            self._current = _Generation(engine, old.number + 1)
+            old.retired = True
+            close_now = old.refs == 0
+        if close_now:
+            old.engine.close()
+
+        self._signature = signature
+        self.reloads += 1
+        self.last_reload_seconds = time.perf_counter() - start
+        print(f"Swapped in generation {self.generation} ({warmed} hot queries warmed) in {self.last_reload_seconds:.2f}s")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.poll_interval + 1)
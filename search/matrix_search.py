@@ -0,0 +1,173 @@
+import os
+import sys
+import numpy as np
+import scipy.sparse as sp
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import tokenize_batch
+from search.compact_index import COMPACT_INDEX_DIR, compact_index_exists, load_compact_index
+from search.pruning import StaticScores
+from search.search_engine import ALPHA, MIN_SCORE, SearchEngine, term_counts
+
+class MatrixSearchEngine(SearchEngine):
+    """SearchEngine backend scoring with sparse matrix products instead of posting loops.
+
+    The index is held as CSR term-document matrices (one per ranking mode) and the
+    PageRank boost as a dense vector over doc ordinals. A query, or a batch of queries,
+    becomes a sparse query-term matrix; one product yields every matched document's
+    text score and argpartition picks the top-k.
+    """
+
+    def __init__(self, ranking="cosine", lazy=False, **kwargs):
+        self.term_index = {}
+        self.matrices = {}
+        self.static_vector = np.zeros(0, dtype=np.float32)
+        super().__init__(ranking=ranking, lazy=lazy, **kwargs)
+
+    def build_postings(self):
+        doc_map = self.index_data.get('doc_map', {})
+        self.doc_ids = list(doc_map)
+        doc_ord = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+
+        with_impacts = 'bm25' in self.index_data.get('stats', {})
+        vocab = self.index_data.pop('vocab', {})
+        doc_norms = self.index_data.pop('doc_norms', {})
+
+        rows, cols, cosine, impacts = [], [], [], []
+        self.term_index = {}
+        for term, postings in vocab.items():
+            row = len(self.term_index)
+            self.term_index[term] = row
+            for p in postings:
+                o = doc_ord.get(p['doc_id'])
+                if o is None: continue
+                d_norm = doc_norms.get(p['doc_id'], 1)
+                rows.append(row)
+                cols.append(o)
+                cosine.append(p['tfidf'] / d_norm if d_norm > 0 else 0.0)
+                if with_impacts:
+                    impacts.append(p.get('impact', 0))
+
+        shape = (len(self.term_index), len(self.doc_ids))
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        # COO -> CSR sums duplicate (term, doc) entries, like the posting-list backend does.
+        self.matrices = {"cosine": sp.csr_matrix((np.asarray(cosine, dtype=np.float32), (rows, cols)), shape=shape)}
+        if with_impacts:
+            self.matrices["bm25"] = sp.csr_matrix((np.asarray(impacts, dtype=np.float32), (rows, cols)), shape=shape)
+
+        self.build_static()
+
+    def build_static(self):
+        static = self.static_scores()
+        self.static_vector = np.asarray(static, dtype=np.float32)
+        self.static = StaticScores(static)
+
+    def _term_df(self, term):
+        row = self.term_index.get(term)
+        if row is None: return 0
+        indptr = self.matrices["cosine"].indptr
+        return int(indptr[row + 1] - indptr[row])
+
+    def _query_matrix(self, weight_lists):
+        rows, cols, data = [], [], []
+        for i, weights in enumerate(weight_lists):
+            for term, scale in weights:
+                rows.append(i)
+                cols.append(self.term_index[term])
+                data.append(scale)
+        shape = (len(weight_lists), len(self.term_index))
+        return sp.csr_matrix((np.asarray(data, dtype=np.float32), (rows, cols)), shape=shape)
+
+    def _top_k_rows(self, scores, top_k, mask=None):
+        # scores is a (queries x docs) CSR product; only matched documents are stored.
+        results = []
+        for i in range(scores.shape[0]):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            ords = scores.indices[start:end]
+            totals = ALPHA * scores.data[start:end].astype(np.float64) + self.static_vector[ords]
+            keep = totals > MIN_SCORE
+            if mask is not None:
+                keep &= mask[ords]
+            ords, totals = ords[keep], totals[keep]
+            if len(ords) > top_k:
+                part = np.argpartition(-totals, top_k - 1)[:top_k]
+                ords, totals = ords[part], totals[part]
+            order = np.lexsort((ords, -totals))
+            results.append([self._materialize(int(ords[j]), float(totals[j])) for j in order])
+        return results
+
+    def _search_vec(self, query_vec, top_k, ranking, filters=None):
+        return self._search_chunk([query_vec], top_k, ranking, filters)[0]
+
+    def search_batch(self, queries, top_k=3, ranking=None):
+        if not self.ensure_loaded(): return [[] for _ in queries]
+        return self._search_chunk([term_counts(tokens) for tokens in tokenize_batch(queries)], top_k, ranking)
+
+    def _search_chunk(self, query_vecs, top_k, ranking, filters=None):
+        results = [[] for _ in query_vecs]
+        if top_k <= 0: return results
+
+        mask = None
+        accept = self._filter_accept(filters)
+        if accept is not None:
+            if not accept: return results
+            mask = np.zeros(len(self.doc_ids), dtype=bool)
+            mask[np.fromiter(accept, dtype=np.int64, count=len(accept))] = True
+
+        groups = {}
+        for i, query_vec in enumerate(query_vecs):
+            if not query_vec: continue
+            used, weights = self._query_weights(query_vec, ranking)
+            if weights:
+                groups.setdefault(used, []).append((i, weights))
+
+        for used, items in groups.items():
+            q = self._query_matrix([weights for _, weights in items])
+            scores = (q @ self.matrices[used]).tocsr()
+            for (i, _), hits in zip(items, self._top_k_rows(scores, top_k, mask)):
+                results[i] = hits
+        return results
+
+class MappedSearchEngine(MatrixSearchEngine):
+    """MatrixSearchEngine over the compact index, with the CSR arrays memory-mapped read-only.
+
+    The posting arrays are never copied onto the heap: every process that opens the same
+    compact index (for example the search service's forked workers) shares the page cache.
+    Only the term dictionary, doc map and PageRank vector are per-process.
+    """
+
+    def __init__(self, ranking="cosine", lazy=False, index_dir=COMPACT_INDEX_DIR, **kwargs):
+        self.index_dir = index_dir
+        self.arrays = {}
+        super().__init__(ranking=ranking, lazy=lazy, **kwargs)
+
+    def load_index(self):
+        if not compact_index_exists(self.index_dir):
+            print(f"CRITICAL: Compact index missing at {self.index_dir} (run search/compact_index.py or rebuild the index)")
+            return False
+        meta, self.arrays = load_compact_index(self.index_dir)
+        self.index_data = {
+            "stats": meta['stats'],
+            "idf": meta['idf'],
+            "doc_map": meta['doc_map']
+        }
+        self.term_index = {term: row for row, term in enumerate(meta['terms'])}
+        return True
+
+    def build_postings(self):
+        self.doc_ids = list(self.index_data['doc_map'])
+        shape = (len(self.term_index), len(self.doc_ids))
+        indptr, indices = self.arrays["indptr"], self.arrays["indices"]
+        # copy=False with matching dtypes keeps scipy on the mapped buffers.
+        self.matrices = {"cosine": sp.csr_matrix((self.arrays["cosine"], indices, indptr), shape=shape, copy=False)}
+        if 'bm25' in self.index_data['stats']:
+            self.matrices["bm25"] = sp.csr_matrix((self.arrays["impacts"], indices, indptr), shape=shape, copy=False)
+        self.build_static()
+
+    def close(self):
+        self.matrices = {}
+        self.arrays = {}
+        super().close()
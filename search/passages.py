@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import math
+import shutil
+import numpy as np
+import scipy.sparse as sp
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import tokenize, tokenize_batch
+from parser.content_cleaner import sentence_spans
+
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+PASSAGE_INDEX_DIR = os.path.join(INDEX_DIR, "passages")
+PASSAGE_META_FILE = "meta.json"
+PASSAGE_ARRAYS = ("indptr", "indices", "weights", "spans")
+PASSAGE_SENTENCES = int(os.environ.get("PASSAGE_SENTENCES", 3))
+PASSAGE_STRIDE = int(os.environ.get("PASSAGE_STRIDE", 2))
+PASSAGE_BM25 = {"k1": 1.2, "b": 0.75}
+# Rough prompt-token estimate for Persian news text under the local model's tokenizer.
+CHARS_PER_TOKEN = 2.5
+
+def estimate_tokens(text):
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+def passage_windows(content, window=PASSAGE_SENTENCES, stride=PASSAGE_STRIDE):
+    """(start, end) character spans of overlapping sentence windows over cleaned content."""
+    spans = sentence_spans(content)
+    if not spans: return []
+    if len(spans) <= window:
+        return [(spans[0][0], spans[-1][1])]
+    starts = list(range(0, len(spans) - window + 1, stride))
+    if starts[-1] + window < len(spans):
+        starts.append(len(spans) - window)
+    return [(spans[i][0], spans[i + window - 1][1]) for i in starts]
+
+def write_passage_index(docs, out_dir=PASSAGE_INDEX_DIR, window=PASSAGE_SENTENCES, stride=PASSAGE_STRIDE):
+    """Index sentence windows of every article as a CSR term-passage matrix of BM25 weights.
+
+    Passages are stored as (doc ordinal, start, end) spans into the content kept in the
+    document store, so the index carries no text of its own.
+    """
+    doc_ids = [d['id'] for d in docs]
+    spans, texts = [], []
+    for o, doc in enumerate(docs):
+        content = doc.get('content', '')
+        for start, end in passage_windows(content, window, stride):
+            spans.append((o, start, end))
+            texts.append(content[start:end])
+
+    all_tokens = tokenize_batch(texts)
+    n = len(texts)
+    avg_len = sum(len(t) for t in all_tokens) / n if n else 0
+    k1, b = PASSAGE_BM25["k1"], PASSAGE_BM25["b"]
+
+    term_ids, rows, cols, tfs = {}, [], [], []
+    for p, tokens in enumerate(all_tokens):
+        counts = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        norm = k1 * (1 - b + b * len(tokens) / avg_len) if avg_len else k1
+        for term, count in counts.items():
+            rows.append(term_ids.setdefault(term, len(term_ids)))
+            cols.append(p)
+            tfs.append(count * (k1 + 1) / (count + norm))
+
+    rows = np.asarray(rows, dtype=np.int32)
+    df = np.bincount(rows, minlength=len(term_ids))
+    idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+    weights = np.asarray(tfs, dtype=np.float64) * idf[rows]
+    matrix = sp.csr_matrix((weights.astype(np.float32), (rows, np.asarray(cols, dtype=np.int32))), shape=(len(term_ids), n))
+    matrix.sort_indices()
+
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "indptr.npy"), matrix.indptr.astype(np.int64))
+    np.save(os.path.join(tmp_dir, "indices.npy"), matrix.indices.astype(np.int32))
+    np.save(os.path.join(tmp_dir, "weights.npy"), matrix.data)
+    np.save(os.path.join(tmp_dir, "spans.npy"), np.asarray(spans, dtype=np.int32).reshape(-1, 3))
+
+    meta = {
+        "terms": list(term_ids),
+        "doc_ids": doc_ids,
+        "stats": {"passages": n, "avg_passage_len": avg_len, "window": window, "stride": stride, **PASSAGE_BM25}
+    }
+    with open(os.path.join(tmp_dir, PASSAGE_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return n
+
+class PassageIndex:
+    """Memory-mapped passage index: picks the passages of a few articles that best match a claim."""
+
+    def __init__(self, index_dir=PASSAGE_INDEX_DIR):
+        self.index_dir = index_dir
+        meta_path = os.path.join(index_dir, PASSAGE_META_FILE)
+        self.generation = os.path.getmtime(meta_path)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.stats = meta["stats"]
+        self.term_index = {term: i for i, term in enumerate(meta["terms"])}
+        self.doc_ids = meta["doc_ids"]
+        self.doc_ord = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        arrays = {name: np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r") for name in PASSAGE_ARRAYS}
+        self.indptr, self.indices, self.weights, self.spans = (arrays[name] for name in PASSAGE_ARRAYS)
+
+    @staticmethod
+    def exists(index_dir=PASSAGE_INDEX_DIR):
+        return os.path.exists(os.path.join(index_dir, PASSAGE_META_FILE))
+
+    def score(self, query, doc_ids):
+        """{passage number: BM25 score} for the passages of doc_ids that share a term with query."""
+        ords = np.asarray([self.doc_ord[d] for d in doc_ids if d in self.doc_ord], dtype=np.int32)
+        if not len(ords): return {}
+        counts = {}
+        for t in tokenize(query):
+            if t in self.term_index:
+                counts[t] = counts.get(t, 0) + 1
+
+        scores = {}
+        for term, qtf in counts.items():
+            row = self.term_index[term]
+            lo, hi = int(self.indptr[row]), int(self.indptr[row + 1])
+            passages = self.indices[lo:hi]
+            keep = np.isin(self.spans[passages, 0], ords)
+            for p, w in zip(passages[keep].tolist(), self.weights[lo:hi][keep].tolist()):
+                scores[p] = scores.get(p, 0.0) + qtf * w
+        return scores
+
+    def select(self, query, docs, token_budget):
+        """Best-matching passages of docs within token_budget, as {doc_id: [passage, ...]}.
+
+        Passages are taken greedily by score, skipping any that overlap one already
+        chosen from the same article; an article none of whose passages matched still
+        gets its opening passage if the budget allows. Within an article passages keep
+        document order. If nothing fits (every passage costs more than the budget, or a
+        stale index has spans past the stored content), the best valid passage is cut to
+        the budget, or failing that the top article's opening.
+        """
+        by_id = {doc['id']: doc for doc in docs if doc.get('id')}
+        chosen = {doc_id: [] for doc_id in by_id}
+        used = 0
+
+        def take(p):
+            nonlocal used
+            o, start, end = (int(x) for x in self.spans[p])
+            doc_id = self.doc_ids[o]
+            content = by_id[doc_id].get('content', '')
+            if end > len(content): return False
+            if any(start < e and s < end for s, e in chosen[doc_id]): return False
+            cost = estimate_tokens(content[start:end])
+            if used + cost > token_budget: return False
+            chosen[doc_id].append((start, end))
+            used += cost
+            return True
+
+        scores = self.score(query, list(by_id))
+        ranked = [p for p, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+        for p in ranked:
+            take(p)
+        for doc_id in by_id:
+            if not chosen[doc_id] and doc_id in self.doc_ord:
+                first = self._first_passage(self.doc_ord[doc_id])
+                if first is not None: take(first)
+
+        if not used:
+            return self._cut_to_budget(ranked, by_id, docs, token_budget)
+        return {doc_id: [by_id[doc_id]['content'][s:e] for s, e in sorted(spans)] for doc_id, spans in chosen.items() if spans}
+
+    def _cut_to_budget(self, ranked, by_id, docs, token_budget):
+        limit = int(token_budget * CHARS_PER_TOKEN)
+        for p in ranked:
+            o, start, end = (int(x) for x in self.spans[p])
+            content = by_id[self.doc_ids[o]].get('content', '')
+            if end <= len(content):
+                return {self.doc_ids[o]: [content[start:min(end, start + limit)]]}
+        top = [doc for doc in docs if doc.get('id') and doc.get('content')][:1]
+        return truncate_to_budget(top, token_budget)
+
+    def _first_passage(self, o):
+        p = int(np.searchsorted(self.spans[:, 0], o))
+        return p if p < len(self.spans) and self.spans[p, 0] == o else None
+
+def truncate_to_budget(docs, token_budget):
+    """Fallback without a passage index: an equal share of the budget from each article's start."""
+    if not docs: return {}
+    share = int(token_budget / len(docs) * CHARS_PER_TOKEN)
+    return {doc['id']: [doc.get('content', '')[:share]] for doc in docs if doc.get('id')}
+
+if __name__ == "__main__":
+    from search.doc_store import DocStore
+    from search.compact_index import INDEX_FILE
+
+    print("\n--- Passage Index Export ---")
+    if not os.path.exists(INDEX_FILE) or not DocStore.exists():
+        print(f"Index file or document store missing under {INDEX_DIR}")
+    else:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            doc_ids = list(json.load(f)['doc_map'])
+        store = DocStore()
+        docs = [{"id": doc_id, "content": store.get(doc_id).get('content', '')} for doc_id in doc_ids]
+        count = write_passage_index(docs)
+        print(f"Passage index written to {PASSAGE_INDEX_DIR} ({count} passages)")
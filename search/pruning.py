@@ -0,0 +1,305 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+
+BLOCK_SHIFT = 6
+STATIC_BLOCK_SHIFT = 7
+CHAMPION_MIN_RATIO = 4
+# Slack for summation-order rounding when comparing a tier bound with exact scores.
+CHAMPION_BOUND_EPS = 1e-12
+
+def block_maxima(ords, weights):
+    # Postings are cut into fixed blocks of 2**BLOCK_SHIFT entries; for each block we keep
+    # the last doc ordinal it covers and its largest weight (block-max MaxScore).
+    size = 1 << BLOCK_SHIFT
+    last, maxima = [], []
+    for start in range(0, len(ords), size):
+        end = min(start + size, len(ords))
+        last.append(ords[end - 1])
+        maxima.append(max(weights[start:end]))
+    return last, maxima
+
+class ChampionTier:
+    """Top tier of one term's postings under key = weight + lam * static score.
+
+    ords are the champion ordinals (sorted). Every posting left out has a key of at
+    most cutoff and a weight of at most rest_max, which is what bounds the documents
+    that only the lower tier could contribute.
+    """
+    __slots__ = ("ords", "lam", "cutoff", "rest_max", "static_scores")
+
+    def __init__(self, ords, weights, static_scores, lam, size):
+        key = lambda i: weights[i] + lam * static_scores[ords[i]]
+        top = heapq.nlargest(size, range(len(ords)), key=key)
+        chosen = set(top)
+        self.ords = sorted(ords[i] for i in top)
+        self.lam = lam
+        self.static_scores = static_scores
+        self.cutoff = min(key(i) for i in top)
+        self.rest_max = max(w for i, w in enumerate(weights) if i not in chosen)
+
+class TermPostings:
+    """Postings of one term as parallel arrays sorted by doc ordinal, with block maxima."""
+    __slots__ = ("ords", "cosine", "impacts", "max_cosine", "max_impact",
+                 "block_last", "cosine_blocks", "impact_blocks", "tiers")
+
+    def __init__(self, ords, cosine, impacts=None):
+        self.ords = ords
+        self.cosine = cosine
+        self.impacts = impacts
+        self.max_cosine = max(cosine) if cosine else 0.0
+        self.max_impact = max(impacts) if impacts else 0
+        self.block_last, self.cosine_blocks = block_maxima(ords, cosine)
+        self.impact_blocks = block_maxima(ords, impacts)[1] if impacts else None
+        self.tiers = {}
+
+    def champion_tier(self, ranking, static_scores, lam, size):
+        # Built on first use per ranking, once static scores are known; None when the
+        # list is short enough that its whole length is the champion tier.
+        if len(self.ords) <= CHAMPION_MIN_RATIO * size: return None
+        tier = self.tiers.get(ranking)
+        if tier is None or tier.static_scores is not static_scores or tier.lam != lam:
+            weights = self.impacts if ranking == "bm25" else self.cosine
+            tier = self.tiers[ranking] = ChampionTier(self.ords, weights, static_scores, lam, size)
+        return tier
+
+def build_term_postings(postings, doc_ord, doc_norms, with_impacts):
+    # Duplicate doc IDs across crawl files collapse onto one ordinal; their weights add up,
+    # matching the old dict accumulator.
+    merged = {}
+    for p in postings:
+        o = doc_ord.get(p['doc_id'])
+        if o is None: continue
+        d_norm = doc_norms.get(p['doc_id'], 1)
+        cos = p['tfidf'] / d_norm if d_norm > 0 else 0.0
+        imp = p.get('impact', 0) if with_impacts else 0
+        if o in merged:
+            prev = merged[o]
+            merged[o] = (prev[0] + cos, prev[1] + imp)
+        else:
+            merged[o] = (cos, imp)
+
+    ords = sorted(merged)
+    cosine = [merged[o][0] for o in ords]
+    impacts = [merged[o][1] for o in ords] if with_impacts else None
+    return TermPostings(ords, cosine, impacts)
+
+class LazyPostings:
+    """Mapping of term -> TermPostings, converted from the raw JSON postings on first use.
+
+    Loading then only parses the index; the per-term conversion cost is paid by the
+    first query that touches a term rather than up front for the whole vocabulary.
+    """
+
+    def __init__(self, vocab, doc_ord, doc_norms, with_impacts):
+        self._raw = vocab
+        self._built = {}
+        self._doc_ord = doc_ord
+        self._doc_norms = doc_norms
+        self._with_impacts = with_impacts
+        self._lock = threading.Lock()
+
+    def get(self, term, default=None):
+        tp = self._built.get(term)
+        if tp is not None: return tp
+        with self._lock:
+            tp = self._built.get(term)
+            if tp is None:
+                raw = self._raw.pop(term, None)
+                if raw is None: return default
+                tp = build_term_postings(raw, self._doc_ord, self._doc_norms, self._with_impacts)
+                self._built[term] = tp
+        return tp
+
+    def __getitem__(self, term):
+        tp = self.get(term)
+        if tp is None:
+            raise KeyError(term)
+        return tp
+
+    def __contains__(self, term):
+        return term in self._built or term in self._raw
+
+    def __len__(self):
+        return len(self._built) + len(self._raw)
+
+    def __iter__(self):
+        yield from list(self._built)
+        yield from list(self._raw)
+
+class StaticScores:
+    """Per-ordinal static (PageRank) boost with block maxima over ordinal ranges."""
+
+    def __init__(self, scores):
+        self.scores = scores
+        size = 1 << STATIC_BLOCK_SHIFT
+        self.block_max = [max(scores[i:i + size]) for i in range(0, len(scores), size)]
+        self.max = max(self.block_max, default=0.0)
+
+def _lower_tier_bound(tiered, static_max):
+    # Best score of a document outside every champion tier: for each tiered term its
+    # weight is at most min(rest_max, cutoff - lam * g), where g is its static score,
+    # and it holds at least one such term, so g <= cutoff / lam for some tier. The sum
+    # is concave and piecewise linear in g, so the maximum is at a breakpoint.
+    g_max = min(static_max, max(tier.cutoff / tier.lam for _, tier in tiered))
+    points = {0.0, max(0.0, g_max)}
+    for s, tier in tiered:
+        for g in ((tier.cutoff - tier.rest_max) / tier.lam, tier.cutoff / tier.lam):
+            if 0.0 < g < g_max: points.add(g)
+    return max(g + sum(s * max(0.0, min(tier.rest_max, tier.cutoff - tier.lam * g)) for s, tier in tiered)
+               for g in points)
+
+def champion_top_k(terms, static, top_k, min_score, text_weight=1.0, accept=None):
+    """Top-k from champion tiers alone, as (hits, floor).
+
+    terms holds (ords, weights, query_scale, tier) per query term, tier being a
+    ChampionTier or None for a list short enough to be read whole. Every document in
+    some tier is scored exactly by probing the full lists; hits stand only if no
+    document outside the tiers could still enter them (see _lower_tier_bound), and
+    then equal maxscore_top_k's up to summation-order rounding. Otherwise hits is None
+    and floor, the k-th exact score seen, is a safe starting threshold for the full
+    lower-tier pass.
+    """
+    if top_k <= 0: return [], min_score
+    candidates = set()
+    tiered = []
+    for ords, weights, scale, tier in terms:
+        candidates.update(tier.ords if tier else ords)
+        if tier: tiered.append((text_weight * scale, tier))
+    if accept is not None:
+        candidates = {c for c in candidates if c in accept}
+
+    static_scores = static.scores
+    heap = []
+    theta = min_score
+    for candidate in sorted(candidates):
+        score = static_scores[candidate]
+        for ords, weights, scale, tier in terms:
+            p = bisect_left(ords, candidate)
+            if p < len(ords) and ords[p] == candidate:
+                score += text_weight * scale * weights[p]
+        if score > theta:
+            if len(heap) < top_k:
+                heapq.heappush(heap, (score, -candidate))
+            else:
+                heapq.heapreplace(heap, (score, -candidate))
+            if len(heap) == top_k:
+                theta = max(min_score, heap[0][0])
+
+    if tiered:
+        bound = _lower_tier_bound(tiered, static.max) + CHAMPION_BOUND_EPS
+        # A full heap admits an outside tie only if it had a lower ordinal, so demand a strict gap.
+        full = len(heap) == top_k
+        if (bound >= theta) if full else (bound > min_score):
+            return None, theta
+    return [(score, -neg_ord) for score, neg_ord in sorted(heap, reverse=True)], theta
+
+def maxscore_top_k(terms, static, top_k, min_score, text_weight=1.0, accept=None):
+    """Block-max MaxScore, evaluated document-at-a-time over windows of doc ordinals.
+
+    terms holds (ords, weights, query_scale, max_weight, block_last, block_max) per query
+    term. A document scores text_weight * sum(query_scale * weight) + static.scores[ord].
+    Returns [(score, ord)] for the best top_k documents above min_score, best first.
+
+    Lists whose combined bound (plus the static maximum) cannot beat the current k-th
+    score are non-essential: they never introduce candidates and are only probed while a
+    candidate can still make the heap. The essential lists are walked one window of
+    2**STATIC_BLOCK_SHIFT ordinals at a time; a window whose block maxima plus its static
+    maximum cannot beat the k-th score is skipped without scoring any posting in it.
+
+    accept, if given, is a RoaringBitmap of the ordinals allowed to rank: windows
+    holding none of them are skipped like pruned ones, and other candidates are dropped
+    before any non-essential list is probed for them.
+    """
+    if top_k <= 0: return []
+
+    lists = []
+    for ords, weights, scale, max_weight, block_last, block_max in terms:
+        if ords:
+            s = text_weight * scale
+            lists.append((s * max_weight, ords, weights, s, block_last, block_max, len(ords)))
+    if not lists: return []
+    lists.sort(key=lambda t: t[0])
+
+    n = len(lists)
+    prefix = [0.0] * (n + 1)
+    for i in range(n):
+        prefix[i + 1] = prefix[i] + lists[i][0]
+
+    static_scores = static.scores
+    static_blocks = static.block_max
+    static_max = static.max
+
+    ptrs = [0] * n
+    heap = []
+    theta = min_score
+
+    essential = 0
+    while essential < n and prefix[essential + 1] + static_max <= theta:
+        essential += 1
+
+    while essential < n:
+        lo = -1
+        for i in range(essential, n):
+            t = lists[i]
+            if ptrs[i] < t[6]:
+                o = t[1][ptrs[i]]
+                if lo < 0 or o < lo:
+                    lo = o
+        if lo < 0: break
+
+        sb = lo >> STATIC_BLOCK_SHIFT
+        hi = ((sb + 1) << STATIC_BLOCK_SHIFT) - 1
+
+        if accept is not None and not accept.any_in_range(sb << STATIC_BLOCK_SHIFT, hi):
+            for i in range(essential, n):
+                ptrs[i] = bisect_right(lists[i][1], hi, ptrs[i])
+            continue
+
+        bound = static_blocks[sb] + prefix[essential]
+        for i in range(essential, n):
+            t = lists[i]
+            p = ptrs[i]
+            if p < t[6]:
+                first = p >> BLOCK_SHIFT
+                last = bisect_left(t[4], hi, first)
+                bound += t[3] * max(t[5][first:last + 1])
+
+        if bound <= theta:
+            for i in range(essential, n):
+                ptrs[i] = bisect_right(lists[i][1], hi, ptrs[i])
+            continue
+
+        acc = {}
+        for i in range(essential, n):
+            t = lists[i]
+            p = ptrs[i]
+            end = bisect_right(t[1], hi, p)
+            s = t[3]
+            for o, w in zip(t[1][p:end], t[2][p:end]):
+                acc[o] = acc.get(o, 0.0) + s * w
+            ptrs[i] = end
+
+        for candidate in sorted(acc):
+            if accept is not None and candidate not in accept: continue
+            score = acc[candidate] + static_scores[candidate]
+            for i in range(essential - 1, -1, -1):
+                if score + prefix[i + 1] <= theta: break
+                t = lists[i]
+                p = bisect_left(t[1], candidate, ptrs[i])
+                ptrs[i] = p
+                if p < t[6] and t[1][p] == candidate:
+                    score += t[3] * t[2][p]
+
+            if score > theta:
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (score, -candidate))
+                else:
+                    heapq.heapreplace(heap, (score, -candidate))
+                if len(heap) == top_k:
+                    theta = max(min_score, heap[0][0])
+
+        while essential < n and prefix[essential + 1] + static_max <= theta:
+            essential += 1
+
+    return [(score, -neg_ord) for score, neg_ord in sorted(heap, reverse=True)]
@@ -0,0 +1,60 @@
+import time
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """Thread-safe LRU cache with a per-entry TTL for search results."""
+
+    def __init__(self, max_entries=1024, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, results = entry
+            if self.ttl and expires < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [dict(doc) for doc in results]
+
+    def put(self, key, results):
+        if self.max_entries <= 0: return
+        stored = [dict(doc) for doc in results]
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl or 0), stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def recent_keys(self, limit):
+        with self._lock:
+            keys = list(self._entries)
+        return keys[-limit:][::-1] if limit > 0 else []
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0
+            }
@@ -1,49 +1,95 @@
 import os
+import sys
 import json
 import math
-import re
-import unicodedata
+import time
+import heapq
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from nlp.analyzer import tokenize, tokenize_batch
+from graph.graph_store import PPR_ALPHA, GraphStore, doc_order_digest
+from search.bitmaps import RoaringBitmap
+from search.doc_store import DocStore, source_from_filename
+from search.filters import FilterIndex
+from search.pruning import CHAMPION_BOUND_EPS, LazyPostings, StaticScores, champion_top_k, maxscore_top_k
+from search.result_cache import ResultCache
+
 DATA_DIR = os.environ.get("PROJECT_DATA_DIR", os.path.join(BASE_DIR, "data"))
 INDEX_DIR = os.path.join(BASE_DIR, "index")
 INDEX_FILE = os.path.join(INDEX_DIR, "inverted_index.json")
 GRAPH_FILE = os.path.join(DATA_DIR, "news_graph.json")
 
-PERSIAN_STOPWORDS = {
-    "از", "به", "در", "که", "و", "را", "این", "آن", "برای", "با", "است", "شد", "می", "ها", "های", "بر",
-    "تا", "یک", "بود", "نیز", "کند", "شود", "کرده", "شده", "باید", "گفت", "دارد", "وی", "اما", "اگر",
-    "نیست", "هستند", "بی", "تر", "ترین", "خود", "دیگر", "هم", "چون", "چه", "پس", "پیش", "بین", "سپس"
-}
+RANKING_MODES = ("cosine", "bm25")
+
+ALPHA = 0.7
+BETA = 0.3
+PAGERANK_SCALE = 50
+MIN_SCORE = 0.05
+CHAMPION_LIST_SIZE = int(os.environ.get("CHAMPION_LIST_SIZE", 128))
+
+GRAPH_MODES = ("global", "personalized")
+GRAPH_MODE = os.environ.get("SEARCH_GRAPH_MODE", "global")
+PPR_CANDIDATES = int(os.environ.get("PPR_CANDIDATES", 30))
+PPR_SEEDS = int(os.environ.get("PPR_SEEDS", 10))
+
+RESULT_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 1024))
+RESULT_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 600))
+
+_worker_engine = None
+
+def _init_search_worker(engine_cls, ranking, graph_mode=GRAPH_MODE):
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = engine_cls(ranking=ranking, graph_mode=graph_mode)
+
+def term_counts(tokens):
+    counts = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+def _search_worker(query_vecs, top_k, ranking):
+    return _worker_engine._search_chunk(query_vecs, top_k, ranking)
 
 class SearchEngine:
-    def __init__(self):
+    def __init__(self, ranking="cosine", cache_size=RESULT_CACHE_SIZE, cache_ttl=RESULT_CACHE_TTL, lazy=False, graph_mode=GRAPH_MODE):
+        if ranking not in RANKING_MODES:
+            raise ValueError(f"Unknown ranking mode: {ranking}")
+        if graph_mode not in GRAPH_MODES:
+            raise ValueError(f"Unknown graph mode: {graph_mode}")
+        self.ranking = ranking
+        self.graph_mode = graph_mode
+        self.result_cache = ResultCache(max_entries=cache_size, ttl=cache_ttl)
+        self.generation = 0
         self.is_loaded = False
         self.index_data = {}
         self.graph_data = {}
+        self.graph_store = None
         self.doc_details_map = {}
-        self.load_data()
-
-    def normalize_text(self, text):
-        if not text: return ""
-        text = unicodedata.normalize("NFKC", text)
-        text = re.sub(r'[^\w\s]', ' ', text)
-        return re.sub(r'\s+', ' ', text).strip()
-
-    def tokenize(self, text):
-        text = self.normalize_text(text)
-        tokens = text.split()
-        return [t for t in tokens if t not in PERSIAN_STOPWORDS and len(t) > 1]
+        self.doc_store = None
+        self.filter_index = None
+        self.doc_ids = []
+        self.postings = {}
+        self.static = StaticScores([])
+        self.last_batch_stats = {}
+        self.load_state = "cold"
+        self.load_seconds = None
+        self._load_lock = threading.Lock()
+        self._load_thread = None
+        if not lazy:
+            self.load_data()
 
     def load_raw_content(self):
         try:
             if not os.path.exists(DATA_DIR): return
             for f in os.listdir(DATA_DIR):
                 if f.endswith("_clean.json"):
-                    file_source = "نامشخص"
-                    if "isna" in f.lower(): file_source = "خبرگزاری ایسنا"
-                    elif "tabnak" in f.lower(): file_source = "تابناک"
-                    elif "tasnim" in f.lower(): file_source = "خبرگزاری تسنیم"
+                    file_source = source_from_filename(f)
                     
                     path = os.path.join(DATA_DIR, f)
                     with open(path, "r", encoding="utf-8") as file:
@@ -56,42 +102,151 @@ class SearchEngine:
         except Exception as e:
             print(f"Warning: Could not load raw content: {e}")
 
+    def open_doc_store(self):
+        # Article bodies are fetched on demand for the final top-k only. Indexes built
+        # before the document store existed fall back to holding every body in memory.
+        if self.doc_store is not None:
+            self.doc_store.close()
+            self.doc_store = None
+        self.doc_details_map = {}
+        if DocStore.exists():
+            self.doc_store = DocStore()
+            print(f"Document store opened: {len(self.doc_store)} documents")
+        else:
+            print("WARNING: Document store not found (rebuild the index). Loading raw content into memory.")
+            self.load_raw_content()
+
+    def doc_details(self, doc_id):
+        if self.doc_store is not None:
+            return self.doc_store.get(doc_id) or {}
+        return self.doc_details_map.get(doc_id, {})
+
+    def ensure_loaded(self):
+        if self.is_loaded: return True
+        with self._load_lock:
+            if not self.is_loaded and self.load_state != "failed":
+                self.load_data()
+        return self.is_loaded
+
+    def warm_async(self):
+        # Starts loading in the background; queries arriving meanwhile block in ensure_loaded.
+        if self.is_loaded or self._load_thread is not None: return
+        self.load_state = "warming"
+        self._load_thread = threading.Thread(target=self.ensure_loaded, name="search-warmup", daemon=True)
+        self._load_thread.start()
+
+    def readiness(self):
+        return self.load_state
+
     def load_data(self):
         print("Loading Engine Data...")
+        start = time.perf_counter()
+        self.load_state = "warming"
         try:
-            if not os.path.exists(INDEX_FILE):
-                print(f"CRITICAL: Index file missing at {INDEX_FILE}")
+            if not self.load_index():
+                self.load_state = "failed"
                 return
-            with open(INDEX_FILE, "r", encoding="utf-8") as f:
-                self.index_data = json.load(f)
 
-            if os.path.exists(GRAPH_FILE):
+            self.graph_store = None
+            self.graph_data = {}
+            if GraphStore.exists():
+                self.graph_store = GraphStore()
+                print(f"Graph Store Opened. Nodes: {len(self.graph_store)}")
+            elif os.path.exists(GRAPH_FILE):
                 with open(GRAPH_FILE, "r", encoding="utf-8") as f:
                     self.graph_data = json.load(f)
                 print(f"Graph Metrics Loaded. Nodes: {len(self.graph_data.get('nodes', []))}")
             else:
                 print("WARNING: Graph file not found. Ranking will be text-only.")
 
-            self.load_raw_content()
+            self.build_postings()
+            self.open_doc_store()
+            self.open_filter_index()
+            self.generation += 1
+            self.result_cache.clear()
             self.is_loaded = True
-            print("Engine Ready.")
+            self.load_state = "serving"
+            self.load_seconds = time.perf_counter() - start
+            print(f"Engine Ready. ({self.load_seconds:.2f}s)")
             
         except Exception as e:
+            self.load_state = "failed"
             print(f"Error loading search engine: {e}")
 
-    def search(self, query, top_k=3):
-        if not self.is_loaded or not query: return []
+    def load_index(self):
+        if not os.path.exists(INDEX_FILE):
+            print(f"CRITICAL: Index file missing at {INDEX_FILE}")
+            return False
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            self.index_data = json.load(f)
+        return True
 
-        query_tokens = self.tokenize(query)
-        if not query_tokens: return []
+    def build_postings(self):
+        # Re-key postings by doc ordinal (doc_map order) into sorted parallel arrays with
+        # query-independent weights, so search can walk them document-at-a-time. Terms are
+        # converted lazily on first use; each raw JSON list is dropped once converted.
+        doc_map = self.index_data.get('doc_map', {})
+        self.doc_ids = list(doc_map)
+        doc_ord = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
 
-        query_vec = {}
-        for token in query_tokens:
-            query_vec[token] = query_vec.get(token, 0) + 1
-        
+        with_impacts = 'bm25' in self.index_data.get('stats', {})
+        vocab = self.index_data.pop('vocab', {})
+        doc_norms = self.index_data.pop('doc_norms', {})
+        self.postings = LazyPostings(vocab, doc_ord, doc_norms, with_impacts)
+
+        self.static = StaticScores(self.static_scores())
+
+    def static_scores(self):
+        # BETA-weighted PageRank per doc ordinal, from the mapped graph store when there
+        # is one (a slice when it was built against this index) or the JSON graph file.
+        if self.graph_store is not None:
+            pagerank = self.graph_store.scores_for(self.doc_ids, "pagerank")
+            return [BETA * p * PAGERANK_SCALE for p in pagerank.tolist()]
+        pagerank_scores = self.graph_data.get('pagerank', {})
+        return [BETA * pagerank_scores.get(doc_id, 0.0) * PAGERANK_SCALE for doc_id in self.doc_ids]
+
+    def doc_order(self):
+        # (doc count, order digest) that the filter bitmaps' ordinals must refer to.
+        return len(self.doc_ids), doc_order_digest(self.doc_ids)
+
+    def open_filter_index(self):
+        # Opened with the rest of the generation and checked against its doc order, so
+        # bitmaps written by another build can never filter by the wrong ordinals.
+        self.filter_index = None
+        if not FilterIndex.exists(): return
+        filter_index = FilterIndex()
+        if filter_index.matches(*self.doc_order()):
+            self.filter_index = filter_index
+        else:
+            print("WARNING: Filter index was built for a different index (rebuild the index). Filtered searches return nothing.")
+
+    def _filter_accept(self, filters):
+        if not filters: return None
+        if self.filter_index is None:
+            print("WARNING: No usable filter index (rebuild the index). Filtered searches return nothing.")
+            return RoaringBitmap()
+        return self.filter_index.evaluate(filters)
+
+    def _term_df(self, term):
+        tp = self.postings.get(term)
+        return len(tp.ords) if tp else 0
+
+    def _query_vec(self, query):
+        return term_counts(tokenize(query))
+
+    def _query_weights(self, query_vec, ranking):
+        ranking = ranking or self.ranking
+        if ranking == "bm25" and 'bm25' not in self.index_data.get('stats', {}):
+            print("WARNING: Index has no BM25 impacts (rebuild it). Falling back to cosine ranking.")
+            ranking = "cosine"
+
+        if ranking == "bm25":
+            return ranking, self._bm25_weights(query_vec)
+        return ranking, self._cosine_weights(query_vec)
+
+    def _cosine_weights(self, query_vec):
         query_norm = 0
         query_tfidf = {}
-        vocab = self.index_data.get('vocab', {})
         idf = self.index_data.get('idf', {})
 
         for term, count in query_vec.items():
@@ -101,46 +256,268 @@ class SearchEngine:
                 query_norm += w ** 2
         
         query_norm = math.sqrt(query_norm)
-        text_scores = {}
-        
-        for term, w_q in query_tfidf.items():
-            if term in vocab:
-                for p in vocab[term]:
-                    doc_id = p['doc_id']
-                    w_d = p['tfidf']
-                    text_scores[doc_id] = text_scores.get(doc_id, 0) + (w_q * w_d)
-
-        doc_norms = self.index_data.get('doc_norms', {})
-        final_results = []
-        
-        ALPHA = 0.7
-        BETA = 0.3
+        if query_norm == 0: return []
+        return [(term, w_q / query_norm) for term, w_q in query_tfidf.items() if self._term_df(term)]
 
-        pagerank_scores = self.graph_data.get('pagerank', {})
-        
-        for doc_id, dot_product in text_scores.items():
-            d_norm = doc_norms.get(doc_id, 1)
-            
-            cosine_sim = 0
-            if d_norm > 0 and query_norm > 0:
-                cosine_sim = dot_product / (d_norm * query_norm)
-            
-            pr_score = pagerank_scores.get(doc_id, 0.0) * 50
-            
-            final_score = (ALPHA * cosine_sim) + (BETA * pr_score)
-            
-            if final_score > 0.05:
-                doc_info = self.index_data['doc_map'].get(doc_id, {}).copy()
-                details = self.doc_details_map.get(doc_id, {})
-                
-                doc_info['id'] = doc_id
-                doc_info['score'] = final_score
-                doc_info['text_score'] = cosine_sim
-                doc_info['graph_score'] = pr_score
-                doc_info['content'] = details.get('content', "")
-                doc_info['source'] = details.get('source', "نامشخص")
-                
-                final_results.append(doc_info)
-
-        final_results = sorted(final_results, key=lambda x: x['score'], reverse=True)
-        return final_results[:top_k]
+    def _bm25_weights(self, query_vec):
+        # Impacts are precomputed BM25F contributions, so a document's score is a plain sum.
+        # Dividing by the query's best possible score keeps it in [0, 1] for mixing with PageRank.
+        N = self.index_data['stats']['total_docs']
+        scale = self.index_data['stats']['bm25']['impact_scale']
+
+        matched = []
+        max_possible = 0.0
+        for term, count in query_vec.items():
+            df = self._term_df(term)
+            if not df: continue
+            max_possible += count * math.log(1 + (N - df + 0.5) / (df + 0.5))
+            matched.append((term, count))
+
+        if max_possible <= 0: return []
+        return [(term, count * scale / max_possible) for term, count in matched]
+
+    def _cache_key(self, query_vec, top_k, ranking):
+        # Token multiset rather than raw text, so spacing, punctuation and word order
+        # variants of the same claim share an entry; generation retires old indexes.
+        return (tuple(sorted(query_vec.items())), top_k, ranking or self.ranking, self.generation)
+
+    def warm_cache(self, keys):
+        # Replays cache keys from another generation against this one, so hot claims
+        # stay cache hits across an index reload.
+        if not self.is_loaded: return 0
+        for query_items, top_k, ranking, _ in keys:
+            query_vec = dict(query_items)
+            self.result_cache.put(self._cache_key(query_vec, top_k, ranking), self._ranked(query_vec, top_k, ranking))
+        return len(keys)
+
+    def close(self):
+        if self.doc_store is not None:
+            self.doc_store.close()
+            self.doc_store = None
+        self.is_loaded = False
+        self.load_state = "cold"
+
+    def cache_stats(self):
+        stats = self.result_cache.stats()
+        stats["generation"] = self.generation
+        return stats
+
+    def search(self, query, top_k=3, ranking=None, filters=None):
+        """Top-k documents for query.
+
+        filters restricts the candidates, e.g. {"source": ["isna", "tasnim"],
+        "date_from": "1403-05-01", "date_to": "1403-05-31"}; it is evaluated against
+        the indexer's filter bitmaps, so excluded documents are never scored.
+        """
+        if not query or not self.ensure_loaded(): return []
+
+        query_vec = self._query_vec(query)
+        if not query_vec: return []
+        if filters:
+            # Filtered lookups bypass the result cache: its keys do not carry filters.
+            return self._ranked(query_vec, top_k, ranking, filters)
+
+        key = self._cache_key(query_vec, top_k, ranking)
+        cached = self.result_cache.get(key)
+        if cached is not None: return cached
+
+        results = self._ranked(query_vec, top_k, ranking)
+        self.result_cache.put(key, results)
+        return results
+
+    def _ranked(self, query_vec, top_k, ranking, filters=None):
+        # The one scoring path behind search() and warm_cache(), so a warmed entry is
+        # exactly what a cold search would have cached.
+        return self._rerank(self._search_vec(query_vec, self._candidate_depth(top_k), ranking, filters), top_k)
+
+    def _candidate_depth(self, top_k):
+        # Personalised re-ranking reorders a deeper evidence set than the caller keeps.
+        if self.graph_mode == "personalized" and self.graph_store is not None and top_k > 0:
+            return max(top_k, PPR_CANDIDATES)
+        return top_k
+
+    def _rerank(self, docs, top_k):
+        """Re-rank candidates by authority local to the query's topic.
+
+        Personalised PageRank is pushed from the best PPR_SEEDS text matches, weighted by
+        text score, over the stored graph. A candidate's graph score is the rank that
+        reaches it over edges (its own restart share excluded, so seeds are not boosted
+        just for being seeds), and replaces global PageRank in ALPHA * text + BETA * graph.
+        Pushed ranks are scaled so the best-reached candidate gets the largest global
+        PageRank term among the candidates: the graph term keeps global PageRank's range
+        and cannot outweigh text relevance more than it does in global mode.
+        """
+        if len(docs) <= 1 or self._candidate_depth(top_k) == top_k: return docs[:top_k]
+        index = self.graph_store.node_index
+        ords = [index.get(doc['id']) for doc in docs]
+        seeds = {}
+        for doc, o in list(zip(docs, ords))[:PPR_SEEDS]:
+            if o is not None and doc['text_score'] > 0:
+                seeds[o] = seeds.get(o, 0.0) + doc['text_score']
+        if not seeds: return docs[:top_k]
+
+        rank = self.graph_store.personalized_pagerank(seeds)
+        total = sum(seeds.values())
+        reached = [max(0.0, rank.get(o, 0.0) - PPR_ALPHA * seeds.get(o, 0.0) / total) if o is not None else 0.0 for o in ords]
+        best = max(reached)
+        ceiling = max(doc['graph_score'] for doc in docs)
+        for doc, local in zip(docs, reached):
+            doc['graph_score'] = ceiling * local / best if best > 0 else 0.0
+            doc['score'] = ALPHA * doc['text_score'] + BETA * doc['graph_score']
+        return sorted(docs, key=lambda doc: -doc['score'])[:top_k]
+
+    def _search_vec(self, query_vec, top_k, ranking, filters=None):
+        accept = self._filter_accept(filters)
+        if accept is not None and not accept: return []
+        ranking, weights = self._query_weights(query_vec, ranking)
+        hits = self._top_k_weights(weights, top_k, ranking, accept)
+        return [self._materialize(doc_ord, score) for score, doc_ord in hits]
+
+    def _top_k_weights(self, weights, top_k, ranking, accept=None):
+        terms = []
+        for term, scale in weights:
+            tp = self.postings[term]
+            if ranking == "bm25":
+                terms.append((tp.ords, tp.impacts, scale, tp.max_impact, tp.block_last, tp.impact_blocks))
+            else:
+                terms.append((tp.ords, tp.cosine, scale, tp.max_cosine, tp.block_last, tp.cosine_blocks))
+
+        floor = MIN_SCORE
+        if 0 < top_k <= CHAMPION_LIST_SIZE:
+            tiers = []
+            for (term, scale), t in zip(weights, terms):
+                tier = self.postings[term].champion_tier(ranking, self.static.scores, self._champion_lambda(term, ranking), CHAMPION_LIST_SIZE)
+                tiers.append((t[0], t[1], scale, tier))
+            hits, kth = champion_top_k(tiers, self.static, top_k, MIN_SCORE, text_weight=ALPHA, accept=accept)
+            if hits is not None: return hits
+            # The champions' k-th score bounds the true k-th from below: start pruning there.
+            floor = max(MIN_SCORE, kth - CHAMPION_BOUND_EPS)
+        return maxscore_top_k(terms, self.static, top_k, floor, text_weight=ALPHA, accept=accept)
+
+    def _champion_lambda(self, term, ranking):
+        # Champions are ranked as a one-term query would rank them: weight plus static
+        # score divided by that query's ALPHA * scale (1 for cosine, impact_scale / idf for BM25).
+        if ranking != "bm25": return 1 / ALPHA
+        N = self.index_data['stats']['total_docs']
+        df = self._term_df(term)
+        idf = math.log(1 + (N - df + 0.5) / (df + 0.5))
+        return idf / (ALPHA * self.index_data['stats']['bm25']['impact_scale'])
+
+    def search_many(self, queries, top_k=3, ranking=None, workers=None, chunk_size=256):
+        """Search a batch of queries; results come back in input order.
+
+        All queries are tokenized in one pass and identical token multisets are scored
+        once. With workers > 1 the distinct queries are split into chunks scored by a
+        process pool; where fork is available the workers share this engine's loaded
+        index copy-on-write, elsewhere each worker loads its own.
+        """
+        queries = list(queries)
+        start = time.perf_counter()
+
+        slots = []
+        distinct = {}
+        for tokens in tokenize_batch(queries):
+            key = tuple(sorted(term_counts(tokens).items()))
+            slots.append(distinct.setdefault(key, len(distinct)))
+        query_vecs = [dict(key) for key in distinct]
+
+        scored = [None] * len(query_vecs)
+        if query_vecs and self.ensure_loaded():
+            keys = [self._cache_key(query_vec, top_k, ranking) for query_vec in query_vecs]
+            for i, key in enumerate(keys):
+                if query_vecs[i]:
+                    scored[i] = self.result_cache.get(key)
+            pending = [i for i, hit in enumerate(scored) if hit is None and query_vecs[i]]
+            pending_vecs = [query_vecs[i] for i in pending]
+
+            depth = self._candidate_depth(top_k)
+            if workers and workers > 1 and len(pending_vecs) > chunk_size:
+                fresh = self._search_parallel(pending_vecs, depth, ranking, workers, chunk_size)
+            else:
+                fresh = self._search_chunk(pending_vecs, depth, ranking)
+            for i, hits in zip(pending, fresh):
+                hits = self._rerank(hits, top_k)
+                scored[i] = hits
+                self.result_cache.put(keys[i], hits)
+        results = [[dict(doc) for doc in (scored[slot] or [])] for slot in slots]
+
+        elapsed = time.perf_counter() - start
+        qps = len(queries) / elapsed if elapsed > 0 else 0.0
+        self.last_batch_stats = {
+            "queries": len(queries),
+            "distinct_queries": len(query_vecs),
+            "seconds": elapsed,
+            "queries_per_sec": qps
+        }
+        print(f"search_many: {len(queries)} queries ({len(query_vecs)} distinct) in {elapsed:.2f}s ({qps:.1f} queries/sec)")
+        return results
+
+    def _search_parallel(self, query_vecs, top_k, ranking, workers, chunk_size):
+        global _worker_engine
+        chunks = [query_vecs[i:i + chunk_size] for i in range(0, len(query_vecs), chunk_size)]
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            _worker_engine = self
+            ctx = multiprocessing.get_context("fork")
+        else:
+            ctx = multiprocessing.get_context()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_init_search_worker,
+                                     initargs=(type(self), self.ranking, self.graph_mode)) as pool:
+                futures = [pool.submit(_search_worker, chunk, top_k, ranking) for chunk in chunks]
+                results = []
+                for future in futures:
+                    results.extend(future.result())
+        finally:
+            _worker_engine = None
+        return results
+
+    def _search_chunk(self, query_vecs, top_k, ranking):
+        # Term-at-a-time over the union of the batch's terms: each posting list is walked
+        # once and feeds the accumulator of every query that contains the term.
+        results = [[] for _ in query_vecs]
+        if top_k <= 0: return results
+
+        term_queries = {}
+        for qi, query_vec in enumerate(query_vecs):
+            if not query_vec: continue
+            used, weights = self._query_weights(query_vec, ranking)
+            for term, scale in weights:
+                term_queries.setdefault((term, used), []).append((qi, scale * ALPHA))
+
+        accumulators = {}
+        for (term, used), subscribers in term_queries.items():
+            tp = self.postings[term]
+            weights = tp.impacts if used == "bm25" else tp.cosine
+            targets = [(accumulators.setdefault(qi, {}), scale) for qi, scale in subscribers]
+            if len(targets) == 1:
+                acc, scale = targets[0]
+                for o, w in zip(tp.ords, weights):
+                    acc[o] = acc.get(o, 0.0) + scale * w
+            else:
+                for o, w in zip(tp.ords, weights):
+                    for acc, scale in targets:
+                        acc[o] = acc.get(o, 0.0) + scale * w
+
+        static_scores = self.static.scores
+        for qi, acc in accumulators.items():
+            scored = ((text + static_scores[o], -o) for o, text in acc.items())
+            best = heapq.nlargest(top_k, (item for item in scored if item[0] > MIN_SCORE))
+            results[qi] = [self._materialize(-neg_ord, score) for score, neg_ord in best]
+        return results
+
+    def _materialize(self, doc_ord, score):
+        doc_id = self.doc_ids[doc_ord]
+        static_score = self.static.scores[doc_ord]
+
+        doc_info = dict(self.index_data['doc_map'].get(doc_id, {}))
+        details = self.doc_details(doc_id)
+
+        doc_info['id'] = doc_id
+        doc_info['score'] = score
+        doc_info['text_score'] = (score - static_score) / ALPHA
+        doc_info['graph_score'] = static_score / BETA if BETA else 0.0
+        doc_info['content'] = details.get('content', "")
+        doc_info['source'] = details.get('source', "نامشخص")
+        return doc_info
@@ -0,0 +1,364 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from search.compact_index import compact_index_exists
+from search.hot_reload import WATCHED_FILES, _file_signature
+from search.search_engine import RANKING_MODES, SearchEngine
+
+DEFAULT_SERVICE_URL = "http://127.0.0.1:8765"
+SERVICE_WORKERS = int(os.environ.get("SEARCH_SERVICE_WORKERS", os.cpu_count() or 1))
+KEEP_ALIVE_TIMEOUT = 30
+SHUTDOWN_GRACE_SECONDS = 10.0
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+def default_engine_factory(ranking="cosine"):
+    # The memory-mapped compact index is what makes forked workers cheap; without it
+    # each worker still shares the parent's heap copy-on-write until refcounts touch it.
+    if compact_index_exists():
+        from search.matrix_search import MappedSearchEngine
+        return MappedSearchEngine(ranking=ranking)
+    print("WARNING: Compact index not found (rebuild the index). Workers will share a heap-loaded index.")
+    return SearchEngine(ranking=ranking)
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """JSON over HTTP/1.1 with keep-alive.
+
+    GET  /health       readiness, generation, pid
+    GET  /stats        result cache stats of the worker that answered
+    POST /search       {"query", "top_k", "ranking", "filters"} -> {"results": [...]}
+    POST /search_many  {"queries", "top_k", "ranking"} -> {"results": [[...], ...]}
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeNewsSearch/1.0"
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    def do_GET(self):
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def _dispatch(self, handler):
+        state = self.server.state
+        with state.lock:
+            state.active += 1
+        try:
+            status, payload = handler()
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            with state.lock:
+                state.active -= 1
+        self._send_json(status, payload)
+
+    def _get(self):
+        engine = self.server.state.engine
+        if self.path == "/health":
+            return 200, {
+                "status": engine.readiness(),
+                "generation": self.server.state.generation,
+                "docs": len(engine.doc_ids),
+                "pid": os.getpid()
+            }
+        if self.path == "/stats":
+            stats = engine.cache_stats()
+            stats["generation"] = self.server.state.generation
+            stats["pid"] = os.getpid()
+            return 200, stats
+        return 404, {"error": f"Unknown path: {self.path}"}
+
+    def _post(self):
+        engine = self.server.state.engine
+        body = self._read_json()
+        top_k = int(body.get("top_k", 3))
+        ranking = body.get("ranking")
+        if ranking is not None and ranking not in RANKING_MODES:
+            raise ValueError(f"Unknown ranking mode: {ranking}")
+
+        if self.path == "/search":
+            filters = body.get("filters")
+            if filters is not None and not isinstance(filters, dict):
+                raise ValueError("'filters' must be an object")
+            return 200, {"results": engine.search(body.get("query", ""), top_k=top_k, ranking=ranking, filters=filters)}
+        if self.path == "/search_many":
+            queries = body.get("queries", [])
+            if not isinstance(queries, list):
+                raise ValueError("'queries' must be a list")
+            return 200, {"results": engine.search_many(queries, top_k=top_k, ranking=ranking)}
+        return 404, {"error": f"Unknown path: {self.path}"}
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        raw = self.rfile.read(length) if length else b"{}"
+        try:
+            body = json.loads(raw.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Invalid JSON body: {e}")
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # client_address is empty on Unix sockets, so address_string() cannot be used.
+        if os.environ.get("SEARCH_SERVICE_ACCESS_LOG") == "1":
+            print(f"[search-service {os.getpid()}] {format % args}")
+
+class _WorkerState:
+    __slots__ = ("engine", "generation", "active", "lock")
+
+    def __init__(self, engine, generation):
+        self.engine = engine
+        self.generation = generation
+        self.active = 0
+        self.lock = threading.Lock()
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def parse_address(url):
+    """'unix:///path/to.sock' -> ('unix', path); 'http://host:port' -> ('tcp', (host, port))."""
+    if url.startswith("unix://"):
+        return "unix", url[len("unix://"):]
+    rest = url.split("://", 1)[-1].rstrip("/")
+    host, _, port = rest.rpartition(":")
+    if not host:
+        host, port = rest, 80
+    return "tcp", (host, int(port))
+
+class SearchService:
+    """Pre-fork search server.
+
+    The parent binds the listening socket and loads the engine once, then forks the
+    workers. Each worker inherits the socket and the loaded engine; with the compact
+    index the posting arrays are memory-mapped, so all workers read the same physical
+    pages. Inside a worker a thread per connection keeps pooled keep-alive clients from
+    starving each other, while the kernel spreads new connections across workers.
+
+    The parent only supervises: it respawns workers that die, and on SIGHUP (or when
+    the builders publish a new generation marker) it loads a new generation, forks a
+    fresh set of workers on it and drains the old ones. Loading happens in the parent,
+    so the workers serving the old generation never wait on it. Where fork is unavailable it serves
+    from a single threaded process instead.
+    """
+
+    def __init__(self, url=DEFAULT_SERVICE_URL, workers=SERVICE_WORKERS, ranking="cosine",
+                 engine_factory=default_engine_factory, watch=True, poll_interval=5.0):
+        self.url = url
+        self.workers = max(1, workers)
+        self.ranking = ranking
+        self.engine_factory = engine_factory
+        self.watch = watch
+        self.poll_interval = poll_interval
+        self.server = None
+        self.engine = None
+        self.generation = 0
+        self.children = {}
+        self._stopping = False
+        self._reload_requested = False
+        self._signature = None
+
+    def bind(self):
+        kind, address = parse_address(self.url)
+        if kind == "unix":
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = _UnixServer(address, SearchRequestHandler)
+        else:
+            self.server = _TCPServer(address, SearchRequestHandler)
+
+    def load_engine(self):
+        while True:
+            signature = _file_signature(WATCHED_FILES)
+            engine = self.engine_factory(ranking=self.ranking)
+            if _file_signature(WATCHED_FILES) == signature: break
+            # The marker moved while loading, so the load may have mixed two builds.
+            engine.close()
+            print("Another generation was published while loading; loading it instead.")
+        if not engine.is_loaded:
+            engine.close()
+            return False
+        if self.engine is not None:
+            self.engine.close()
+        self.engine = engine
+        self.generation += 1
+        self._signature = signature
+        self.server.state = _WorkerState(engine, self.generation)
+        return True
+
+    def serve_forever(self):
+        self.bind()
+        if not self.load_engine():
+            print("CRITICAL: Search engine failed to load; service not started.")
+            self.server.server_close()
+            return
+
+        print(f"Search service listening on {self.url} (generation {self.generation}, {len(self.engine.doc_ids)} docs)")
+        if not hasattr(os, "fork"):
+            print("WARNING: fork() is unavailable on this platform; serving from a single process.")
+            try:
+                self.server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.server.server_close()
+            return
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        for _ in range(self.workers):
+            self._spawn()
+        print(f"Started {self.workers} workers: {sorted(self.children)}")
+
+        try:
+            last_poll = time.monotonic()
+            while not self._stopping:
+                self._reap()
+                if self.watch and time.monotonic() - last_poll >= self.poll_interval:
+                    last_poll = time.monotonic()
+                    if _file_signature(WATCHED_FILES) != self._signature:
+                        self._reload_requested = True
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                time.sleep(0.2)
+        finally:
+            self._shutdown_children()
+            self.server.server_close()
+            if self.engine is not None:
+                self.engine.close()
+            kind, address = parse_address(self.url)
+            if kind == "unix" and os.path.exists(address):
+                os.unlink(address)
+            print("Search service stopped.")
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = self.generation
+            return pid
+        code = 0
+        try:
+            self._worker_main()
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _worker_main(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        server = self.server
+
+        def drain(signum, frame):
+            # shutdown() blocks until serve_forever returns, so it cannot run on the
+            # thread that is inside serve_forever.
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        signal.signal(signal.SIGTERM, drain)
+
+        server.serve_forever()
+        deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+        while server.state.active and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self.children.pop(pid, None)
+            if generation == self.generation and not self._stopping:
+                print(f"WARNING: Worker {pid} exited (status {status}); respawning.")
+                self._spawn()
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def reload(self):
+        start = time.perf_counter()
+        previous = self.generation
+        print(f"Loading search generation {previous + 1}...")
+        try:
+            loaded = self.load_engine()
+        except Exception as e:
+            loaded = False
+            print(f"Reload error: {e}")
+        if not loaded:
+            self._signature = _file_signature(WATCHED_FILES)
+            print(f"WARNING: New generation failed to load, keeping generation {previous}.")
+            return False
+
+        old = [pid for pid, generation in self.children.items() if generation != self.generation]
+        for _ in range(self.workers):
+            self._spawn()
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+        print(f"Generation {self.generation} serving; draining {len(old)} old workers ({time.perf_counter() - start:.2f}s)")
+        return True
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self.children.pop(pid, None)
+
+    def _shutdown_children(self):
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS + 1
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in list(self.children):
+            self._signal(pid, signal.SIGKILL)
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.children.pop(pid, None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve search over HTTP from a pool of pre-forked workers.")
+    parser.add_argument("--url", default=os.environ.get("SEARCH_SERVICE_URL", DEFAULT_SERVICE_URL),
+                        help="http://host:port or unix:///path/to/socket")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--ranking", choices=list(RANKING_MODES), default="cosine")
+    parser.add_argument("--no-watch", action="store_true", help="Only reload on SIGHUP")
+    args = parser.parse_args()
+    SearchService(args.url, args.workers, args.ranking, watch=not args.no_watch).serve_forever()
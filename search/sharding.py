@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import zlib
+import heapq
+import shutil
+import argparse
+import threading
+import multiprocessing
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from graph.graph_store import doc_order_digest
+from search.doc_store import DocStore
+from search.filters import SegmentOrdinals
+from search.search_engine import INDEX_FILE, SearchEngine
+
+INDEX_DIR = os.path.join(BASE_DIR, "index")
+SHARD_DIR = os.path.join(INDEX_DIR, "shards")
+SHARD_MANIFEST = "manifest.json"
+SHARD_MODES = ("hash", "source")
+MERGE_SCORE_DIGITS = 12
+
+def shard_of(doc_id, num_shards):
+    # crc32 rather than hash(): str hashes are salted per process.
+    return zlib.crc32(doc_id.encode("utf-8")) % num_shards
+
+def split_index(index_data, assign, count):
+    """Split a built index into count sub-indexes; assign maps doc ID -> part number.
+
+    tf-idf weights, document norms and BM25F impacts were computed over the whole
+    corpus and are copied as they are, and every part carries the global stats and
+    idf. Parts keep the global doc_map order and record each document's global
+    ordinal, so local ordinals sort like global ones and tie-breaking by ordinal
+    agrees with the unsplit engine. Also returns the global document frequencies a
+    coordinator needs for BM25 query normalisation. Each part records the digest of
+    the global order, so it can check that filter bitmaps were built for it.
+    """
+    digest = doc_order_digest(index_data['doc_map'])
+    parts = [{
+        "doc_digest": digest,
+        "stats": index_data.get('stats', {}),
+        "idf": index_data.get('idf', {}),
+        "vocab": {},
+        "doc_lengths": {},
+        "doc_norms": {},
+        "doc_map": {},
+        "global_ords": []
+    } for _ in range(count)]
+
+    for gord, doc_id in enumerate(index_data['doc_map']):
+        part = parts[assign[doc_id]]
+        part['doc_map'][doc_id] = index_data['doc_map'][doc_id]
+        part['global_ords'].append(gord)
+        if doc_id in index_data.get('doc_lengths', {}):
+            part['doc_lengths'][doc_id] = index_data['doc_lengths'][doc_id]
+        if doc_id in index_data.get('doc_norms', {}):
+            part['doc_norms'][doc_id] = index_data['doc_norms'][doc_id]
+
+    df = {}
+    for term, postings in index_data['vocab'].items():
+        seen = set()
+        for p in postings:
+            i = assign.get(p['doc_id'])
+            if i is None: continue
+            parts[i]['vocab'].setdefault(term, []).append(p)
+            seen.add(p['doc_id'])
+        if seen:
+            df[term] = len(seen)
+    return parts, df
+
+def partition_index(index_data, num_shards=4, shard_by="hash", sources=None):
+    doc_ids = list(index_data['doc_map'])
+    if shard_by == "source":
+        sources = sources or {}
+        names = sorted({sources.get(doc_id, "نامشخص") for doc_id in doc_ids})
+        slot = {name: i for i, name in enumerate(names)}
+        assign = {doc_id: slot[sources.get(doc_id, "نامشخص")] for doc_id in doc_ids}
+    else:
+        names = [None] * num_shards
+        assign = {doc_id: shard_of(doc_id, num_shards) for doc_id in doc_ids}
+
+    shards, df = split_index(index_data, assign, len(names))
+    manifest = {
+        "shard_by": shard_by,
+        "stats": index_data.get('stats', {}),
+        "idf": index_data.get('idf', {}),
+        "df": df,
+        "shards": [{
+            "file": f"shard_{i:03d}.json",
+            "source": name,
+            "docs": len(shard['doc_map'])
+        } for i, (name, shard) in enumerate(zip(names, shards))]
+    }
+    return manifest, shards
+
+def write_shards(index_data, num_shards=4, shard_by="hash", sources=None, out_dir=SHARD_DIR):
+    if shard_by not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode: {shard_by}")
+    manifest, shards = partition_index(index_data, num_shards, shard_by, sources)
+
+    tmp_dir = out_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for entry, shard in zip(manifest['shards'], shards):
+        with open(os.path.join(tmp_dir, entry['file']), "w", encoding="utf-8") as f:
+            json.dump(shard, f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, SHARD_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return [entry['docs'] for entry in manifest['shards']]
+
+class ShardSearcher(SearchEngine):
+    """SearchEngine over one shard file, scoring query weights supplied by a coordinator."""
+
+    def __init__(self, shard_path, ranking="cosine", lazy=False, **kwargs):
+        self.shard_path = shard_path
+        self.global_ords = []
+        self.global_digest = None
+        self.ordinals = None
+        super().__init__(ranking=ranking, lazy=lazy, cache_size=0, **kwargs)
+
+    def load_index(self):
+        if not os.path.exists(self.shard_path):
+            print(f"CRITICAL: Shard file missing at {self.shard_path}")
+            return False
+        with open(self.shard_path, "r", encoding="utf-8") as f:
+            self.index_data = json.load(f)
+        self.global_ords = self.index_data.pop('global_ords', [])
+        self.global_digest = self.index_data.pop('doc_digest', None)
+        self.ordinals = SegmentOrdinals(self.global_ords)
+        return True
+
+    def doc_order(self):
+        # The filter bitmaps cover the whole index, not this shard.
+        return self.index_data.get('stats', {}).get('total_docs'), self.global_digest
+
+    def _filter_accept(self, filters):
+        # The filter bitmaps cover global ordinals; keep this shard's members by local ordinal.
+        accept = super()._filter_accept(filters)
+        if accept is None: return None
+        return self.ordinals.to_local(accept)
+
+    def search_weights(self, batch, top_k, filters=None):
+        # batch: [(ranking, [(term, scale), ...]), ...] -> per query [(score, global_ord, doc)]
+        accept = self._filter_accept(filters)
+        if accept is not None and not accept:
+            return [[] for _ in batch]
+        results = []
+        for ranking, weights in batch:
+            local = [(term, scale) for term, scale in weights if term in self.postings]
+            hits = self._top_k_weights(local, top_k, ranking, accept) if local else []
+            results.append([(score, self.global_ords[o], self._materialize(o, score)) for score, o in hits])
+        return results
+
+def _shard_main(conn, shard_path, ranking):
+    searcher = ShardSearcher(shard_path, ranking=ranking)
+    conn.send(("ready", searcher.is_loaded))
+    while True:
+        try:
+            op, payload = conn.recv()
+        except EOFError:
+            break
+        if op == "close":
+            break
+        try:
+            conn.send(("ok", searcher.search_weights(*payload)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+    searcher.close()
+    conn.close()
+
+class _LocalShard:
+    def __init__(self, shard_path, ranking):
+        self.searcher = ShardSearcher(shard_path, ranking=ranking)
+        self.is_loaded = self.searcher.is_loaded
+        self._result = None
+
+    def submit(self, batch, top_k, filters=None):
+        self._result = self.searcher.search_weights(batch, top_k, filters)
+
+    def result(self):
+        result, self._result = self._result, None
+        return result
+
+    def close(self):
+        self.searcher.close()
+
+class _ProcessShard:
+    # Stand-in for a remote shard server: a process that owns one shard and answers
+    # scatter requests over a pipe.
+    def __init__(self, shard_path, ranking, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_shard_main, args=(child, shard_path, ranking), daemon=True)
+        self.process.start()
+        child.close()
+        self.is_loaded = False
+
+    def wait_ready(self):
+        _, self.is_loaded = self.conn.recv()
+
+    def submit(self, batch, top_k, filters=None):
+        self.conn.send(("search", (batch, top_k, filters)))
+
+    def result(self):
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Shard search failed: {payload}")
+        return payload
+
+    def close(self):
+        try:
+            self.conn.send(("close", None))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+class ShardedSearchEngine(SearchEngine):
+    """Coordinator for a sharded index (scatter-gather).
+
+    Query weights are computed once from the manifest's global idf and document
+    frequencies, scattered to every shard, and the shards' top-k lists are merged by
+    (score, global ordinal). Each shard runs in its own process by default; with
+    in_process=True the shards are searched sequentially in this process instead.
+    """
+
+    def __init__(self, ranking="cosine", lazy=False, shard_dir=SHARD_DIR, in_process=False, **kwargs):
+        self.shard_dir = shard_dir
+        self.in_process = in_process
+        self.shards = []
+        self.df = {}
+        self._scatter_lock = threading.Lock()
+        super().__init__(ranking=ranking, lazy=lazy, **kwargs)
+
+    def load_index(self):
+        path = os.path.join(self.shard_dir, SHARD_MANIFEST)
+        if not os.path.exists(path):
+            print(f"CRITICAL: Shard manifest missing at {path}")
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.df = manifest.pop('df', {})
+        self.index_data = manifest
+        return True
+
+    def build_postings(self):
+        self._close_shards()
+        paths = [os.path.join(self.shard_dir, entry['file']) for entry in self.index_data['shards']]
+        if self.in_process:
+            self.shards = [_LocalShard(path, self.ranking) for path in paths]
+        else:
+            # spawn: shard processes must not inherit this process's threads or state.
+            ctx = multiprocessing.get_context("spawn")
+            self.shards = [_ProcessShard(path, self.ranking, ctx) for path in paths]
+            for shard in self.shards:
+                shard.wait_ready()
+        failed = [path for path, shard in zip(paths, self.shards) if not shard.is_loaded]
+        if failed:
+            self._close_shards()
+            raise RuntimeError(f"{len(failed)} shard(s) failed to load: {failed}")
+        print(f"Sharded index ready: {len(self.shards)} shards ({self.index_data['shard_by']})")
+
+    def open_doc_store(self):
+        # Shards materialise their own hits.
+        pass
+
+    def open_filter_index(self):
+        # Shards evaluate filters against their own members.
+        pass
+
+    def _term_df(self, term):
+        return self.df.get(term, 0)
+
+    def _scatter(self, batch, top_k, filters=None):
+        with self._scatter_lock:
+            for shard in self.shards:
+                shard.submit(batch, top_k, filters)
+            return [shard.result() for shard in self.shards]
+
+    def _merge(self, per_shard, top_k):
+        # Shards sum a document's term contributions in an order that depends on their
+        # local list maxima, so equal scores can differ in the last bits. Rounding the
+        # sort key lets such ties fall back to the global ordinal, as in one index.
+        merged = []
+        for qi in range(len(per_shard[0]) if per_shard else 0):
+            hits = heapq.nsmallest(top_k, (hit for shard in per_shard for hit in shard[qi]),
+                                   key=lambda hit: (-round(hit[0], MERGE_SCORE_DIGITS), hit[1]))
+            merged.append([doc for _, _, doc in hits])
+        return merged
+
+    def _search_vec(self, query_vec, top_k, ranking, filters=None):
+        return self._search_chunk([query_vec], top_k, ranking, filters)[0]
+
+    def _search_parallel(self, query_vecs, top_k, ranking, workers, chunk_size):
+        # The shards already search in parallel; a second process pool adds nothing.
+        return self._search_chunk(query_vecs, top_k, ranking)
+
+    def _search_chunk(self, query_vecs, top_k, ranking, filters=None):
+        # Filters travel to the shards, which evaluate them against their own members.
+        results = [[] for _ in query_vecs]
+        if top_k <= 0: return results
+        batch, slots = [], []
+        for i, query_vec in enumerate(query_vecs):
+            if not query_vec: continue
+            used, weights = self._query_weights(query_vec, ranking)
+            if weights:
+                batch.append((used, weights))
+                slots.append(i)
+        if batch:
+            for i, hits in zip(slots, self._merge(self._scatter(batch, top_k, filters), top_k)):
+                results[i] = hits
+        return results
+
+    def _close_shards(self):
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+    def close(self):
+        self._close_shards()
+        super().close()
+
+def _load_sources(doc_ids):
+    if not DocStore.exists(): return {}
+    store = DocStore(cache_size=0)
+    try:
+        return {doc_id: (store.get(doc_id) or {}).get('source', "نامشخص") for doc_id in doc_ids}
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition the built index into shards.")
+    parser.add_argument("--shards", type=int, default=4, help="Number of shards for --by hash")
+    parser.add_argument("--by", choices=list(SHARD_MODES), default="hash")
+    args = parser.parse_args()
+
+    print("\n--- Index Sharding ---")
+    if not os.path.exists(INDEX_FILE):
+        print(f"Index file missing at {INDEX_FILE}")
+    else:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        sources = _load_sources(data['doc_map']) if args.by == "source" else None
+        sizes = write_shards(data, args.shards, args.by, sources)
+        print(f"Wrote {len(sizes)} shards to {SHARD_DIR}: {sizes} documents")